@@ -0,0 +1,203 @@
+"""
+Streaming admission routing for the Patient Allocator application.
+
+After the morning allocation, patients keep arriving one at a time. An
+AdmissionRouter holds the day's roster in per-team priority queues so each
+admission, discharge or correction costs O(log n) instead of a full
+allocate_patients run. It applies the same rules as the engine:
+
+- new physicians below new_start_number are topped up first, and take no
+  regular patients once they reach it
+- everyone else gets regular patients lowest census first, under
+  maximum_patients
+- step-down patients go to the lowest census, then lowest gain, among those
+  under maximum_step_down; when nobody on the team has room the patient is
+  routed as a regular patient instead
+
+Queues use lazy deletion: a changed physician gets a fresh heap entry and
+stale entries are skipped when they reach the top.
+"""
+
+import heapq
+import threading
+
+from roster import Roster
+
+
+class _Queue:
+    """Min-heap of (key..., index) entries with one live entry per physician."""
+
+    __slots__ = ("heap", "live")
+
+    def __init__(self):
+        self.heap = []
+        self.live = {}
+
+    def update(self, index: int, entry):
+        """Replace a physician's entry; None removes them from the queue."""
+        if entry is None:
+            self.live.pop(index, None)
+            return
+        self.live[index] = entry
+        heapq.heappush(self.heap, entry)
+        # Rebuild when stale entries dominate, keeping the heap O(n)
+        if len(self.heap) > 2 * len(self.live) + 32:
+            self.heap = list(self.live.values())
+            heapq.heapify(self.heap)
+
+    def peek(self):
+        """Index of the physician at the front, or None when empty."""
+        heap = self.heap
+        while heap:
+            entry = heap[0]
+            if self.live.get(entry[-1]) == entry:
+                return entry[-1]
+            heapq.heappop(heap)
+        return None
+
+
+class AdmissionRouter:
+    """Routes single admissions to physicians using per-team priority queues."""
+
+    def __init__(self, physician_data: list[dict], parameters: dict):
+        self.physicians = Roster.from_dicts(physician_data)
+        self.new_start_number = parameters.get("new_start_number", 10)
+        self.maximum_patients = parameters.get("maximum_patients", 1000)
+        self.maximum_step_down = parameters.get("maximum_step_down", 1)
+
+        # Names resolve to the first physician with that name
+        self.initial_totals = [p.total_patients for p in self.physicians]
+
+        self._regular = {}
+        self._step_down = {}
+        self._lock = threading.Lock()
+        for i in range(len(self.physicians)):
+            self._requeue(i)
+
+    def _queues(self, team):
+        if team not in self._regular:
+            self._regular[team] = _Queue()
+            self._step_down[team] = _Queue()
+        return self._regular[team], self._step_down[team]
+
+    def _requeue(self, i):
+        """Refresh physician i's entries in their team's queues."""
+        p = self.physicians[i]
+        regular, step_down = self._queues(p.team)
+
+        regular_entry = None
+        if p.is_working and p.total_patients < self.maximum_patients:
+            if p.is_new:
+                # New physicians only take patients up to new_start_number, ahead of everyone else
+                if p.total_patients < self.new_start_number:
+                    regular_entry = (0, p.total_patients, i)
+            else:
+                regular_entry = (1, p.total_patients, i)
+        regular.update(i, regular_entry)
+
+        step_down_entry = None
+        if p.is_working and p.step_down_patients < self.maximum_step_down:
+            step_down_entry = (p.total_patients, p.total_patients - self.initial_totals[i], i)
+        step_down.update(i, step_down_entry)
+
+    def _resolve(self, name):
+        return self.physicians.id_of(name)
+
+    def _pick(self, team, step_down):
+        """(index, as_regular) of whoever gets the next patient, or (None, False)."""
+        if team not in self._regular:
+            return None, False
+        regular, step_down_queue = self._regular[team], self._step_down[team]
+        if step_down:
+            i = step_down_queue.peek()
+            if i is not None:
+                return i, False
+            # Nobody has step-down room: the engine gives a regular patient instead
+            return regular.peek(), True
+        return regular.peek(), False
+
+    def row(self, i):
+        p = self.physicians[i]
+        return {
+            "name": p.name,
+            "team": p.team,
+            "total_patients": p.total_patients,
+            "step_down_patients": p.step_down_patients,
+            "gained": p.total_patients - self.initial_totals[i],
+        }
+
+    def next(self, team: str, step_down: bool = False):
+        """
+        Who would get the next patient on `team`, without assigning it.
+        Returns {'physician': row or None, 'as_regular': bool}.
+        """
+        with self._lock:
+            i, as_regular = self._pick(team, step_down)
+            return {"physician": None if i is None else self.row(i), "as_regular": as_regular}
+
+    def assign(self, team: str, step_down: bool = False, name: str = None):
+        """
+        Assign one patient on `team`, to `name` when given (a manual override
+        that skips the rules) or otherwise to the next physician in line.
+        Returns the same structure as next(); 'physician' is None when
+        nobody on the team can take the patient.
+        """
+        with self._lock:
+            if name is not None:
+                i, as_regular = self._resolve(name), False
+            else:
+                i, as_regular = self._pick(team, step_down)
+            if i is None:
+                return {"physician": None, "as_regular": False}
+
+            p = self.physicians[i]
+            p.add_patient(is_step_down=step_down and not as_regular)
+            self._requeue(i)
+            return {"physician": self.row(i), "as_regular": as_regular}
+
+    def discharge(self, name: str, step_down: bool = False, count: int = 1):
+        """
+        Remove `count` patients from a physician. Raises KeyError, or
+        ValueError (PatientCountError when they have fewer than `count`).
+        """
+        if count < 1:
+            raise ValueError(f"Cannot discharge {count} patients")
+        with self._lock:
+            i = self._resolve(name)
+            self.physicians[i].remove_patients(count, step_down=step_down)
+            self._requeue(i)
+            return self.row(i)
+
+    def correct(self, name: str, changes: dict):
+        """
+        Correct a physician's total_patients, step_down_patients, is_working,
+        is_new or team. Raises KeyError or ValueError.
+        """
+        allowed = {"total_patients", "step_down_patients", "is_working", "is_new", "team"}
+        unknown = set(changes) - allowed
+        if unknown:
+            raise ValueError(f"Cannot correct {', '.join(sorted(unknown))}")
+
+        with self._lock:
+            i = self._resolve(name)
+            p = self.physicians[i]
+            old_team = p.team
+            if "total_patients" in changes:
+                p.set_total_patients(int(changes["total_patients"]))
+            if "step_down_patients" in changes:
+                p.set_step_down_patients(int(changes["step_down_patients"]))
+            for key in ("is_working", "is_new", "team"):
+                if key in changes:
+                    setattr(p, key, changes[key])
+
+            if p.team != old_team:
+                regular, step_down = self._queues(old_team)
+                regular.update(i, None)
+                step_down.update(i, None)
+            self._requeue(i)
+            return self.row(i)
+
+    def snapshot(self):
+        """Current rows in roster order."""
+        with self._lock:
+            return [self.row(i) for i in range(len(self.physicians))]
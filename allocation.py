@@ -3,7 +3,542 @@ Patient allocation algorithm for the Patient Allocator application.
 Implements the original Streamlit allocation strategy.
 """
 
+import contextvars
+import heapq
+from contextlib import contextmanager
+from operator import sub
+
 from models import Physician
+from roster import assign_ids, baseline_counts
+import explain
+from profiling import active_timer
+
+
+def water_fill(levels: list[int], units: int, caps: list[int], tie_break: list = None):
+    """
+    Hand out units as if one at a time to the entry with the lowest
+    (level, tie_break, index), where each entry can take at most caps[i].
+
+    Entries sharing the lowest level are raised together in whole blocks,
+    up to the next level in the heap or the first cap that runs out, so the
+    cost is O(n log n) regardless of how many units are assigned.
+
+    Returns (increments, unassigned).
+    """
+    if tie_break is None:
+        tie_break = [0] * len(levels)
+
+    increments = [0] * len(levels)
+    pending = [(levels[i], tie_break[i], i) for i in range(len(levels)) if caps[i] > 0]
+    heapq.heapify(pending)
+
+    group = set()
+    exhausted_at = []
+    water = 0
+    while units > 0 and (group or pending):
+        if not group:
+            water = pending[0][0]
+        # Everyone sitting at the water line rises with the group
+        while pending and pending[0][0] <= water:
+            _, _, i = heapq.heappop(pending)
+            group.add(i)
+            heapq.heappush(exhausted_at, (levels[i] + caps[i], i))
+        # Drop entries whose cap has been reached
+        while exhausted_at and exhausted_at[0][0] <= water:
+            _, i = heapq.heappop(exhausted_at)
+            group.discard(i)
+            increments[i] = caps[i]
+        if not group:
+            continue
+
+        next_level = exhausted_at[0][0]
+        if pending and pending[0][0] < next_level:
+            next_level = pending[0][0]
+
+        block = len(group) * (next_level - water)
+        if block <= units:
+            units -= block
+            water = next_level
+        else:
+            rise, extra = divmod(units, len(group))
+            water += rise
+            units = 0
+            for i in sorted(group, key=lambda i: (tie_break[i], i))[:extra]:
+                increments[i] += 1
+
+    for i in group:
+        increments[i] += water - levels[i]
+
+    return increments, units
+
+
+def round_robin_quotas(capacities: list[int], remaining: int):
+    """
+    Closed-form equivalent of the round-robin loop.
+
+    The loop gives +1 to every physician with spare capacity on each pass
+    while remaining >= number of physicians. Pass p therefore reaches every
+    physician whose capacity is at least p, so physician i ends up with
+    min(capacity_i, passes). The number of passes is found by walking the
+    sorted capacities once instead of simulating every pass.
+
+    Returns (quotas, passes). passes is None when the pool never drops below
+    the roster size, i.e. everyone is filled to capacity (capacity exhausted).
+    """
+    num_physicians = len(capacities)
+    if num_physicians == 0 or remaining < num_physicians:
+        return [0] * num_physicians, 0
+
+    # Pass p runs while S(p - 1) <= remaining - num_physicians, where
+    # S(q) = sum(min(capacity, q)) is the number handed out by the first q passes
+    budget = remaining - num_physicians
+    handed_out = 0
+    level = 0
+    active = num_physicians
+    last_pass = None
+    for capacity in sorted(capacities):
+        if capacity > level:
+            next_handed_out = handed_out + active * (capacity - level)
+            if next_handed_out > budget:
+                last_pass = level + (budget - handed_out) // active
+                break
+            handed_out = next_handed_out
+            level = capacity
+        active -= 1
+
+    if last_pass is None:
+        return list(capacities), None
+
+    passes = last_pass + 1
+    return [min(capacity, passes) for capacity in capacities], passes
+
+
+def transfer_to_minimum(
+    donor_totals: list[int],
+    donor_recency: list[int],
+    recipient_totals: list[int],
+    minimum_patients: int,
+    maximum_patients: int
+):
+    """
+    Move patients from physicians above minimum_patients to those below it.
+
+    Donors form a max-heap on (total, most recent allocation) and give down
+    towards minimum_patients; recipients form a min-heap on total and are
+    raised towards minimum_patients without passing maximum_patients. Both
+    sides move in blocks through water_fill, so the cost depends on the
+    number of donors and recipients, not on how many patients move.
+
+    Returns (removals, additions, shortfall), where shortfall is the part of
+    the recipients' need that no donor could cover.
+    """
+    supply = [total - minimum_patients for total in donor_totals]
+    ceiling = min(minimum_patients, maximum_patients)
+    needs = [max(0, ceiling - total) for total in recipient_totals]
+
+    total_need = sum(needs)
+    moved = min(sum(supply), total_need)
+
+    # Lowest negated total = highest census gives first
+    removals, _ = water_fill([-total for total in donor_totals], moved, supply, tie_break=donor_recency)
+    additions, _ = water_fill(recipient_totals, moved, needs)
+    return removals, additions, total_need - moved
+
+
+def step_down_queue(
+    totals: list[int],
+    gains: list[int],
+    step_downs: list[int],
+    units: int,
+    maximum_step_down: int,
+    maximum_patients: int
+):
+    """
+    Hand out a step-down pool one unit at a time from a priority queue keyed
+    on (units received, total, gain, index).
+
+    Each unit goes to the entry at the front: a step-down patient while it is
+    below maximum_step_down, otherwise a regular patient while it is below
+    maximum_patients. An entry at both maximums leaves the queue and the unit
+    goes to the next one. Keying on units received first hands out one unit
+    per physician, lowest census then lowest gain first, before anyone gets
+    a second. O(k log n) for k units.
+
+    Returns (step_down_given, regular_given, dropped, unallocated), where
+    dropped lists the entries that left the queue at both maximums and
+    unallocated is the part of the pool nobody could take.
+    """
+    size = len(totals)
+    step_down_given = [0] * size
+    regular_given = [0] * size
+    dropped = []
+
+    queue = [(0, totals[i], gains[i], i) for i in range(size)]
+    heapq.heapify(queue)
+    while units > 0 and queue:
+        received, total, gain, i = queue[0]
+        if step_downs[i] + step_down_given[i] < maximum_step_down:
+            step_down_given[i] += 1
+        elif total < maximum_patients:
+            # At maximum step-down: a regular patient instead
+            regular_given[i] += 1
+            total += 1
+            gain += 1
+        else:
+            heapq.heappop(queue)
+            dropped.append(i)
+            continue
+        heapq.heapreplace(queue, (received + 1, total, gain, i))
+        units -= 1
+
+    return step_down_given, regular_given, dropped, units
+
+
+# Teams every roster has, in order; any other team is added after them as it appears
+DEFAULT_TEAMS = ("A", "B", "N")
+
+# Teams sharing a step-down pool. Teams not listed get a group of their own,
+# placed before the last group, which takes whatever the others leave.
+DEFAULT_STEP_DOWN_GROUPS = (("A",), ("B", "N"))
+
+# Legacy keyword argument holding each default team's new patient pool
+TEAM_POOL_ARGUMENTS = {"A": "n_A_new_patients", "B": "n_B_new_patients", "N": "n_N_new_patients"}
+
+
+def resolve_team_pools(n_A_new_patients: int, n_B_new_patients: int, n_N_new_patients: int, team_pools: dict = None):
+    """
+    New patient pool per team: the legacy A/B/N arguments, overridden and
+    extended by team_pools (team name -> pool size).
+    """
+    pools = {"A": n_A_new_patients, "B": n_B_new_patients, "N": n_N_new_patients}
+    if team_pools:
+        pools.update(team_pools)
+    return pools
+
+
+def group_by_team(physicians: list, teams=DEFAULT_TEAMS):
+    """
+    Physicians by team in one pass, keeping roster order within each team.
+    `teams` are always present (possibly empty) and come first.
+    """
+    groups = {team: [] for team in teams}
+    for physician in physicians:
+        members = groups.get(physician.team)
+        if members is None:
+            members = groups[physician.team] = []
+        members.append(physician)
+    return groups
+
+
+def step_down_groups(teams, groups=DEFAULT_STEP_DOWN_GROUPS):
+    """
+    Partition team names into step-down groups: the configured groups, with
+    each remaining team in a group of its own before the last one.
+    """
+    groups = [list(group) for group in groups]
+    grouped = {team for group in groups for team in group}
+    extra = [[team] for team in teams if team not in grouped]
+    return groups[:-1] + extra + groups[-1:]
+
+
+def split_step_down_by_gain(n_step_down_patients: int, gains: list[int], pools: list[int]):
+    """
+    Split the step-down pool across groups after regular allocation.
+
+    Each group but the last gets the patients it gained beyond its own new
+    patient pool (traded patients cancel out of Gained + Traded less Traded
+    + Pool), capped by what is left; the last group takes the rest.
+    Returns one share per group.
+    """
+    shares = []
+    left = n_step_down_patients
+    for gained, pool in zip(gains[:-1], pools[:-1]):
+        share = max(0, min(gained - pool, left))
+        shares.append(share)
+        left -= share
+    if gains:
+        shares.append(left)
+    return shares
+
+
+def split_step_down_by_headcount(n_step_down_patients: int, counts: dict, remainder_team: str = "B"):
+    """
+    Split new step-down patients across teams in proportion to working doctors
+    on a new shift day. remainder_team takes the rounding remainder; if
+    rounding hands out more than the pool, the excess is taken back from the
+    teams rounded up the most.
+
+    Returns {team: share} with the same keys as counts.
+    """
+    total_working = sum(counts.values())
+    if total_working == 0:
+        return {team: 0 for team in counts}
+
+    shares = {}
+    rounded_up = []
+    for team, count in counts.items():
+        if team == remainder_team:
+            continue
+        exact = n_step_down_patients * count / total_working
+        shares[team] = round(exact) if count > 0 else 0
+        if shares[team] > exact:
+            rounded_up.append((exact - shares[team], team))
+
+    left = n_step_down_patients - sum(shares.values())
+    if left < 0:
+        for _, team in sorted(rounded_up)[:-left]:
+            shares[team] -= 1
+        left = n_step_down_patients - sum(shares.values())
+    shares[remainder_team] = left
+    return shares
+
+
+class TeamTotals:
+    """Running totals over one team's result rows (row positions for columnar results)."""
+
+    __slots__ = ("rows", "working", "original_total", "total", "step_down", "traded", "gained", "stepdown_gained")
+
+    def __init__(self):
+        self.rows = []
+        self.working = 0
+        self.original_total = 0
+        self.total = 0
+        self.step_down = 0
+        self.traded = 0
+        self.gained = 0
+        self.stepdown_gained = 0
+
+    def to_dict(self):
+        return {
+            "count": len(self.rows),
+            "working": self.working,
+            "original_total": self.original_total,
+            "total": self.total,
+            "step_down": self.step_down,
+            "traded": self.traded,
+            "gained": self.gained,
+            "stepdown_gained": self.stepdown_gained,
+        }
+
+
+class ResultsBuilder:
+    """
+    Collects result rows and every team and overall aggregate in one pass.
+
+    Each row updates its team's TeamTotals as it is added, so the summary,
+    the per-team groups and the print views never re-read the rows; overall
+    totals are sums over teams. Teams A, B and N are always present and come
+    first; others follow in order of appearance.
+    """
+
+    __slots__ = ("results", "teams")
+
+    def __init__(self, teams=DEFAULT_TEAMS):
+        self.results = []
+        self.teams = {team: TeamTotals() for team in teams}
+
+    @classmethod
+    def from_results(cls, results: list[dict]):
+        """Aggregate existing result rows, e.g. ones sent back by the browser."""
+        builder = cls()
+        for row in results:
+            builder.add(row)
+        return builder
+
+    def team(self, name):
+        """TeamTotals for a team, created on first use."""
+        team = self.teams.get(name)
+        if team is None:
+            team = self.teams[name] = TeamTotals()
+        return team
+
+    def add(self, row: dict):
+        """Append a result row and fold it into the totals. Missing counts read as 0."""
+        team = self.team(row.get("team", "A"))
+        team.rows.append(row)
+        team.working += bool(row.get("is_working", True))
+        team.original_total += row.get("original_total_patients", 0)
+        team.total += row.get("total_patients", 0)
+        team.step_down += row.get("step_down_patients", 0)
+        team.traded += row.get("traded_patients", 0)
+        team.gained += row.get("gained", 0)
+        team.stepdown_gained += row.get("gained_step_down", 0)
+        self.results.append(row)
+
+    @property
+    def total_census(self):
+        return sum(team.total for team in self.teams.values())
+
+    @property
+    def total_stepdown(self):
+        return sum(team.step_down for team in self.teams.values())
+
+    @property
+    def total_gained(self):
+        return sum(team.gained for team in self.teams.values())
+
+    @property
+    def working_count(self):
+        return sum(team.working for team in self.teams.values())
+
+    def summary(self):
+        """
+        Team and overall totals. 'teams' holds every team's totals; the
+        team_a/b/n keys are kept for existing callers.
+        """
+        team_a, team_b, team_n = self.teams["A"], self.teams["B"], self.teams["N"]
+        return {
+            "team_a_total": team_a.total,
+            "team_b_total": team_b.total,
+            "team_n_total": team_n.total,
+            "team_a_gained": team_a.gained,
+            "team_b_gained": team_b.gained,
+            "team_n_gained": team_n.gained,
+            "team_a_stepdown_gained": team_a.stepdown_gained,
+            "team_b_stepdown_gained": team_b.stepdown_gained,
+            "team_n_stepdown_gained": team_n.stepdown_gained,
+            "team_a_traded": team_a.traded,
+            "team_b_traded": team_b.traded,
+            "total_census": self.total_census,
+            "total_stepdown": self.total_stepdown,
+            "total_gained": self.total_gained,
+            "working_count": self.working_count,
+            "teams": {name: totals.to_dict() for name, totals in self.teams.items()}
+        }
+
+
+# Keys of a result row, in order; columnar results list them once
+RESULT_COLUMNS = (
+    "name", "yesterday", "team", "is_new", "is_buffer", "is_working",
+    "original_total_patients", "total_patients", "original_step_down", "step_down_patients",
+    "transferred_patients", "traded_patients", "gained", "gained_step_down", "gained_plus_traded"
+)
+
+_columnar = contextvars.ContextVar("columnar_results", default=False)
+
+
+@contextmanager
+def columnar_results(enabled: bool = True):
+    """
+    Have engines run inside the block return columnar results:
+    {"columns": RESULT_COLUMNS, "values": [one list per column], "length": n}
+    instead of a list of row dicts.
+    """
+    token = _columnar.set(enabled)
+    try:
+        yield
+    finally:
+        _columnar.reset(token)
+
+
+def build_results(physicians: list[Physician], initial_counts: list[int], initial_stepdown_counts: list[int]):
+    """
+    Build the per-physician result rows and team summary after allocation.
+
+    initial_counts and initial_stepdown_counts are indexed by physician ID
+    and hold the counts before allocation. Returns (results, summary);
+    results are columnar inside a columnar_results() block.
+    """
+    if _columnar.get():
+        return build_columns(physicians, initial_counts, initial_stepdown_counts)
+
+    builder = ResultsBuilder()
+    results = builder.results
+    teams = builder.teams
+    # Calculate results with gains, folding each row into its team's totals
+    # inline rather than through ResultsBuilder.add, as this runs on every allocation
+    for physician in physicians:
+        total = physician.total_patients
+        step_down = physician.step_down_patients
+        original_total = initial_counts[physician.id]
+        original_stepdown = initial_stepdown_counts[physician.id]
+        gained = total - original_total
+        gained_stepdown = step_down - original_stepdown
+
+        row = {
+            "name": physician.name,
+            "yesterday": physician.yesterday,
+            "team": physician.team,
+            "is_new": physician.is_new,
+            "is_buffer": physician.is_buffer,
+            "is_working": physician.is_working,
+            "original_total_patients": original_total,
+            "total_patients": total,
+            "original_step_down": original_stepdown,
+            "step_down_patients": step_down,
+            "transferred_patients": physician.transferred_patients,
+            "traded_patients": physician.traded_patients,
+            "gained": gained,
+            "gained_step_down": gained_stepdown,
+            "gained_plus_traded": gained + physician.traded_patients
+        }
+        results.append(row)
+
+        team = teams.get(physician.team) or builder.team(physician.team)
+        team.rows.append(row)
+        team.working += physician.is_working
+        team.original_total += original_total
+        team.total += total
+        team.step_down += step_down
+        team.traded += physician.traded_patients
+        team.gained += gained
+        team.stepdown_gained += gained_stepdown
+
+    return results, builder.summary()
+
+
+def build_columns(physicians: list[Physician], initial_counts: list[int], initial_stepdown_counts: list[int]):
+    """
+    build_results laid out as columns: each column is built in one pass over
+    the physicians, and no row dicts are created. Returns (results, summary).
+    """
+    builder = ResultsBuilder()
+    totals = [p.total_patients for p in physicians]
+    step_downs = [p.step_down_patients for p in physicians]
+    original_totals = [initial_counts[p.id] for p in physicians]
+    original_stepdowns = [initial_stepdown_counts[p.id] for p in physicians]
+    traded = [p.traded_patients for p in physicians]
+    team_names = [p.team for p in physicians]
+    working = [p.is_working for p in physicians]
+    gained = list(map(sub, totals, original_totals))
+    gained_stepdown = list(map(sub, step_downs, original_stepdowns))
+
+    teams = builder.teams
+    for index, name in enumerate(team_names):
+        team = teams.get(name) or builder.team(name)
+        team.rows.append(index)
+        team.working += working[index]
+        team.original_total += original_totals[index]
+        team.total += totals[index]
+        team.step_down += step_downs[index]
+        team.traded += traded[index]
+        team.gained += gained[index]
+        team.stepdown_gained += gained_stepdown[index]
+
+    values = [
+        [p.name for p in physicians],
+        [p.yesterday for p in physicians],
+        team_names,
+        [p.is_new for p in physicians],
+        [p.is_buffer for p in physicians],
+        working,
+        original_totals,
+        totals,
+        original_stepdowns,
+        step_downs,
+        [p.transferred_patients for p in physicians],
+        traded,
+        gained,
+        gained_stepdown,
+        list(map(sum, zip(gained, traded))),
+    ]
+    results = {"columns": list(RESULT_COLUMNS), "values": values, "length": len(physicians)}
+    return results, builder.summary()
+
+
+def summarize_results(results: list[dict]):
+    """Team and overall totals for a list of result rows; see ResultsBuilder.summary."""
+    return ResultsBuilder.from_results(results).summary()
 
 
 def allocate_patients(
@@ -17,7 +552,8 @@ def allocate_patients(
     n_step_down_patients: int = 0,
     maximum_patients: int = 1000,
     maximum_step_down: int = 1,
-    is_new_shift_day: bool = False
+    is_new_shift_day: bool = False,
+    team_pools: dict = None
 ):
     """
     Allocate patients to physicians using the original Streamlit algorithm.
@@ -27,51 +563,64 @@ def allocate_patients(
     2. Sort all working physicians by total patients (low to high)
     3. Allocate to new physicians until they reach new_start_number
     4. Round-robin distribution to non-new physicians
-    5. Step-down allocation (AFTER regular) using Gained+Traded formula
+    5. Step-down allocation (AFTER regular) using Gained+Traded formula,
+       lowest census first until each group's share is spent
     6. Final verification for new physicians
     7. Minimum patients check with redistribution
 
-    Returns a dictionary with results and summary statistics.
+    Teams are not limited to A, B and N: team_pools maps any team name to
+    its new patient pool, overriding the n_A/n_B/n_N arguments for those
+    teams. Step-down pools are shared per DEFAULT_STEP_DOWN_GROUPS.
+
+    Returns a dictionary with results and summary statistics. If the pool
+    cannot fit under maximum_patients, the leftover is reported through
+    capacity_exhausted and unallocated_patients, and the step-down patients
+    among them through unallocated_step_down; minimum_shortfall counts
+    patients still missing to bring everyone up to minimum_patients.
+    Phase timings go to profiling.active_timer() when profiling is on, and
+    each decision to explain.active_trace() when tracing. Physicians are
+    given their position in `physicians` as their ID.
     """
-    # Store initial patient counts for even distribution later
-    initial_counts = {p.name: p.total_patients for p in physicians}
+    # Phase timer; a no-op unless the caller is profiling
+    timer = active_timer()
+    timer.start()
+
+    # Decision trace; None unless the caller asked for an explanation
+    trace = explain.active_trace()
 
-    # Store initial pool sizes for tracking
-    initial_A_pool = n_A_new_patients
-    initial_B_pool = n_B_new_patients
-    initial_N_pool = n_N_new_patients
+    # Store initial patient counts for even distribution later, indexed by physician ID
+    assign_ids(physicians)
+    initial_counts, initial_stepdown_counts = baseline_counts(physicians)
 
-    # Make team lists
-    team_A = [p for p in physicians if p.team == 'A']
-    team_B = [p for p in physicians if p.team == 'B']
-    team_N = [p for p in physicians if p.team == 'N']
+    # New patient pool per team
+    pools = resolve_team_pools(n_A_new_patients, n_B_new_patients, n_N_new_patients, team_pools)
+
+    # Make team lists in one pass
+    teams = group_by_team(physicians)
 
     # Helper function to check if physician can take more patients
     def can_take_patient(physician):
         return physician.total_patients < maximum_patients
 
-    # Store initial stepdown counts for gained calculation
-    initial_stepdown_counts = {p.name: p.step_down_patients for p in physicians}
-
-    # Helper function to check if physician can take a step down patient
-    def can_take_step_down(physician):
-        return physician.step_down_patients < maximum_step_down
+    # Patients that could not be placed because every physician is at capacity
+    unallocated_patients = 0
+    # The step-down part of unallocated_patients
+    unallocated_step_down = 0
+    # Patients still missing to bring everyone working up to minimum_patients
+    minimum_shortfall = 0
+    timer.lap("setup")
 
     if is_new_shift_day:
         # ========== NEW SHIFT DAY ALLOCATION ==========
         # Even redistribution of all patients within each team
 
-        working_team_A = [p for p in team_A if p.is_working]
-        working_team_B = [p for p in team_B if p.is_working]
-        working_team_N = [p for p in team_N if p.is_working]
-
-        total_working = len(working_team_A) + len(working_team_B) + len(working_team_N)
+        working_teams = {team: [p for p in members if p.is_working] for team, members in teams.items()}
 
-        if total_working > 0:
+        if any(working_teams.values()):
             # Split new stepdown proportionally across teams by doctor count
-            sd_A = round(n_step_down_patients * len(working_team_A) / total_working) if len(working_team_A) > 0 else 0
-            sd_N = round(n_step_down_patients * len(working_team_N) / total_working) if len(working_team_N) > 0 else 0
-            sd_B = n_step_down_patients - sd_A - sd_N
+            team_step_down = split_step_down_by_headcount(
+                n_step_down_patients, {team: len(docs) for team, docs in working_teams.items()}
+            )
 
             def redistribute_team(team_docs, new_pool, new_stepdown):
                 if not team_docs:
@@ -95,7 +644,7 @@ def allocate_patients(
 
                 combined_targets = {}
                 for i, doc in enumerate(priority_order):
-                    combined_targets[doc.name] = base_target + (1 if i < remainder else 0)
+                    combined_targets[doc.id] = base_target + (1 if i < remainder else 0)
 
                 # Stepdown distribution (even within team)
                 total_team_sd = existing_stepdown + new_stepdown
@@ -103,35 +652,41 @@ def allocate_patients(
                 sd_remainder = total_team_sd % num_docs
 
                 # Doctors with lowest existing stepdown get priority for +1
-                sd_sorted = sorted(team_docs, key=lambda p: initial_stepdown_counts.get(p.name, 0))
+                sd_sorted = sorted(team_docs, key=lambda p: initial_stepdown_counts[p.id])
 
                 sd_targets = {}
                 for i, doc in enumerate(sd_sorted):
                     sd_target = sd_base + (1 if i < sd_remainder else 0)
                     sd_target = min(sd_target, maximum_step_down)
-                    sd_targets[doc.name] = sd_target
+                    sd_targets[doc.id] = sd_target
 
                 # Set each doctor's patients
                 for doc in team_docs:
-                    combined = combined_targets[doc.name]
-                    sd = sd_targets[doc.name]
+                    combined = combined_targets[doc.id]
+                    sd = sd_targets[doc.id]
                     regular = max(0, combined - sd)
 
                     # Apply min/max bounds to regular patients
                     regular = min(regular, maximum_patients)
                     regular = max(regular, minimum_patients)
 
+                    if trace is not None:
+                        if regular != doc.total_patients:
+                            trace.record(explain.NEW_SHIFT_TOTAL, doc, regular - doc.total_patients)
+                        if sd != doc.step_down_patients:
+                            trace.record(explain.NEW_SHIFT_STEP_DOWN, doc, sd - doc.step_down_patients)
+
                     doc.total_patients = regular
                     doc.step_down_patients = sd
 
-            redistribute_team(working_team_A, n_A_new_patients, sd_A)
-            redistribute_team(working_team_B, n_B_new_patients, sd_B)
-            redistribute_team(working_team_N, n_N_new_patients, sd_N)
+            for team, docs in working_teams.items():
+                redistribute_team(docs, pools.get(team, 0), team_step_down[team])
+        timer.lap("new_shift_day")
 
     else:
         # ========== REGULAR ALLOCATION LOGIC ==========
         # Step 1: Calculate total patients to distribute
-        total_to_distribute = n_A_new_patients + n_B_new_patients + n_N_new_patients + n_step_down_patients
+        total_to_distribute = sum(pools.values()) + n_step_down_patients
 
         # Step 2: Get all working physicians and sort by total patients (low to high)
         all_working = [p for p in physicians if p.is_working]
@@ -146,207 +701,157 @@ def allocate_patients(
                 continue
             needed = new_start_number - physician.total_patients
             to_give = min(needed, remaining)
-            for _ in range(to_give):
-                physician.add_patient()
-                remaining -= 1
+            physician.set_total_patients(physician.total_patients + to_give)
+            remaining -= to_give
+            if trace is not None and to_give:
+                trace.record(explain.NEW_TOP_UP, physician, to_give)
+        timer.lap("new_physician_top_up")
 
         # Step 4: Get non-new physicians for general distribution
         non_new = [p for p in all_working if not p.is_new]
         num_non_new = len(non_new)
 
-        # Track allocation order for minimum check function
-        allocation_order = []
+        # Sequence number of each physician's most recent allocation (larger = later),
+        # used by the minimum check. Pass p reaches physicians in roster order, so
+        # (pass, roster index) orders round-robin allocations in time; -1 = never.
+        last_allocation = [-1] * len(physicians)
+        allocations_made = 0
 
         if remaining > 0 and num_non_new > 0:
-            # Round-robin: while remaining >= num_non_new, give +1 to ALL non-new physicians
-            while remaining >= num_non_new:
-                for physician in non_new:
-                    if can_take_patient(physician):
-                        physician.add_patient()
-                        remaining -= 1
-                        allocation_order.append(physician)
-
-            # Now remaining < num_non_new
+            # Round-robin: while remaining >= num_non_new, give +1 to ALL non-new physicians.
+            # Quotas are worked out in one pass instead of looping over the pool.
+            capacities = [max(0, maximum_patients - p.total_patients) for p in non_new]
+            quotas, passes = round_robin_quotas(capacities, remaining)
+
+            for i, (physician, quota) in enumerate(zip(non_new, quotas)):
+                if quota > 0:
+                    physician.set_total_patients(physician.total_patients + quota)
+                    last_allocation[physician.id] = quota * num_non_new + i
+            allocations_made = sum(quotas)
+            if trace is not None:
+                trace.record_many(explain.ROUND_ROBIN, non_new, quotas)
+            remaining -= allocations_made
+
+            # Now remaining < num_non_new, unless everyone hit maximum_patients
             # Give remaining to physicians with lowest totals (for even distribution)
-            if remaining > 0:
-                non_new.sort(key=lambda x: x.total_patients)
-                for physician in non_new:
-                    if remaining <= 0:
-                        break
-                    if can_take_patient(physician):
-                        physician.add_patient()
-                        remaining -= 1
-                        allocation_order.append(physician)
+            if remaining > 0 and passes is not None:
+                totals = [p.total_patients for p in non_new]
+                caps = [1 if can_take_patient(p) else 0 for p in non_new]
+                extra, remaining = water_fill(totals, remaining, caps)
+
+                recipients = sorted((i for i in range(num_non_new) if extra[i]), key=lambda i: totals[i])
+                for rank, i in enumerate(recipients):
+                    non_new[i].add_patient()
+                    last_allocation[non_new[i].id] = (passes + 1) * num_non_new + rank
+                if trace is not None:
+                    trace.record_many(explain.LEFTOVER, [non_new[i] for i in recipients], [1] * len(recipients))
+                allocations_made += len(recipients)
+
+        unallocated_patients = remaining
+        timer.lap("round_robin")
 
         # ========== STEP-DOWN ALLOCATION ==========
-        # Filter to only working physicians
-        working_team_A = [p for p in team_A if p.is_working]
-        working_team_B = [p for p in team_B if p.is_working]
-        working_team_N = [p for p in team_N if p.is_working]
-
-        # Calculate gained for each physician (current total - initial total)
-        team_A_gained = sum(p.total_patients - initial_counts.get(p.name, p.total_patients) for p in working_team_A)
-        team_B_gained = sum(p.total_patients - initial_counts.get(p.name, p.total_patients) for p in working_team_B)
-
-        # Calculate traded patients
-        traded_A_to_B = sum(p.traded_patients for p in working_team_B)  # B received from A
-        traded_B_to_A = sum(p.traded_patients for p in working_team_A)  # A received from B
-
-        # Total "Gained + Traded" for each team
-        team_A_gained_plus_traded = team_A_gained + traded_B_to_A
-        team_B_gained_plus_traded = team_B_gained + traded_A_to_B
-
-        # Calculate how many step-down patients Team A should get
-        # StepDown for Team A = (Gained + Traded for Team A) - (Traded B→A + Team A Pool)
-        stepdown_for_A = team_A_gained_plus_traded - (traded_B_to_A + n_A_new_patients)
-        stepdown_for_A = max(0, min(stepdown_for_A, n_step_down_patients))
-
-        # Remaining goes to Team B and Team N
-        stepdown_for_B_and_N = n_step_down_patients - stepdown_for_A
-
-        # Allocate step-down to Team A (sorted by lowest census, then lowest gain)
-        team_A_sorted = sorted(working_team_A, key=lambda x: (
-            x.total_patients,
-            x.total_patients - initial_counts.get(x.name, x.total_patients)
-        ))
-        remaining_A = stepdown_for_A
-
-        for physician in team_A_sorted:
-            if remaining_A <= 0:
-                break
-            if can_take_step_down(physician):
-                physician.add_patient(is_step_down=True)
-            else:
-                # At max stepdown — give regular patient instead
-                if can_take_patient(physician):
-                    physician.add_patient(is_step_down=False)
-            remaining_A -= 1
-
-        # Allocate step-down to Team B and Team N (combined, sorted by lowest census, then lowest gain)
-        team_B_and_N = working_team_B + working_team_N
-        team_B_and_N_sorted = sorted(team_B_and_N, key=lambda x: (
-            x.total_patients,
-            x.total_patients - initial_counts.get(x.name, x.total_patients)
-        ))
-        remaining_B_N = stepdown_for_B_and_N
-
-        for physician in team_B_and_N_sorted:
-            if remaining_B_N <= 0:
-                break
-            if can_take_step_down(physician):
-                physician.add_patient(is_step_down=True)
-            else:
-                # At max stepdown — give regular patient instead
-                if can_take_patient(physician):
-                    physician.add_patient(is_step_down=False)
-            remaining_B_N -= 1
+        # Working physicians of each step-down group, in group then roster order
+        groups = step_down_groups(teams)
+        group_docs = [[p for team in group for p in teams.get(team, ()) if p.is_working] for group in groups]
+
+        # Calculate gained for each group (current total - initial total)
+        group_gains = [
+            sum(p.total_patients - initial_counts[p.id] for p in docs)
+            for docs in group_docs
+        ]
+        group_pools = [sum(pools.get(team, 0) for team in group) for group in groups]
+
+        # StepDown for a group = (Gained + Traded) - (Traded + Group Pool), in
+        # group order; the last group (Teams B+N by default) gets the rest
+        group_step_down = split_step_down_by_gain(n_step_down_patients, group_gains, group_pools)
+
+        def allocate_step_down(team_docs, count):
+            """
+            Lowest census then lowest gain first, one unit per physician per
+            round, until the group's share is spent. Returns the unplaced part.
+            """
+            if count <= 0:
+                return 0
+            step_down_given, regular_given, dropped, left = step_down_queue(
+                [p.total_patients for p in team_docs],
+                [p.total_patients - initial_counts[p.id] for p in team_docs],
+                [p.step_down_patients for p in team_docs],
+                count,
+                maximum_step_down,
+                maximum_patients
+            )
+            for physician, step_down, regular in zip(team_docs, step_down_given, regular_given):
+                if step_down:
+                    physician.add_patients(step_down, step_down=True)
+                if regular:
+                    # At max stepdown — regular patients instead
+                    physician.add_patients(regular)
+            if trace is not None:
+                trace.record_many(explain.STEP_DOWN, team_docs, step_down_given)
+                trace.record_many(explain.STEP_DOWN_AS_REGULAR, team_docs, regular_given)
+                for i in dropped:
+                    trace.record(explain.STEP_DOWN_SKIPPED, team_docs[i], 0)
+            return left
+
+        if trace is not None:
+            trace.group_names = groups
+            for index, share in enumerate(group_step_down):
+                trace.record_index(explain.STEP_DOWN_SHARE, index, share)
+
+        # Allocate step-down group by group (Team A, then Teams B and N combined)
+        for docs, count in zip(group_docs, group_step_down):
+            unallocated_step_down += allocate_step_down(docs, count)
+        unallocated_patients += unallocated_step_down
+        timer.lap("step_down")
 
         # Final verification: Ensure new physicians who started at/above new_start_number have gained 0 patients
         for physician in physicians:
             if physician.is_new:
-                initial_total = initial_counts.get(physician.name, physician.total_patients)
+                initial_total = initial_counts[physician.id]
                 current_total = physician.total_patients
                 gained = current_total - initial_total
 
                 if initial_total >= new_start_number:
                     if gained > 0:
-                        excess = gained
-                        for _ in range(excess):
-                            physician.remove_patient()
-                        physician.set_total_patients(initial_total)
+                        if trace is not None:
+                            trace.record(explain.NEW_VERIFICATION, physician, -gained)
+                        physician.remove_patients(gained)
+        timer.lap("new_physician_verification")
 
         # ========== MINIMUM PATIENTS CHECK ==========
         # Check if any physicians are below minimum_patients and redistribute if needed
         all_working = [p for p in physicians if p.is_working]
         below_minimum = [p for p in all_working if p.total_patients < minimum_patients]
 
-        if below_minimum:
-            # Calculate total shortfall
-            total_shortfall = sum(minimum_patients - p.total_patients for p in below_minimum)
-
-            # Use allocation_order (most recent first when reversed) to determine source physicians
-            if allocation_order:
-                allocation_index = {}
-                for idx, physician in enumerate(reversed(allocation_order)):
-                    if physician not in allocation_index:
-                        allocation_index[physician] = idx
-
-                # Get all physicians above minimum, sort by: highest total first, then most recent allocation
-                potential_sources = [p for p in all_working if p.total_patients > minimum_patients]
-                potential_sources.sort(key=lambda x: (-x.total_patients, allocation_index.get(x, 999)))
-
-                # Redistribute: take from physicians with highest total (and most recent allocation)
-                # and give to physicians below minimum
-                below_minimum_sorted = sorted(below_minimum, key=lambda x: x.total_patients)
-                used_sources = set()
-
-                for target_physician in below_minimum_sorted:
-                    if target_physician.total_patients >= minimum_patients:
-                        continue
-
-                    needed = minimum_patients - target_physician.total_patients
-
-                    for source_physician in potential_sources:
-                        if needed <= 0:
-                            break
-                        if source_physician in used_sources:
-                            continue
-                        if source_physician.total_patients > minimum_patients and can_take_patient(target_physician):
-                            source_physician.remove_patient()
-                            target_physician.add_patient()
-                            used_sources.add(source_physician)
-                            needed -= 1
-
-                        if target_physician.total_patients >= minimum_patients:
-                            break
-
-    # Calculate results with gains
-    results = []
-    for physician in physicians:
-        original_total = initial_counts.get(physician.name, 0)
-        original_stepdown = initial_stepdown_counts.get(physician.name, 0)
-        gained = physician.total_patients - original_total
-        gained_stepdown = physician.step_down_patients - original_stepdown
-
-        results.append({
-            "name": physician.name,
-            "yesterday": physician.yesterday,
-            "team": physician.team,
-            "is_new": physician.is_new,
-            "is_buffer": physician.is_buffer,
-            "is_working": physician.is_working,
-            "original_total_patients": original_total,
-            "total_patients": physician.total_patients,
-            "original_step_down": original_stepdown,
-            "step_down_patients": physician.step_down_patients,
-            "transferred_patients": physician.transferred_patients,
-            "traded_patients": physician.traded_patients,
-            "gained": gained,
-            "gained_step_down": gained_stepdown,
-            "gained_plus_traded": gained + physician.traded_patients
-        })
-
-    # Calculate summary statistics
-    team_a_results = [r for r in results if r["team"] == "A"]
-    team_b_results = [r for r in results if r["team"] == "B"]
-    team_n_results = [r for r in results if r["team"] == "N"]
-
-    summary = {
-        "team_a_total": sum(r["total_patients"] for r in team_a_results),
-        "team_b_total": sum(r["total_patients"] for r in team_b_results),
-        "team_n_total": sum(r["total_patients"] for r in team_n_results),
-        "team_a_gained": sum(r["gained"] for r in team_a_results),
-        "team_b_gained": sum(r["gained"] for r in team_b_results),
-        "team_n_gained": sum(r["gained"] for r in team_n_results),
-        "team_a_stepdown_gained": sum(r["gained_step_down"] for r in team_a_results),
-        "team_b_stepdown_gained": sum(r["gained_step_down"] for r in team_b_results),
-        "team_n_stepdown_gained": sum(r["gained_step_down"] for r in team_n_results),
-        "team_a_traded": sum(r["traded_patients"] for r in team_a_results),
-        "team_b_traded": sum(r["traded_patients"] for r in team_b_results),
-        "total_census": sum(r["total_patients"] for r in results),
-        "total_stepdown": sum(r["step_down_patients"] for r in results),
-        "total_gained": sum(r["gained"] for r in results)
-    }
+        if below_minimum and allocations_made:
+            # Donors: highest total first, then most recent allocation (never allocated last)
+            donors = [p for p in all_working if p.total_patients > minimum_patients]
+            donor_recency = [-last_allocation[p.id] for p in donors]
+
+            removals, additions, _ = transfer_to_minimum(
+                [p.total_patients for p in donors],
+                donor_recency,
+                [p.total_patients for p in below_minimum],
+                minimum_patients,
+                maximum_patients
+            )
+            for physician, n in zip(donors, removals):
+                if n:
+                    physician.set_total_patients(physician.total_patients - n)
+            for physician, n in zip(below_minimum, additions):
+                if n:
+                    physician.set_total_patients(physician.total_patients + n)
+            if trace is not None:
+                trace.record_many(explain.MINIMUM_DONOR, donors, [-n for n in removals])
+                trace.record_many(explain.MINIMUM_RECIPIENT, below_minimum, additions)
+
+        # Anything still below minimum could not be covered by redistribution
+        minimum_shortfall = sum(max(0, minimum_patients - p.total_patients) for p in all_working)
+        timer.lap("minimum_check")
+
+    results, summary = build_results(physicians, initial_counts, initial_stepdown_counts)
+    timer.lap("results")
 
     return {
         "results": results,
@@ -356,6 +861,11 @@ def allocate_patients(
             "n_A_new_patients": n_A_new_patients,
             "n_B_new_patients": n_B_new_patients,
             "n_N_new_patients": n_N_new_patients,
-            "n_step_down_patients": n_step_down_patients
-        }
+            "n_step_down_patients": n_step_down_patients,
+            "team_pools": pools
+        },
+        "capacity_exhausted": unallocated_patients > 0,
+        "unallocated_patients": unallocated_patients,
+        "unallocated_step_down": unallocated_step_down,
+        "minimum_shortfall": minimum_shortfall
     }
@@ -0,0 +1,369 @@
+"""
+Array-backed allocation kernel for the Patient Allocator application.
+
+Runs the same policy as allocation.allocate_patients on integer NumPy
+columns instead of Physician objects, so what-if studies over very large
+rosters avoid per-patient Python calls. NumPy is optional: the web app
+does not need it, and calling the kernel without it raises ImportError.
+"""
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from models import Physician
+from roster import assign_ids, baseline_counts
+from allocation import (
+    DEFAULT_TEAMS, build_results, resolve_team_pools, step_down_groups,
+    split_step_down_by_gain, split_step_down_by_headcount, step_down_queue
+)
+
+# Integer team codes of the default teams; other teams are numbered after them per roster
+TEAM_CODES = {team: code for code, team in enumerate(DEFAULT_TEAMS)}
+
+
+def require_numpy():
+    """Raise ImportError when NumPy, which the array kernel runs on, is not installed."""
+    if np is None:
+        raise ImportError("The array allocation kernel requires numpy (pip install numpy)")
+
+
+def roster_to_columns(physicians: list[Physician]):
+    """
+    Convert Physician objects into the integer columns taken by allocate_arrays.
+
+    Rows are physician IDs (positions in the list). teams lists the team
+    name of each team code.
+    """
+    require_numpy()
+    team_codes = dict(TEAM_CODES)
+    return {
+        "totals": np.array([p.total_patients for p in physicians], dtype=np.int64),
+        "step_down": np.array([p.step_down_patients for p in physicians], dtype=np.int64),
+        "traded": np.array([p.traded_patients for p in physicians], dtype=np.int64),
+        "team": np.array([team_codes.setdefault(p.team, len(team_codes)) for p in physicians], dtype=np.int64),
+        "is_new": np.array([p.is_new for p in physicians], dtype=bool),
+        "is_working": np.array([p.is_working for p in physicians], dtype=bool),
+        "teams": list(team_codes),
+    }
+
+
+def _water_fill(levels, units, caps, tie_break=None):
+    """
+    Vectorised allocation.water_fill: find the final water line from the
+    sorted level/cap breakpoints, then hand the remainder to entries sitting
+    on the line in (tie_break, index) order. Returns (increments, unassigned).
+    """
+    size = levels.size
+    if size == 0 or units <= 0:
+        return np.zeros(size, dtype=np.int64), units
+    if tie_break is None:
+        tie_break = np.zeros(size, dtype=np.int64)
+
+    ends = levels + caps
+    sorted_starts = np.sort(levels)
+    sorted_ends = np.sort(ends)
+    start_sums = np.concatenate(([0], np.cumsum(sorted_starts)))
+    end_sums = np.concatenate(([0], np.cumsum(sorted_ends)))
+
+    def filled(water):
+        # sum(clip(water - level, 0, cap)) for a scalar or array water line
+        started = np.searchsorted(sorted_starts, water, side='right')
+        ended = np.searchsorted(sorted_ends, water, side='right')
+        return started * water - start_sums[started] - (ended * water - end_sums[ended])
+
+    candidates = np.unique(np.concatenate((levels, ends)))
+    k = int(np.searchsorted(filled(candidates), units, side='right')) - 1
+    water = int(candidates[k])
+    if k < candidates.size - 1:
+        slope = int(np.count_nonzero((levels <= water) & (ends > water)))
+        water += (units - int(filled(water))) // slope
+
+    increments = np.clip(water - levels, 0, caps)
+    units -= int(increments.sum())
+    if units > 0:
+        on_line = (levels <= water) & (ends > water)
+        order = np.lexsort((tie_break,))
+        order = order[on_line[order]][:units]
+        increments[order] += 1
+        units -= order.size
+    return increments, units
+
+
+def _round_robin_quotas(capacities, remaining):
+    """Vectorised allocation.round_robin_quotas. Returns (quotas, passes)."""
+    size = capacities.size
+    if size == 0 or remaining < size:
+        return np.zeros(size, dtype=np.int64), 0
+
+    budget = remaining - size
+    sorted_caps = np.sort(capacities)
+    below = np.concatenate(([0], np.cumsum(sorted_caps)[:-1]))
+    # Patients handed out by the first c passes, evaluated at each sorted capacity c
+    handed_out = below + sorted_caps * (size - np.arange(size))
+    k = int(np.searchsorted(handed_out, budget, side='right'))
+    if k == size:
+        return capacities.copy(), None
+
+    level = int(sorted_caps[k - 1]) if k else 0
+    level_handed_out = int(handed_out[k - 1]) if k else 0
+    passes = level + (budget - level_handed_out) // (size - k) + 1
+    return np.minimum(capacities, passes), passes
+
+
+def allocate_arrays(
+    totals,
+    step_down,
+    traded,
+    team,
+    is_new,
+    is_working,
+    n_A_new_patients: int,
+    n_B_new_patients: int,
+    n_N_new_patients: int,
+    new_start_number: int,
+    minimum_patients: int = 10,
+    n_step_down_patients: int = 0,
+    maximum_patients: int = 1000,
+    maximum_step_down: int = 1,
+    is_new_shift_day: bool = False,
+    teams=None,
+    team_pools: dict = None
+):
+    """
+    Run every allocation phase as array operations on one roster.
+
+    Columns are parallel arrays indexed by roster row; team holds team codes
+    and teams[code] is the team's name (DEFAULT_TEAMS when not given).
+    team_pools works as in allocate_patients. Inputs are not modified. Returns a dict with the final totals
+    and step_down arrays plus capacity_exhausted, unallocated_patients,
+    unallocated_step_down and minimum_shortfall, matching allocation.allocate_patients.
+    """
+    require_numpy()
+    t = np.array(totals, dtype=np.int64)
+    sd = np.array(step_down, dtype=np.int64)
+    traded = np.asarray(traded, dtype=np.int64)
+    team = np.asarray(team, dtype=np.int64)
+    new = np.asarray(is_new, dtype=bool)
+    working = np.asarray(is_working, dtype=bool)
+    size = t.size
+
+    initial_t = t.copy()
+    initial_sd = sd.copy()
+
+    teams = list(teams or DEFAULT_TEAMS)
+    pools = resolve_team_pools(n_A_new_patients, n_B_new_patients, n_N_new_patients, team_pools)
+    team_codes = {name: code for code, name in enumerate(teams)}
+    # Working rows of each team code in roster order, from one stable sort
+    working_rows = np.flatnonzero(working)
+    by_team = working_rows[np.argsort(team[working_rows], kind='stable')]
+    bounds = np.searchsorted(team[by_team], np.arange(len(teams) + 1))
+    team_rows = [by_team[bounds[code]:bounds[code + 1]] for code in range(len(teams))]
+
+    unallocated_patients = 0
+    unallocated_step_down = 0
+    minimum_shortfall = 0
+
+    if is_new_shift_day:
+        # ========== NEW SHIFT DAY ALLOCATION ==========
+        if working_rows.size > 0:
+            team_step_down = split_step_down_by_headcount(
+                n_step_down_patients, {name: int(rows.size) for name, rows in zip(teams, team_rows)}
+            )
+
+            for name, rows in zip(teams, team_rows):
+                new_pool = pools.get(name, 0)
+                new_stepdown = team_step_down[name]
+                num_docs = rows.size
+                if num_docs == 0:
+                    continue
+                ranks = np.arange(num_docs)
+
+                team_census = int(t[rows].sum()) + int(sd[rows].sum()) + new_pool + new_stepdown
+                base_target, remainder = divmod(team_census, num_docs)
+                # Targets are laid out by position within rows
+                priority_order = np.concatenate((np.flatnonzero(~new[rows]), np.flatnonzero(new[rows])))
+                combined = np.empty(num_docs, dtype=np.int64)
+                combined[priority_order] = base_target + (ranks < remainder)
+
+                sd_base, sd_remainder = divmod(int(sd[rows].sum()) + new_stepdown, num_docs)
+                sd_order = np.argsort(initial_sd[rows], kind='stable')
+                sd_targets = np.empty(num_docs, dtype=np.int64)
+                sd_targets[sd_order] = np.minimum(sd_base + (ranks < sd_remainder), maximum_step_down)
+
+                regular = np.maximum(0, combined - sd_targets)
+                regular = np.minimum(regular, maximum_patients)
+                regular = np.maximum(regular, minimum_patients)
+                t[rows] = regular
+                sd[rows] = sd_targets
+
+    else:
+        # ========== REGULAR ALLOCATION LOGIC ==========
+        remaining = sum(pools.values()) + n_step_down_patients
+
+        working_rows = working_rows[np.argsort(t[working_rows], kind='stable')]
+
+        # New physicians are topped up to new_start_number in sorted order
+        new_rows = working_rows[new[working_rows]]
+        needed = np.maximum(new_start_number - t[new_rows], 0)
+        before = np.cumsum(needed) - needed
+        to_give = np.minimum(needed, np.maximum(remaining - before, 0))
+        t[new_rows] += to_give
+        remaining -= int(to_give.sum())
+
+        # Allocation sequence (larger = later, -1 = never) for the minimum check
+        non_new_rows = working_rows[~new[working_rows]]
+        num_non_new = non_new_rows.size
+        sequence = np.full(size, -1, dtype=np.int64)
+        allocations_made = 0
+
+        if remaining > 0 and num_non_new > 0:
+            capacities = np.maximum(maximum_patients - t[non_new_rows], 0)
+            quotas, passes = _round_robin_quotas(capacities, remaining)
+            t[non_new_rows] += quotas
+            received = quotas > 0
+            sequence[non_new_rows[received]] = quotas[received] * num_non_new + np.flatnonzero(received)
+            allocations_made = int(quotas.sum())
+            remaining -= allocations_made
+
+            if remaining > 0 and passes is not None:
+                order = np.argsort(t[non_new_rows], kind='stable')
+                eligible = t[non_new_rows[order]] < maximum_patients
+                recipients = non_new_rows[order[eligible & (np.cumsum(eligible) <= remaining)]]
+                t[recipients] += 1
+                sequence[recipients] = (passes + 1) * num_non_new + np.arange(recipients.size)
+                allocations_made += recipients.size
+                remaining -= recipients.size
+
+        unallocated_patients = remaining
+
+        # ========== STEP-DOWN ALLOCATION ==========
+        # Gain per team code, then per step-down group
+        team_gains = np.bincount(team[by_team], weights=(t - initial_t)[by_team], minlength=len(teams))
+        groups = step_down_groups(teams)
+        group_rows = [
+            np.concatenate([team_rows[team_codes[name]] for name in group if name in team_codes] or [by_team[:0]])
+            for group in groups
+        ]
+        group_gains = [int(sum(team_gains[team_codes[name]] for name in group if name in team_codes)) for group in groups]
+        group_pools = [sum(pools.get(name, 0) for name in group) for group in groups]
+        group_step_down = split_step_down_by_gain(n_step_down_patients, group_gains, group_pools)
+
+        for rows, count in zip(group_rows, group_step_down):
+            if count <= 0:
+                continue
+            # Rows at both maximums take nothing and pass their turn on
+            open_rows = rows[(sd[rows] < maximum_step_down) | (t[rows] < maximum_patients)]
+            if count <= open_rows.size:
+                # A single round: one unit each, lowest census then lowest gain first
+                chosen = open_rows[np.lexsort((t[open_rows] - initial_t[open_rows], t[open_rows]))[:count]]
+                can_step_down = sd[chosen] < maximum_step_down
+                sd[chosen[can_step_down]] += 1
+                t[chosen[~can_step_down]] += 1
+            else:
+                step_down_given, regular_given, _, left = step_down_queue(
+                    t[open_rows].tolist(),
+                    (t[open_rows] - initial_t[open_rows]).tolist(),
+                    sd[open_rows].tolist(),
+                    count,
+                    maximum_step_down,
+                    maximum_patients
+                )
+                sd[open_rows] += np.array(step_down_given, dtype=np.int64)
+                t[open_rows] += np.array(regular_given, dtype=np.int64)
+                unallocated_step_down += left
+        unallocated_patients += unallocated_step_down
+
+        # New physicians who started at/above new_start_number keep their initial total
+        reset = new & (initial_t >= new_start_number) & (t > initial_t)
+        t[reset] = initial_t[reset]
+
+        # ========== MINIMUM PATIENTS CHECK ==========
+        working_rows = np.flatnonzero(working)
+        below_minimum = working_rows[t[working_rows] < minimum_patients]
+
+        if below_minimum.size and allocations_made:
+            donors = working_rows[t[working_rows] > minimum_patients]
+            donor_recency = -sequence[donors]
+            supply = t[donors] - minimum_patients
+            needs = np.maximum(0, min(minimum_patients, maximum_patients) - t[below_minimum])
+            moved = min(int(supply.sum()), int(needs.sum()))
+
+            removals, _ = _water_fill(-t[donors], moved, supply, donor_recency)
+            additions, _ = _water_fill(t[below_minimum], moved, needs)
+            t[donors] -= removals
+            t[below_minimum] += additions
+
+        minimum_shortfall = int(np.maximum(0, minimum_patients - t[working_rows]).sum())
+
+    return {
+        "totals": t,
+        "step_down": sd,
+        "capacity_exhausted": unallocated_patients > 0,
+        "unallocated_patients": int(unallocated_patients),
+        "unallocated_step_down": unallocated_step_down,
+        "minimum_shortfall": minimum_shortfall
+    }
+
+
+def allocate_patients_numpy(
+    physicians: list[Physician],
+    n_total_new_patients: int,
+    n_A_new_patients: int,
+    n_B_new_patients: int,
+    n_N_new_patients: int,
+    new_start_number: int,
+    minimum_patients: int = 10,
+    n_step_down_patients: int = 0,
+    maximum_patients: int = 1000,
+    maximum_step_down: int = 1,
+    is_new_shift_day: bool = False,
+    team_pools: dict = None
+):
+    """
+    Drop-in replacement for allocation.allocate_patients backed by allocate_arrays.
+
+    Updates the Physician objects in place and returns the same
+    results/summary structure as the reference engine.
+    """
+    assign_ids(physicians)
+    initial_counts, initial_stepdown_counts = baseline_counts(physicians)
+
+    columns = roster_to_columns(physicians)
+    outcome = allocate_arrays(
+        **columns,
+        n_A_new_patients=n_A_new_patients,
+        n_B_new_patients=n_B_new_patients,
+        n_N_new_patients=n_N_new_patients,
+        new_start_number=new_start_number,
+        minimum_patients=minimum_patients,
+        n_step_down_patients=n_step_down_patients,
+        maximum_patients=maximum_patients,
+        maximum_step_down=maximum_step_down,
+        is_new_shift_day=is_new_shift_day,
+        team_pools=team_pools,
+    )
+
+    for physician, total, step_down in zip(physicians, outcome["totals"].tolist(), outcome["step_down"].tolist()):
+        physician.set_total_patients(total)
+        physician.set_step_down_patients(step_down)
+
+    results, summary = build_results(physicians, initial_counts, initial_stepdown_counts)
+
+    return {
+        "results": results,
+        "summary": summary,
+        "remaining_pools": {
+            "n_total_new_patients": n_total_new_patients,
+            "n_A_new_patients": n_A_new_patients,
+            "n_B_new_patients": n_B_new_patients,
+            "n_N_new_patients": n_N_new_patients,
+            "n_step_down_patients": n_step_down_patients,
+            "team_pools": resolve_team_pools(n_A_new_patients, n_B_new_patients, n_N_new_patients, team_pools)
+        },
+        "capacity_exhausted": outcome["capacity_exhausted"],
+        "unallocated_patients": outcome["unallocated_patients"],
+        "unallocated_step_down": outcome["unallocated_step_down"],
+        "minimum_shortfall": outcome["minimum_shortfall"]
+    }
@@ -0,0 +1,185 @@
+"""
+Prototype allocation engine for the Patient Allocator application.
+
+Port of allocate_patients from the Streamlit prototype
+(prototypes/physician_site.py), kept so its results can be compared with the
+current engine on real rosters. Behaviour differences from allocation.py:
+
+- step-down goes to the lowest starting step-down count first, at most one
+  new step-down patient per physician and without a regular-patient fallback
+- the minimum check takes at most one patient from each donor
+- there is no new shift day mode
+
+Teams other than A, B and N, which the prototype did not have, get pools
+and step-down groups as in allocation.py.
+
+The prototype looked up buffer physicians but never used them in the
+allocation, so buffer rows are handled like everyone else here too.
+"""
+
+from models import Physician
+from roster import assign_ids, baseline_counts
+from allocation import (
+    build_results, group_by_team, resolve_team_pools, step_down_groups, split_step_down_by_gain
+)
+
+
+def allocate_patients_prototype(
+    physicians: list[Physician],
+    n_total_new_patients: int,
+    n_A_new_patients: int,
+    n_B_new_patients: int,
+    n_N_new_patients: int,
+    new_start_number: int,
+    minimum_patients: int = 10,
+    n_step_down_patients: int = 0,
+    maximum_patients: int = 1000,
+    maximum_step_down: int = 1,
+    is_new_shift_day: bool = False,
+    team_pools: dict = None
+):
+    """
+    Allocate patients with the prototype algorithm.
+
+    Takes the same arguments as allocate_patients so it can be swapped in.
+    maximum_step_down is not used; the prototype caps new step-down
+    patients at one per physician. Raises ValueError on a new shift day.
+
+    Returns the allocate_patients result structure.
+    """
+    if is_new_shift_day:
+        raise ValueError("The prototype strategy does not support new shift days")
+
+    assign_ids(physicians)
+    initial_counts, initial_stepdown_counts = baseline_counts(physicians)
+
+    pools = resolve_team_pools(n_A_new_patients, n_B_new_patients, n_N_new_patients, team_pools)
+    teams = group_by_team(physicians)
+
+    def can_take_patient(physician):
+        return physician.total_patients < maximum_patients
+
+    # Only the gained step-down is limited, not the total
+    def can_take_step_down(physician):
+        return physician.step_down_patients - initial_stepdown_counts[physician.id] < 1
+
+    # ========== REGULAR ALLOCATION ==========
+    remaining = sum(pools.values()) + n_step_down_patients
+
+    all_working = [p for p in physicians if p.is_working]
+    all_working.sort(key=lambda x: x.total_patients)
+
+    # New physicians are topped up to new_start_number and left out of the rest
+    for physician in [p for p in all_working if p.is_new]:
+        if physician.total_patients >= new_start_number:
+            continue
+        to_give = min(new_start_number - physician.total_patients, remaining)
+        physician.set_total_patients(physician.total_patients + to_give)
+        remaining -= to_give
+
+    non_new = [p for p in all_working if not p.is_new]
+    num_non_new = len(non_new)
+
+    # Physicians in the order they received patients, for the minimum check
+    allocation_order = []
+
+    if remaining > 0 and num_non_new > 0:
+        # Round-robin: +1 to every non-new physician while a full round fits
+        while remaining >= num_non_new:
+            given = 0
+            for physician in non_new:
+                if can_take_patient(physician):
+                    physician.add_patient()
+                    allocation_order.append(physician)
+                    given += 1
+            remaining -= given
+            # The prototype looped forever once everyone reached the maximum
+            if not given:
+                break
+
+        # Leftover goes to the lowest totals
+        if remaining > 0:
+            non_new.sort(key=lambda x: x.total_patients)
+            for physician in non_new:
+                if remaining <= 0:
+                    break
+                if can_take_patient(physician):
+                    physician.add_patient()
+                    allocation_order.append(physician)
+                    remaining -= 1
+
+    unallocated_patients = remaining
+
+    # ========== STEP-DOWN ALLOCATION ==========
+    groups = step_down_groups(teams)
+    group_docs = [[p for team in group for p in teams.get(team, ()) if p.is_working] for group in groups]
+
+    # StepDown for Team A = (Gained + Traded for Team A) - (Traded B→A + Team A Pool),
+    # and Teams B+N get the rest
+    shares = split_step_down_by_gain(
+        n_step_down_patients,
+        [sum(p.total_patients - initial_counts[p.id] for p in docs) for docs in group_docs],
+        [sum(pools.get(team, 0) for team in group) for group in groups]
+    )
+
+    for team_docs, count in zip(group_docs, shares):
+        for physician in sorted(team_docs, key=lambda x: initial_stepdown_counts[x.id]):
+            if count <= 0:
+                break
+            if can_take_step_down(physician):
+                physician.add_patient(is_step_down=True)
+                count -= 1
+
+    # New physicians who started at new_start_number keep their starting census
+    for physician in physicians:
+        if physician.is_new:
+            initial_total = initial_counts[physician.id]
+            if initial_total >= new_start_number and physician.total_patients > initial_total:
+                physician.set_total_patients(initial_total)
+
+    # ========== MINIMUM PATIENTS CHECK ==========
+    all_working = [p for p in physicians if p.is_working]
+    below_minimum = [p for p in all_working if p.total_patients < minimum_patients]
+
+    if below_minimum and allocation_order:
+        # Lower index = more recent allocation, by physician ID
+        allocation_index = [999] * len(physicians)
+        last = len(allocation_order) - 1
+        for index, physician in enumerate(allocation_order):
+            allocation_index[physician.id] = last - index
+
+        potential_sources = [p for p in all_working if p.total_patients > minimum_patients]
+        potential_sources.sort(key=lambda x: (-x.total_patients, allocation_index[x.id]))
+
+        # Each source gives at most one patient; flags indexed by physician ID
+        used_sources = bytearray(len(physicians))
+        for target in sorted(below_minimum, key=lambda x: x.total_patients):
+            for source in potential_sources:
+                if target.total_patients >= minimum_patients:
+                    break
+                if used_sources[source.id]:
+                    continue
+                if source.total_patients > minimum_patients and can_take_patient(target):
+                    source.remove_patient()
+                    target.add_patient()
+                    used_sources[source.id] = 1
+
+    minimum_shortfall = sum(max(0, minimum_patients - p.total_patients) for p in all_working)
+
+    results, summary = build_results(physicians, initial_counts, initial_stepdown_counts)
+
+    return {
+        "results": results,
+        "summary": summary,
+        "remaining_pools": {
+            "n_total_new_patients": n_total_new_patients,
+            "n_A_new_patients": n_A_new_patients,
+            "n_B_new_patients": n_B_new_patients,
+            "n_N_new_patients": n_N_new_patients,
+            "n_step_down_patients": n_step_down_patients,
+            "team_pools": pools
+        },
+        "capacity_exhausted": unallocated_patients > 0,
+        "unallocated_patients": unallocated_patients,
+        "minimum_shortfall": minimum_shortfall
+    }
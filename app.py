@@ -2,23 +2,69 @@
 Flask application for the Patient Allocator.
 """
 
+import datetime
+import uuid
 from flask import Flask, render_template, request, jsonify, redirect, url_for, session
 from functools import wraps
 import config
 from models import Physician
+from allocation import ResultsBuilder, columnar_results
 from data_manager import (
-    load_physicians, save_physicians,
+    load_physicians, load_roster, save_physicians,
     load_yesterday, save_yesterday,
     load_master_list, save_master_list,
     load_parameters, save_parameters,
     load_selected, save_selected,
     load_team_assignments, save_team_assignments
 )
-from allocation import allocate_patients
+from strategies import get_strategy, list_strategies
+from benchmark import benchmark_strategies
+from sweep import run_sweep
+from simulation import simulate_admissions
+from horizon import simulate_horizon
+from cache import AllocationCache, allocation_key
+from profiling import profile, phase_histograms
+from explain import tracing, render_trace
+from incremental import IncrementalAllocation
+from admissions import AdmissionRouter
+from feasibility import analyze_feasibility
+from diff import diff_allocations
+from jobs import JobQueue, JobStoreFull
 
 app = Flask(__name__)
 app.secret_key = config.SECRET_KEY
 
+allocation_cache = AllocationCache(
+    max_entries=config.ALLOCATION_CACHE_SIZE,
+    ttl_seconds=config.ALLOCATION_CACHE_TTL
+)
+
+# Decision traces of cached allocations, by the same key, for ?explain=1
+allocation_traces = AllocationCache(
+    max_entries=config.ALLOCATION_CACHE_SIZE,
+    ttl_seconds=config.ALLOCATION_CACHE_TTL
+)
+
+# Incremental allocation states by ID, evicted when idle or over the limit
+incremental_states = AllocationCache(
+    max_entries=config.INCREMENTAL_MAX_STATES,
+    ttl_seconds=config.INCREMENTAL_STATE_TTL
+)
+
+# Admission routers by ID, kept for the day's streaming admissions
+admission_routers = AllocationCache(
+    max_entries=config.ADMISSION_MAX_ROUTERS,
+    ttl_seconds=config.ADMISSION_ROUTER_TTL
+)
+
+# Background jobs for long sweeps, simulations and allocations
+job_queue = JobQueue(
+    max_workers=config.JOB_WORKERS,
+    max_jobs=config.JOB_MAX_STORED,
+    timeout=config.JOB_TIMEOUT,
+    ttl=config.JOB_RESULT_TTL
+)
+
 
 def login_required(f):
     """Decorator to require login for routes."""
@@ -88,18 +134,18 @@ def create_physician():
 def update_physician(name):
     """Update a physician."""
     data = request.json
-    physicians = load_physicians()
+    roster = load_roster()
 
-    for i, p in enumerate(physicians):
-        if p.name == name:
-            # Merge existing data with new data
-            merged = p.to_dict()
-            merged.update(data)
-            physicians[i] = Physician.from_dict(merged)
-            save_physicians(physicians)
-            return jsonify(physicians[i].to_dict())
+    p = roster.get(name)
+    if p is None:
+        return jsonify({'error': 'Physician not found'}), 404
 
-    return jsonify({'error': 'Physician not found'}), 404
+    # Merge existing data with new data
+    merged = p.to_dict()
+    merged.update(data)
+    roster[p.id] = Physician.from_dict(merged)
+    save_physicians(roster.physicians)
+    return jsonify(roster[p.id].to_dict())
 
 
 @app.route('/api/physicians/<name>', methods=['DELETE'])
@@ -239,7 +285,7 @@ def generate_table():
     yesterday_list = load_yesterday()
 
     # Load existing physician data to preserve their values
-    existing = {p.name: p for p in load_physicians()}
+    existing = load_roster()
 
     physicians = []
     for sel in selections:
@@ -247,9 +293,9 @@ def generate_table():
         team = sel.get('team', 'A')
         was_yesterday = name in yesterday_list
 
-        if name in existing:
+        p = existing.get(name)
+        if p is not None:
             # PRESERVE existing data, only update team and yesterday
-            p = existing[name]
             p.team = team
             if was_yesterday and not p.yesterday:
                 p.yesterday = name
@@ -273,40 +319,612 @@ def generate_table():
     return jsonify({'physicians': [p.to_dict() for p in physicians]})
 
 
-# Allocation API route
+# Allocation API routes
+def _allocation_kwargs(parameters):
+    """Unpack request parameters into allocate_patients keyword arguments."""
+    return {
+        'n_total_new_patients': parameters.get('n_total_new_patients', 20),
+        'n_A_new_patients': parameters.get('n_A_new_patients', 0),
+        'n_B_new_patients': parameters.get('n_B_new_patients', 0),
+        'n_N_new_patients': parameters.get('n_N_new_patients', 0),
+        'new_start_number': parameters.get('new_start_number', 10),
+        'minimum_patients': parameters.get('minimum_patients', 10),
+        'n_step_down_patients': parameters.get('n_step_down_patients', 0),
+        'maximum_patients': parameters.get('maximum_patients', 20),
+        'maximum_step_down': parameters.get('maximum_step_down', 1),
+        'is_new_shift_day': parameters.get('is_new_shift_day', False),
+        # Pools for any team, overriding n_A/n_B/n_N for A, B and N
+        'team_pools': {str(team): int(pool) for team, pool in (parameters.get('team_pools') or {}).items()},
+    }
+
+
+def _allocation_strategy(parameters):
+    """
+    Look up the strategy named by the 'strategy' parameter (the configured
+    default when absent) and pick its options out of the parameters.
+    """
+    strategy = get_strategy(parameters.get('strategy'))
+    return strategy, strategy.options_from(parameters)
+
+
+def _infeasible_response(diagnosis):
+    """422 response carrying the feasibility diagnosis."""
+    message = '; '.join(error['message'] for error in diagnosis['errors'])
+    return jsonify({'error': f'Infeasible allocation: {message}', 'feasibility': diagnosis}), 422
+
+
+def _columnar_requested():
+    """?format=columnar asks for results as parallel column arrays instead of row dicts."""
+    return request.args.get('format', '').lower() == 'columnar'
+
+
+def _allocation_response(result):
+    """Pick the fields of an allocation result that are returned to the client."""
+    # Result is a dict with 'results', 'summary', and 'remaining_pools'
+    return {
+        'results': result.get('results', []),
+        'summary': result.get('summary', {}),
+        'capacity_exhausted': result.get('capacity_exhausted', False),
+        'unallocated_patients': result.get('unallocated_patients', 0),
+        'unallocated_step_down': result.get('unallocated_step_down', 0),
+        'minimum_shortfall': result.get('minimum_shortfall', 0),
+        'strategy': result.get('strategy'),
+    }
+
+
 @app.route('/api/allocate', methods=['POST'])
 @login_required
 def run_allocation():
-    """Run the allocation algorithm."""
+    """
+    Run the allocation algorithm. ?format=columnar returns the results as
+    columns. The response's run_id names the run for /api/allocate/diff.
+    """
+    data = request.json
+    physician_data = data.get('physicians', [])
+    parameters = data.get('parameters', {})
+
+    # ?profile=1 skips the cache and returns per-phase timings
+    profile_requested = request.args.get('profile', '').lower() in ('1', 'true')
+    # ?explain=1 adds a readable account of every allocation decision
+    explain_requested = request.args.get('explain', '').lower() in ('1', 'true')
+    columnar = _columnar_requested()
+
+    try:
+        kwargs = _allocation_kwargs(parameters)
+        strategy, options = _allocation_strategy(parameters)
+
+        # Identical roster + parameters (and result layout) return the cached response
+        key = allocation_key(physician_data, {**kwargs, **options, 'strategy': strategy.name, 'columnar': columnar})
+        response = None if profile_requested else allocation_cache.get(key)
+        trace = allocation_traces.get(key) if explain_requested else None
+        cache_status = 'hit'
+        extras = {}
+        # A cached response whose trace was not kept is rerun to explain it
+        if response is None or (explain_requested and trace is None):
+            cache_status = 'bypass' if profile_requested else 'miss'
+            # Convert to Physician objects
+            physicians = [Physician.from_dict(p) for p in physician_data]
+
+            # Impossible inputs never reach the engine
+            if config.FEASIBILITY_CHECK:
+                diagnosis = analyze_feasibility(physicians, **kwargs)
+                if not diagnosis['feasible']:
+                    return _infeasible_response(diagnosis)
+
+            with profile(profile_requested or config.ALLOCATION_PROFILING) as timer, \
+                    tracing(explain_requested or config.ALLOCATION_TRACING, config.EXPLAIN_BUFFER_EVENTS) as trace, \
+                    columnar_results(columnar):
+                # Run allocation with unpacked parameters
+                result = strategy.run(physicians, kwargs, options)
+            response = _allocation_response(result)
+            allocation_cache.put(key, response)
+            if trace is not None:
+                allocation_traces.put(key, trace)
+            if profile_requested:
+                extras['timings'] = timer.to_dict()
+
+        if explain_requested:
+            extras['explanation'] = render_trace(trace, physician_data)
+        # The cache key doubles as the run's ID for /api/allocate/diff
+        extras['run_id'] = key
+
+        http_response = jsonify({**response, **extras})
+        http_response.headers['X-Allocation-Cache'] = cache_status
+        return http_response
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+
+@app.route('/api/allocate/feasibility', methods=['POST'])
+@login_required
+def check_allocation_feasibility():
+    """
+    Diagnose a roster and parameters without allocating: capacity shortfall
+    overall and per team, unreachable minimum and the binding constraint.
+    Cheap enough to call while parameters are being typed.
+    """
+    data = request.json
+    try:
+        physicians = [Physician.from_dict(p) for p in data.get('physicians', [])]
+        return jsonify(analyze_feasibility(physicians, **_allocation_kwargs(data.get('parameters', {}))))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+
+def _diff_side(value):
+    """
+    Results to diff from a run ID (an earlier /api/allocate response still in
+    the cache), an allocation response, or its results as rows or columns.
+    Returns None for an unknown or expired run ID.
+    """
+    if isinstance(value, str):
+        response = allocation_cache.get(value)
+        return None if response is None else response['results']
+    if isinstance(value, dict) and 'results' in value:
+        return value['results']
+    if isinstance(value, (list, dict)):
+        return value
+    raise ValueError('Each side must be a run ID or allocation results')
+
+
+@app.route('/api/allocate/diff', methods=['POST'])
+@login_required
+def diff_allocation_runs():
+    """
+    Compare two allocations, e.g. {"before": "<run_id>", "after": "<run_id>"},
+    or with the allocation responses (or their results) in place of the IDs.
+    Returns only the physicians whose total or step-down changed, those in
+    one run only, and the change per team.
+    """
+    data = request.json or {}
+    try:
+        before = _diff_side(data.get('before'))
+        after = _diff_side(data.get('after'))
+        if before is None or after is None:
+            return jsonify({'error': 'Allocation run not found or expired'}), 404
+        return jsonify(diff_allocations(before, after))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+
+@app.route('/api/allocate/timings', methods=['GET', 'DELETE'])
+@login_required
+def allocation_timings():
+    """Process-wide phase timing histograms; DELETE resets them."""
+    if request.method == 'DELETE':
+        phase_histograms.clear()
+    return jsonify(phase_histograms.stats())
+
+
+@app.route('/api/strategies', methods=['GET'])
+@login_required
+def get_allocation_strategies():
+    """List the registered allocation strategies."""
+    return jsonify({'default': config.DEFAULT_ALLOCATION_STRATEGY, 'strategies': list_strategies()})
+
+
+@app.route('/api/strategies/benchmark', methods=['POST'])
+@login_required
+def run_strategy_benchmark():
+    """
+    Time allocation strategies on a roster, e.g.
+    {"physicians": [...], "parameters": {...}, "strategies": ["greedy", "numpy"], "repeat": 20}.
+    All registered strategies are timed when 'strategies' is omitted.
+    """
     data = request.json
     physician_data = data.get('physicians', [])
     parameters = data.get('parameters', {})
+    names = data.get('strategies') or None
 
-    # Convert to Physician objects
-    physicians = [Physician.from_dict(p) for p in physician_data]
+    try:
+        repeat = int(data.get('repeat', 10))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'repeat must be an integer'}), 400
+    if not 1 <= repeat <= config.BENCHMARK_MAX_REPEAT:
+        return jsonify({'error': f'repeat must be between 1 and {config.BENCHMARK_MAX_REPEAT}'}), 400
 
-    # Run allocation with unpacked parameters
     try:
-        result = allocate_patients(
-            physicians=physicians,
-            n_total_new_patients=parameters.get('n_total_new_patients', 20),
-            n_A_new_patients=parameters.get('n_A_new_patients', 0),
-            n_B_new_patients=parameters.get('n_B_new_patients', 0),
-            n_N_new_patients=parameters.get('n_N_new_patients', 0),
-            new_start_number=parameters.get('new_start_number', 10),
-            minimum_patients=parameters.get('minimum_patients', 10),
-            n_step_down_patients=parameters.get('n_step_down_patients', 0),
-            maximum_patients=parameters.get('maximum_patients', 20),
-            maximum_step_down=parameters.get('maximum_step_down', 1),
-            is_new_shift_day=parameters.get('is_new_shift_day', False),
-        )
-        # Result is a dict with 'results', 'summary', and 'remaining_pools'
-        return jsonify({
-            'results': result.get('results', []),
-            'summary': result.get('summary', {}),
-        })
+        rows = benchmark_strategies(physician_data, _allocation_kwargs(parameters), names, repeat, parameters)
     except Exception as e:
         return jsonify({'error': str(e)}), 400
+    return jsonify({'physicians': len(physician_data), 'repeat': repeat, 'strategies': rows})
+
+
+@app.route('/api/allocate/cache', methods=['GET'])
+@login_required
+def get_allocation_cache_stats():
+    """Allocation cache counters for monitoring."""
+    return jsonify(allocation_cache.stats())
+
+
+@app.route('/api/allocate/incremental', methods=['POST'])
+@login_required
+def start_incremental_allocation():
+    """
+    Run a full allocation and keep the roster, parameters and result for
+    single-row updates through PATCH /api/allocate/incremental/<state_id>.
+    """
+    data = request.json
+    physician_data = data.get('physicians', [])
+    parameters = data.get('parameters', {})
+
+    try:
+        kwargs = _allocation_kwargs(parameters)
+        if config.FEASIBILITY_CHECK:
+            diagnosis = analyze_feasibility([Physician.from_dict(p) for p in physician_data], **kwargs)
+            if not diagnosis['feasible']:
+                return _infeasible_response(diagnosis)
+        state = IncrementalAllocation(physician_data, kwargs)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+    state_id = uuid.uuid4().hex
+    incremental_states.put(state_id, state)
+    return jsonify({'state_id': state_id, **_allocation_response(state.result)})
+
+
+@app.route('/api/allocate/incremental/<state_id>', methods=['PATCH'])
+@login_required
+def update_incremental_allocation(state_id):
+    """
+    Apply a single-row change, e.g. {"name": "Wang", "changes": {"total_patients": 14}},
+    and return the updated allocation. 'recomputed' says how much was rerun
+    and 'reason' why. Display-only edits and, on a new shift day, census
+    edits rerun one row or one team. On a regular day every census edit
+    reruns the whole allocation from the stored roster: the state is a
+    roster cache there, not incremental allocation.
+    """
+    state = incremental_states.get(state_id)
+    if state is None:
+        return jsonify({'error': 'Allocation state not found or expired'}), 404
+
+    data = request.json
+    try:
+        result, scope, reason = state.apply(data.get('name', ''), data.get('changes', {}))
+    except KeyError:
+        return jsonify({'error': 'Physician not found'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Refresh the state's lifetime
+    incremental_states.put(state_id, state)
+    return jsonify({'state_id': state_id, 'recomputed': scope, 'reason': reason, **_allocation_response(result)})
+
+
+@app.route('/api/admissions', methods=['POST'])
+@login_required
+def start_admission_router():
+    """
+    Start routing single admissions from a roster, usually the morning
+    allocation results, and today's parameters.
+    """
+    data = request.json
+    try:
+        router = AdmissionRouter(data.get('physicians', []), _allocation_kwargs(data.get('parameters', {})))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+    router_id = uuid.uuid4().hex
+    admission_routers.put(router_id, router)
+    return jsonify({'router_id': router_id, 'physicians': router.snapshot()})
+
+
+def _admission_router(router_id):
+    """The router for an ID, refreshing its lifetime, or None when unknown or expired."""
+    router = admission_routers.get(router_id)
+    if router is not None:
+        admission_routers.put(router_id, router)
+    return router
+
+
+@app.route('/api/admissions/<router_id>', methods=['GET'])
+@login_required
+def get_admission_router(router_id):
+    """Current census of every physician in the router."""
+    router = _admission_router(router_id)
+    if router is None:
+        return jsonify({'error': 'Admission router not found or expired'}), 404
+    return jsonify({'router_id': router_id, 'physicians': router.snapshot()})
+
+
+@app.route('/api/admissions/next', methods=['GET'])
+@login_required
+def next_admission():
+    """Who gets the next patient, e.g. ?router_id=...&team=B&step_down=1, without assigning it."""
+    router = _admission_router(request.args.get('router_id', ''))
+    if router is None:
+        return jsonify({'error': 'Admission router not found or expired'}), 404
+    step_down = request.args.get('step_down', '').lower() in ('1', 'true')
+    return jsonify(router.next(request.args.get('team', 'A'), step_down))
+
+
+@app.route('/api/admissions/assign', methods=['POST'])
+@login_required
+def assign_admission():
+    """
+    Assign one admission, e.g. {"router_id": "...", "team": "B", "step_down": false}.
+    An optional "name" assigns to that physician instead of the next in line.
+    """
+    data = request.json
+    router = _admission_router(data.get('router_id', ''))
+    if router is None:
+        return jsonify({'error': 'Admission router not found or expired'}), 404
+    try:
+        outcome = router.assign(data.get('team', 'A'), bool(data.get('step_down', False)), data.get('name'))
+    except KeyError:
+        return jsonify({'error': 'Physician not found'}), 404
+    if outcome['physician'] is None:
+        return jsonify({'error': 'No physician on this team can take another patient', **outcome}), 409
+    return jsonify(outcome)
+
+
+@app.route('/api/admissions/discharge', methods=['POST'])
+@login_required
+def discharge_admission():
+    """Record a discharge, e.g. {"router_id": "...", "name": "Wang", "step_down": false, "count": 1}."""
+    data = request.json
+    router = _admission_router(data.get('router_id', ''))
+    if router is None:
+        return jsonify({'error': 'Admission router not found or expired'}), 404
+    try:
+        row = router.discharge(data.get('name', ''), bool(data.get('step_down', False)), int(data.get('count', 1)))
+    except KeyError:
+        return jsonify({'error': 'Physician not found'}), 404
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'physician': row})
+
+
+@app.route('/api/admissions/correct', methods=['POST'])
+@login_required
+def correct_admission():
+    """Correct a physician's row, e.g. {"router_id": "...", "name": "Wang", "changes": {"total_patients": 12}}."""
+    data = request.json
+    router = _admission_router(data.get('router_id', ''))
+    if router is None:
+        return jsonify({'error': 'Admission router not found or expired'}), 404
+    try:
+        row = router.correct(data.get('name', ''), data.get('changes', {}))
+    except KeyError:
+        return jsonify({'error': 'Physician not found'}), 404
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'physician': row})
+
+
+@app.route('/api/allocate/batch', methods=['POST'])
+@login_required
+def run_allocation_batch():
+    """
+    Run the allocation for several parameter sets against one roster.
+
+    Each entry in 'scenarios' overrides the shared 'parameters'. The roster is
+    parsed once and cloned per scenario. ?format=columnar returns each
+    scenario's results as columns.
+    """
+    data = request.json
+    physician_data = data.get('physicians', [])
+    base_parameters = data.get('parameters', {})
+    scenarios = data.get('scenarios', [])
+
+    if not isinstance(scenarios, list) or not scenarios:
+        return jsonify({'error': 'At least one scenario is required'}), 400
+
+    roster = [Physician.from_dict(p) for p in physician_data]
+    columnar = _columnar_requested()
+
+    outcomes = []
+    for scenario in scenarios:
+        parameters = {**base_parameters, **scenario}
+        physicians = [p.clone() for p in roster]
+        try:
+            strategy, options = _allocation_strategy(parameters)
+            kwargs = _allocation_kwargs(parameters)
+            if config.FEASIBILITY_CHECK:
+                diagnosis = analyze_feasibility(physicians, **kwargs)
+                if not diagnosis['feasible']:
+                    outcomes.append({'parameters': parameters, 'error': 'Infeasible allocation', 'feasibility': diagnosis})
+                    continue
+            with columnar_results(columnar):
+                result = strategy.run(physicians, kwargs, options)
+            outcomes.append({'parameters': parameters, **_allocation_response(result)})
+        except Exception as e:
+            outcomes.append({'parameters': parameters, 'error': str(e)})
+
+    return jsonify({'scenarios': outcomes})
+
+
+def _sweep_request(data, progress=None):
+    """Run the sweep described by a /api/sweep body."""
+    return run_sweep(
+        data.get('physicians', []),
+        _allocation_kwargs(data.get('parameters', {})),
+        data.get('ranges', {}),
+        max_workers=config.WORKER_PROCESSES or None,
+        max_combinations=config.SWEEP_MAX_COMBINATIONS,
+        progress=progress,
+    )
+
+
+def _simulation_request(data, progress=None):
+    """Run the simulation described by a /api/simulate body."""
+    trials = data.get('trials', 1000)
+    if trials > config.SIMULATION_MAX_TRIALS:
+        raise ValueError(f'Trials are limited to {config.SIMULATION_MAX_TRIALS}')
+
+    return simulate_admissions(
+        data.get('physicians', []),
+        _allocation_kwargs(data.get('parameters', {})),
+        data.get('admissions', {}),
+        trials=trials,
+        seed=data.get('seed', 0),
+        max_workers=config.WORKER_PROCESSES or None,
+        progress=progress,
+    )
+
+
+def _horizon_request(data, progress=None):
+    """Run the horizon simulation described by a /api/simulate/horizon body."""
+    days = data.get('days', 7)
+    if days > config.HORIZON_MAX_DAYS:
+        raise ValueError(f'Horizons are limited to {config.HORIZON_MAX_DAYS} days')
+
+    start_date = data.get('start_date')
+    return simulate_horizon(
+        data.get('physicians', []),
+        _allocation_kwargs(data.get('parameters', {})),
+        days=days,
+        admissions=data.get('admissions'),
+        discharge_rates=data.get('discharge_rates'),
+        start_date=datetime.date.fromisoformat(start_date) if start_date else None,
+        new_shift_weekday=data.get('new_shift_weekday', config.NEW_SHIFT_WEEKDAY),
+        seed=data.get('seed', 0),
+        progress=progress,
+    )
+
+
+@app.route('/api/sweep', methods=['POST'])
+@login_required
+def run_parameter_sweep():
+    """
+    Run the allocation for every combination of parameter ranges.
+
+    'ranges' maps swept parameter names to a list of values or a
+    {start, stop, step} dict; other parameters come from 'parameters'.
+    """
+    try:
+        return jsonify(_sweep_request(request.json))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+
+@app.route('/api/simulate', methods=['POST'])
+@login_required
+def run_admission_simulation():
+    """
+    Simulate uncertain admissions.
+
+    'admissions' maps a team name or 'step_down' to a Poisson mean. Each
+    physician's p_at_maximum and the 'overflow' block (share of trials
+    with capacity exhausted, unallocated patients) give the overflow risk.
+    """
+    try:
+        return jsonify(_simulation_request(request.json))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+
+@app.route('/api/simulate/horizon', methods=['POST'])
+@login_required
+def run_horizon_simulation():
+    """
+    Simulate the census over several consecutive days.
+
+    'admissions' maps a team name or 'step_down' to the patients admitted
+    each day (or is a list of such maps, one per day), 'discharge_rates'
+    maps 'regular', 'step_down' or a team name to the overnight discharge
+    rate, and 'start_date' (YYYY-MM-DD, default today) fixes the weekdays.
+    """
+    try:
+        return jsonify(_horizon_request(request.json))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+
+def _allocation_job(data, columnar=False, progress=None):
+    """
+    Run an allocation described by a /api/allocate body, without the cache.
+    The engine runs as one step, so an engine with a time_budget (optimal)
+    is held to the job's remaining time and falls back to greedy past it.
+    """
+    parameters = data.get('parameters', {})
+    kwargs = _allocation_kwargs(parameters)
+    strategy, options = _allocation_strategy(parameters)
+    physicians = [Physician.from_dict(p) for p in data.get('physicians', [])]
+
+    if config.FEASIBILITY_CHECK:
+        diagnosis = analyze_feasibility(physicians, **kwargs)
+        if not diagnosis['feasible']:
+            message = '; '.join(error['message'] for error in diagnosis['errors'])
+            raise ValueError(f'Infeasible allocation: {message}')
+
+    if progress is not None:
+        progress(0, 1)
+        remaining = progress.remaining()
+        if remaining is not None and 'time_budget' in strategy.options:
+            options = {**options, 'time_budget': min(options.get('time_budget', config.OPTIMAL_TIME_BUDGET), remaining)}
+    with columnar_results(columnar):
+        result = strategy.run(physicians, kwargs, options)
+    return _allocation_response(result)
+
+
+# Job kinds: each runs the body of the matching endpoint
+JOB_KINDS = {
+    'allocate': _allocation_job,
+    'sweep': _sweep_request,
+    'simulate': _simulation_request,
+    'horizon': _horizon_request,
+}
+
+
+@app.route('/api/jobs', methods=['POST'])
+@login_required
+def submit_job():
+    """
+    Run an allocation, sweep or simulation in the background, e.g.
+    {"kind": "sweep", "physicians": [...], "parameters": {...}, "ranges": {...}}.
+    The rest of the body is what the matching endpoint takes. Returns the
+    job ID at once; poll GET /api/jobs/<id> for progress and the result.
+    ?format=columnar applies to allocate jobs. Timeout and cancel are
+    best-effort: they apply between progress steps (sweep chunks, trial
+    chunks, horizon days), and an allocate job's optimal engine is given
+    the remaining time as its time budget.
+    """
+    data = request.json or {}
+    kind = data.get('kind')
+    if kind not in JOB_KINDS:
+        return jsonify({'error': f"kind must be one of: {', '.join(JOB_KINDS)}"}), 400
+
+    extras = {'columnar': _columnar_requested()} if kind == 'allocate' else {}
+    try:
+        job = job_queue.submit(kind, JOB_KINDS[kind], data, **extras)
+    except JobStoreFull as e:
+        return jsonify({'error': f'Too many jobs in progress: {e}'}), 503
+
+    response = jsonify(job_queue.describe(job))
+    response.status_code = 202
+    response.headers['Location'] = url_for('get_job', job_id=job.id)
+    return response
+
+
+@app.route('/api/jobs', methods=['GET'])
+@login_required
+def get_job_stats():
+    """Job store and worker pool counters for monitoring."""
+    return jsonify(job_queue.stats())
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+@login_required
+def get_job(job_id):
+    """A job's status and progress, and its result once it has succeeded."""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found or expired'}), 404
+    return jsonify(job_queue.describe(job))
+
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+@login_required
+def cancel_job(job_id):
+    """
+    Cancel a queued or running job; a finished job is removed. A running
+    job stops at its next progress step.
+    """
+    job = job_queue.cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found or expired'}), 404
+    return jsonify(job_queue.describe(job))
 
 
 # Print summary API routes
@@ -315,12 +933,20 @@ def run_allocation():
 def get_print_summary():
     """Get print summary HTML."""
     data = request.json
-    results = data.get('results', [])
-    summary = data.get('summary', {})
+    # Team groups and totals come from one pass over the rows
+    builder = ResultsBuilder.from_results(data.get('results', []))
+    summary = {
+        'total_patients': builder.total_census,
+        'total_step_down': builder.total_stepdown,
+        'total_gained': builder.total_gained,
+        'working_count': builder.working_count,
+        **data.get('summary', {}),
+    }
 
     return render_template('print_summary.html',
-                          results=results,
-                          summary=summary)
+                          results=builder.results,
+                          summary=summary,
+                          teams=builder.teams)
 
 
 @app.route('/api/print-summary/text', methods=['POST'])
@@ -328,39 +954,28 @@ def get_print_summary():
 def get_print_summary_text():
     """Get print summary as plain text."""
     data = request.json
-    results = data.get('results', [])
 
-    # Group by team
-    team_a = [r for r in results if r.get('team') == 'A']
-    team_b = [r for r in results if r.get('team') == 'B']
-    team_n = [r for r in results if r.get('team') == 'N']
+    # Group by team and total in one pass, A, B and N first
+    builder = ResultsBuilder.from_results(data.get('results', []))
 
-    def format_team(team_name, team_data):
+    def format_team(team_name, totals):
         lines = [f"=== Team {team_name} ==="]
-        for r in sorted(team_data, key=lambda x: x.get('name', '')):
+        for r in sorted(totals.rows, key=lambda x: x.get('name', '')):
             lines.append(f"{r.get('name')}: {r.get('total_patients', 0)} patients, {r.get('step_down_patients', 0)} SD, Gained: {r.get('gained', 0)}")
-        total = sum(r.get('total_patients', 0) for r in team_data)
-        gained = sum(r.get('gained', 0) for r in team_data)
-        lines.append(f"Team {team_name} Total: {total} patients, Gained: {gained}")
+        lines.append(f"Team {team_name} Total: {totals.total} patients, Gained: {totals.gained}")
         return '\n'.join(lines)
 
     text_parts = []
     text_parts.append("PATIENT ALLOCATION SUMMARY")
     text_parts.append("=" * 40)
 
-    if team_a:
-        text_parts.append(format_team('A', team_a))
-    if team_b:
-        text_parts.append(format_team('B', team_b))
-    if team_n:
-        text_parts.append(format_team('N', team_n))
+    for team, totals in builder.teams.items():
+        if totals.rows:
+            text_parts.append(format_team(team, totals))
 
     # Grand total
-    all_results = team_a + team_b + team_n
-    grand_total = sum(r.get('total_patients', 0) for r in all_results)
-    grand_gained = sum(r.get('gained', 0) for r in all_results)
     text_parts.append("=" * 40)
-    text_parts.append(f"GRAND TOTAL: {grand_total} patients, Gained: {grand_gained}")
+    text_parts.append(f"GRAND TOTAL: {builder.total_census} patients, Gained: {builder.total_gained}")
 
     return jsonify({'text': '\n\n'.join(text_parts)})
 
@@ -0,0 +1,112 @@
+"""
+Per-strategy allocation micro-benchmarks for the Patient Allocator application.
+
+Times every registered strategy on the same roster and parameters so a new
+engine can be compared against the default before switching to it:
+
+    python benchmark.py                  # saved physician table
+    python benchmark.py --size 5000      # synthetic roster
+    python benchmark.py --strategy greedy --strategy numpy --repeat 50
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from models import Physician
+from strategies import STRATEGIES, get_strategy
+
+
+def synthetic_roster(size: int, seed: int = 0):
+    """A reproducible roster of `size` physician dicts spread over teams A, B and N."""
+    rng = random.Random(seed)
+    return [
+        Physician(
+            name=f"Physician {i}",
+            team=rng.choice(("A", "A", "B", "B", "N")),
+            is_new=rng.random() < 0.1,
+            is_working=rng.random() < 0.9,
+            n_total_patients=rng.randint(4, 18),
+            n_step_down_patients=rng.randint(0, 2),
+            n_traded_patients=rng.randint(0, 1)
+        ).to_dict()
+        for i in range(size)
+    ]
+
+
+def benchmark_strategies(roster_data: list[dict], allocation_kwargs: dict, names=None, repeat: int = 20, options: dict = None):
+    """
+    Time each named strategy (all registered ones by default) on the roster.
+
+    The roster is parsed once and cloned before every run, outside the timed
+    section. One untimed warm-up run precedes the `repeat` timed runs.
+    Returns a list of {strategy, runs, min_ms, median_ms, mean_ms, max_ms}
+    rows; a strategy that cannot run gets an 'error' instead.
+    """
+    roster = [Physician.from_dict(p) for p in roster_data]
+    options = options or {}
+
+    rows = []
+    for name in names or list(STRATEGIES):
+        try:
+            strategy = get_strategy(name)
+            strategy_options = strategy.options_from(options)
+            strategy.run([p.clone() for p in roster], allocation_kwargs, strategy_options)
+
+            timings = []
+            for _ in range(repeat):
+                physicians = [p.clone() for p in roster]
+                start = time.perf_counter()
+                strategy.run(physicians, allocation_kwargs, strategy_options)
+                timings.append((time.perf_counter() - start) * 1000)
+        except Exception as e:
+            rows.append({"strategy": name, "error": str(e)})
+            continue
+
+        rows.append({
+            "strategy": name,
+            "runs": repeat,
+            "min_ms": round(min(timings), 3),
+            "median_ms": round(statistics.median(timings), 3),
+            "mean_ms": round(statistics.fmean(timings), 3),
+            "max_ms": round(max(timings), 3),
+        })
+    return rows
+
+
+def main():
+    import config
+    from data_manager import load_physicians
+
+    parser = argparse.ArgumentParser(description="Benchmark the registered allocation strategies.")
+    parser.add_argument("--size", type=int, default=0, help="synthetic roster size (default: saved physician table)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the synthetic roster")
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs per strategy")
+    parser.add_argument("--strategy", action="append", dest="strategies", help="strategy to time (repeatable)")
+    args = parser.parse_args()
+
+    if args.size:
+        roster_data = synthetic_roster(args.size, args.seed)
+    else:
+        roster_data = [p.to_dict() for p in load_physicians()]
+
+    # Scale the pools with the roster so every engine has real work to do
+    working = sum(1 for p in roster_data if p["is_working"])
+    parameters = dict(config.DEFAULT_PARAMETERS)
+    if args.size:
+        parameters.update(n_A_new_patients=working, n_B_new_patients=working // 2, n_N_new_patients=working // 5,
+                          n_step_down_patients=working // 4)
+    allocation_kwargs = {**parameters, "maximum_step_down": 1, "is_new_shift_day": False}
+
+    print(f"{len(roster_data)} physicians ({working} working), {args.repeat} runs per strategy")
+    print(f"{'strategy':<16}{'min ms':>10}{'median ms':>12}{'mean ms':>10}{'max ms':>10}")
+    for row in benchmark_strategies(roster_data, allocation_kwargs, args.strategies, args.repeat):
+        if "error" in row:
+            print(f"{row['strategy']:<16}{row['error']}")
+        else:
+            print(f"{row['strategy']:<16}{row['min_ms']:>10}{row['median_ms']:>12}{row['mean_ms']:>10}{row['max_ms']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -49,5 +49,61 @@ DEFAULT_PARAMETERS = {
     "new_start_number": 5
 }
 
-# Team options
+# Teams offered by default; any other team name is accepted
 TEAMS = ["A", "B", "N"]
+
+# Allocation result cache: maximum entries and time-to-live in seconds
+ALLOCATION_CACHE_SIZE = int(os.environ.get('ALLOCATION_CACHE_SIZE', 256))
+ALLOCATION_CACHE_TTL = int(os.environ.get('ALLOCATION_CACHE_TTL', 600))
+
+# Incremental allocation: server-side states kept and their idle lifetime in seconds
+INCREMENTAL_MAX_STATES = int(os.environ.get('INCREMENTAL_MAX_STATES', 64))
+INCREMENTAL_STATE_TTL = int(os.environ.get('INCREMENTAL_STATE_TTL', 3600))
+
+# Allocation strategy used when a request does not name one (see strategies.py)
+DEFAULT_ALLOCATION_STRATEGY = os.environ.get('ALLOCATION_STRATEGY', 'greedy')
+
+# Strategy benchmarks: upper bound on timed runs per strategy per request
+BENCHMARK_MAX_REPEAT = int(os.environ.get('BENCHMARK_MAX_REPEAT', 100))
+
+# Time every allocation into the phase histograms, not just ?profile=1 requests
+ALLOCATION_PROFILING = os.environ.get('ALLOCATION_PROFILING', '').lower() in ('1', 'true', 'yes')
+
+# Allocation decision traces for ?explain=1: trace every allocation, not just
+# ?explain=1 requests (off by default: recording adds roughly 15% to the engine
+# at 20 physicians and 7-8% at 200-5000; without it ?explain=1 reruns the
+# allocation to trace it), and the ring size in events (one event per
+# physician per decision)
+ALLOCATION_TRACING = os.environ.get('ALLOCATION_TRACING', '').lower() in ('1', 'true', 'yes')
+EXPLAIN_BUFFER_EVENTS = int(os.environ.get('EXPLAIN_BUFFER_EVENTS', 1024))
+
+# Reject rosters and parameters the feasibility analysis finds impossible before any engine runs
+FEASIBILITY_CHECK = os.environ.get('FEASIBILITY_CHECK', '1').lower() in ('1', 'true', 'yes')
+
+# Streaming admissions: routers kept and their idle lifetime in seconds
+ADMISSION_MAX_ROUTERS = int(os.environ.get('ADMISSION_MAX_ROUTERS', 16))
+ADMISSION_ROUTER_TTL = int(os.environ.get('ADMISSION_ROUTER_TTL', 86400))
+
+# Optimal allocation mode: wall-clock budget in seconds before falling back to greedy
+OPTIMAL_TIME_BUDGET = float(os.environ.get('OPTIMAL_TIME_BUDGET', 0.5))
+
+# Worker processes for sweeps and simulations (0 uses every core)
+WORKER_PROCESSES = int(os.environ.get('WORKER_PROCESSES', 0))
+
+# Parameter sweeps: upper bound on combinations per request
+SWEEP_MAX_COMBINATIONS = int(os.environ.get('SWEEP_MAX_COMBINATIONS', 50000))
+
+# Monte Carlo simulations: upper bound on trials per request
+SIMULATION_MAX_TRIALS = int(os.environ.get('SIMULATION_MAX_TRIALS', 20000))
+
+# Horizon simulations: upper bound on days per request, and the weekday
+# (Monday = 0) that is a new shift day, as auto-detected in main.js
+HORIZON_MAX_DAYS = int(os.environ.get('HORIZON_MAX_DAYS', 90))
+NEW_SHIFT_WEEKDAY = int(os.environ.get('NEW_SHIFT_WEEKDAY', 2))
+
+# Background jobs: worker threads, jobs kept (finished ones are evicted oldest
+# first), seconds a job may run, and seconds a finished job is kept
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+JOB_MAX_STORED = int(os.environ.get('JOB_MAX_STORED', 100))
+JOB_TIMEOUT = int(os.environ.get('JOB_TIMEOUT', 300))
+JOB_RESULT_TTL = int(os.environ.get('JOB_RESULT_TTL', 3600))
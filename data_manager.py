@@ -11,6 +11,7 @@ from config import (
     TEAM_ASSIGNMENTS_FILE, DEFAULT_MASTER_LIST, DEFAULT_PARAMETERS
 )
 from models import Physician
+from roster import Roster
 
 
 def _str_to_bool(value):
@@ -120,6 +121,11 @@ def load_physicians():
         return []
 
 
+def load_roster():
+    """Loads the physician table as a Roster (IDs in table order, indexed by name)."""
+    return Roster(load_physicians())
+
+
 def save_yesterday_physicians(physician_names):
     """Saves yesterday's physician names to a file."""
     filtered_names = [str(name).strip() for name in physician_names
@@ -209,8 +215,15 @@ def load_master_list():
     return sorted(list(set(DEFAULT_MASTER_LIST)))
 
 
+# Column prefix for per-team pools in the parameters file
+TEAM_POOL_PREFIX = "team_pool_"
+
+
 def save_parameters(params_dict):
-    """Saves allocation parameters to a file."""
+    """Saves allocation parameters to a file, with team_pools as one column per team."""
+    params_dict = dict(params_dict)
+    for team, pool in (params_dict.pop("team_pools", None) or {}).items():
+        params_dict[TEAM_POOL_PREFIX + team] = pool
     fieldnames = list(params_dict.keys())
 
     with open(DEFAULT_PARAMS_FILE, 'w', newline='') as f:
@@ -238,6 +251,11 @@ def load_parameters():
                     "minimum_patients": _safe_int(row.get("minimum_patients", 10), 10),
                     "maximum_patients": _safe_int(row.get("maximum_patients", 14), 14),
                     "new_start_number": _safe_int(row.get("new_start_number", 10), 10),
+                    "team_pools": {
+                        key[len(TEAM_POOL_PREFIX):]: _safe_int(value, 0)
+                        for key, value in row.items()
+                        if key and key.startswith(TEAM_POOL_PREFIX)
+                    },
                 }
     except Exception:
         pass
@@ -313,29 +331,28 @@ def load_default_physicians():
 
 def update_physician(name, updated_data):
     """Update a single physician's data by name."""
-    physicians = load_physicians()
-    for i, p in enumerate(physicians):
-        if p.name == name:
-            # Update attributes
-            for key, value in updated_data.items():
-                if hasattr(p, key):
-                    setattr(p, key, value)
-            break
+    roster = load_roster()
+    p = roster.get(name)
+    if p is not None:
+        # Update attributes
+        for key, value in updated_data.items():
+            if hasattr(p, key):
+                setattr(p, key, value)
+    physicians = roster.physicians
     save_physicians(physicians)
     return physicians
 
 
 def add_physician(physician_data):
     """Add a new physician to the table."""
-    physicians = load_physicians()
-    existing_names = [p.name for p in physicians]
+    roster = load_roster()
     name = physician_data.get("name") if isinstance(physician_data, dict) else physician_data.name
-    if name not in existing_names:
+    if roster.get(name) is None:
         if isinstance(physician_data, dict):
             physician_data = Physician(**physician_data)
-        physicians.append(physician_data)
-        save_physicians(physicians)
-    return physicians
+        roster.append(physician_data)
+        save_physicians(roster.physicians)
+    return roster.physicians
 
 
 def delete_physician(name):
@@ -389,7 +406,7 @@ def load_team_assignments():
                 name = str(row.get("Physician Name", "")).strip()
                 team = str(row.get("Team", "A")).strip()
                 if name:
-                    assignments[name] = team if team in ("A", "B", "N") else "A"
+                    assignments[name] = team or "A"
         return assignments
     except Exception:
         return {}
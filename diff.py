@@ -0,0 +1,132 @@
+"""
+Allocation diffs for the Patient Allocator application.
+
+Compares two allocation outputs and keeps only what moved: the physicians
+whose total or step-down count changed, and the change per team. Rows are
+matched by a hash join on physician identity (name, and for repeated names
+the order they appear in), so the cost is linear in the roster and the
+response grows with the number of changes, not with the roster.
+"""
+
+# Fields read from each result row; the rest of the row is not compared
+_FIELDS = ("name", "team", "total_patients", "step_down_patients")
+
+
+def _result_columns(results):
+    """
+    (names, teams, totals, step_downs) lists from row results or from the
+    columnar layout ({columns, values, length}) of ?format=columnar.
+    """
+    if isinstance(results, dict):
+        positions = {column: i for i, column in enumerate(results.get("columns", []))}
+        missing = [field for field in _FIELDS if field not in positions]
+        if missing:
+            raise ValueError(f"Columnar results are missing {', '.join(missing)}")
+        values = results.get("values", [])
+        return tuple(values[positions[field]] for field in _FIELDS)
+    return (
+        [row.get("name", "") for row in results],
+        [row.get("team", "A") for row in results],
+        [row.get("total_patients", 0) for row in results],
+        [row.get("step_down_patients", 0) for row in results],
+    )
+
+
+def _identities(names):
+    """(name, occurrence) per row, so repeated names pair up in order."""
+    seen = {}
+    keys = []
+    for name in names:
+        occurrence = seen.get(name, 0)
+        seen[name] = occurrence + 1
+        keys.append((name, occurrence))
+    return keys
+
+
+def diff_allocations(before, after):
+    """
+    Diff two allocation results (the 'results' of an allocation response,
+    as rows or columns).
+
+    Returns {changed, added, removed, unchanged, teams}: changed lists the
+    physicians present in both whose total or step-down count differs, with
+    both counts and the deltas; added and removed list physicians present in
+    only one run; teams gives each team's change in total and step-down
+    census and how many of its physicians changed, by the team in each run.
+    """
+    names, teams, totals, step_downs = _result_columns(before)
+    # Build side: identity -> row of the earlier run
+    index = {key: row for row, key in enumerate(_identities(names))}
+
+    team_deltas = {}
+
+    def team_delta(team):
+        delta = team_deltas.get(team)
+        if delta is None:
+            delta = team_deltas[team] = {"total": 0, "step_down": 0, "changed": 0}
+        return delta
+
+    changed = []
+    added = []
+    unchanged = 0
+    matched = bytearray(len(names))
+    after_names, after_teams, after_totals, after_step_downs = _result_columns(after)
+
+    # Probe side: one lookup per row of the later run
+    for key, team, total, step_down in zip(_identities(after_names), after_teams, after_totals, after_step_downs):
+        row = index.get(key)
+        if row is None:
+            added.append({"name": key[0], "team": team, "total_patients": total, "step_down_patients": step_down})
+            delta = team_delta(team)
+            delta["total"] += total
+            delta["step_down"] += step_down
+            delta["changed"] += 1
+            continue
+
+        matched[row] = 1
+        old_total = totals[row]
+        old_step_down = step_downs[row]
+        if total == old_total and step_down == old_step_down and team == teams[row]:
+            unchanged += 1
+            continue
+
+        changed.append({
+            "name": key[0],
+            "team": team,
+            "total_patients": [old_total, total],
+            "step_down_patients": [old_step_down, step_down],
+            "delta_total": total - old_total,
+            "delta_step_down": step_down - old_step_down,
+            **({"previous_team": teams[row]} if team != teams[row] else {}),
+        })
+        old = team_delta(teams[row])
+        old["total"] -= old_total
+        old["step_down"] -= old_step_down
+        new = team_delta(team)
+        new["total"] += total
+        new["step_down"] += step_down
+        new["changed"] += 1
+        if team != teams[row]:
+            old["changed"] += 1
+
+    removed = []
+    for row, seen in enumerate(matched):
+        if not seen:
+            removed.append({
+                "name": names[row],
+                "team": teams[row],
+                "total_patients": totals[row],
+                "step_down_patients": step_downs[row],
+            })
+            delta = team_delta(teams[row])
+            delta["total"] -= totals[row]
+            delta["step_down"] -= step_downs[row]
+            delta["changed"] += 1
+
+    return {
+        "changed": changed,
+        "added": added,
+        "removed": removed,
+        "unchanged": unchanged,
+        "teams": team_deltas,
+    }
@@ -0,0 +1,188 @@
+"""
+Allocation trace ("explain") mode for the Patient Allocator application.
+
+While tracing, allocate_patients records each decision as an event of three
+integers (phase, physician index, delta), kept in a ring of the newest
+events. Events are written as integers as they are recorded, so a trace
+never holds the engine's lists or Physicians, and nothing is formatted:
+render_trace turns events into readable lines only when an explanation is
+asked for. Physician indices are physician IDs, i.e. the roster order
+passed to the engine.
+"""
+
+import contextvars
+from itertools import compress
+from operator import attrgetter
+
+# Event phases
+NEW_TOP_UP = 0           # new physician topped up towards new_start_number
+ROUND_ROBIN = 1          # round-robin passes
+LEFTOVER = 2             # leftover after the full passes, lowest totals first
+STEP_DOWN_SHARE = 3      # step-down pool split; index = step-down group (0 = Team A, 1 = Teams B+N by default)
+STEP_DOWN = 4            # step-down patient given
+STEP_DOWN_AS_REGULAR = 5  # at maximum_step_down, regular patient given instead
+STEP_DOWN_SKIPPED = 6    # step-down slot not placed: at both maximums
+NEW_VERIFICATION = 7     # new physician at new_start_number reset to their start
+MINIMUM_DONOR = 8        # patients moved away by the minimum check
+MINIMUM_RECIPIENT = 9    # patients received in the minimum check
+NEW_SHIFT_TOTAL = 10     # new shift day: change in regular patients
+NEW_SHIFT_STEP_DOWN = 11  # new shift day: change in step-down patients
+
+# Phases that change regular and step-down counts when rendering
+_TOTAL_PHASES = {NEW_TOP_UP, ROUND_ROBIN, LEFTOVER, STEP_DOWN_AS_REGULAR, NEW_VERIFICATION,
+                 MINIMUM_DONOR, MINIMUM_RECIPIENT, NEW_SHIFT_TOTAL}
+_STEP_DOWN_PHASES = {STEP_DOWN, NEW_SHIFT_STEP_DOWN}
+
+_physician_id = attrgetter("id")
+
+
+class AllocationTrace:
+    """
+    Ring of the newest `capacity` (phase, index, delta) events.
+
+    Events are appended to a flat list of integers, which grows with the run
+    instead of being allocated at full capacity up front, so a small roster
+    pays for a small trace. Once it holds twice the capacity, the oldest
+    events are cut in one slice, keeping each append amortized O(1).
+    """
+
+    __slots__ = ("capacity", "group_names", "_count", "_events")
+
+    def __init__(self, capacity: int = 4096):
+        self.capacity = max(1, capacity)
+        # Teams in each step-down group, set by the engine
+        self.group_names = [["A"], ["B", "N"]]
+        self._count = 0
+        # Flat (phase, index, delta) triples, oldest first
+        self._events = []
+
+    def record(self, phase: int, physician, delta: int):
+        """Record an event for a Physician, by its ID."""
+        self._events += (phase, physician.id, delta)
+        self._added(1)
+
+    def record_many(self, phase: int, physicians, deltas):
+        """Record one event per Physician whose delta is non-zero."""
+        indices = list(compress(map(_physician_id, physicians), deltas))
+        if indices:
+            block = [phase, 0, 0] * len(indices)
+            block[1::3] = indices
+            block[2::3] = filter(None, deltas)
+            self._events += block
+            self._added(len(indices))
+
+    def record_index(self, phase: int, index: int, delta: int):
+        """Record an event by roster index (or group code for team-level events)."""
+        self._events += (phase, index, delta)
+        self._added(1)
+
+    def _added(self, events: int):
+        self._count += events
+        if len(self._events) > 6 * self.capacity:
+            # Only the newest `capacity` events are kept
+            del self._events[:-3 * self.capacity]
+
+    @property
+    def count(self) -> int:
+        """Events recorded, including any that were overwritten."""
+        return self._count
+
+    @property
+    def dropped(self) -> int:
+        """Events overwritten because the buffer wrapped."""
+        return max(0, self._count - self.capacity)
+
+    def events(self):
+        """Retained events, oldest first, as (phase, index, delta) tuples."""
+        events = self._events[-3 * self.capacity:]
+        return zip(events[0::3], events[1::3], events[2::3])
+
+
+_active_trace = contextvars.ContextVar("allocation_trace", default=None)
+
+
+def active_trace():
+    """The trace engines should record to, or None when not tracing."""
+    return _active_trace.get()
+
+
+class tracing:
+    """
+    Trace the allocation run inside the block:
+
+        with tracing(enabled, capacity) as trace:
+            allocate_patients(...)
+
+    The trace is None when not enabled, and the block then runs untraced
+    even inside an outer tracing block.
+    """
+
+    __slots__ = ("trace", "_token")
+
+    def __init__(self, enabled: bool = True, capacity: int = 4096):
+        self.trace = AllocationTrace(capacity) if enabled else None
+        self._token = None
+
+    def __enter__(self):
+        self._token = _active_trace.set(self.trace)
+        return self.trace
+
+    def __exit__(self, *exc_info):
+        _active_trace.reset(self._token)
+        return False
+
+
+_LABELS = {
+    NEW_TOP_UP: "New physician top-up",
+    ROUND_ROBIN: "Round-robin",
+    LEFTOVER: "Leftover to lowest total",
+    STEP_DOWN: "Step-down",
+    STEP_DOWN_AS_REGULAR: "Step-down at maximum, regular patient instead",
+    STEP_DOWN_SKIPPED: "Step-down skipped, at both maximums",
+    NEW_VERIFICATION: "New physician reset to starting census",
+    MINIMUM_DONOR: "Minimum check, gave",
+    MINIMUM_RECIPIENT: "Minimum check, received",
+    NEW_SHIFT_TOTAL: "New shift day regular",
+    NEW_SHIFT_STEP_DOWN: "New shift day",
+}
+
+
+def render_trace(trace: AllocationTrace, physician_data: list[dict]):
+    """
+    Render a trace as readable lines, replaying the deltas from the starting
+    counts in physician_data (the roster the engine was given).
+    """
+    names = [p.get("name", "") for p in physician_data]
+    totals = [p.get("total_patients", 0) for p in physician_data]
+    step_downs = [p.get("step_down_patients", 0) for p in physician_data]
+
+    lines = []
+    # Without the earliest events the running counts cannot be replayed
+    show_counts = not trace.dropped
+    if trace.dropped:
+        lines.append(f"({trace.dropped} earlier events were dropped)")
+
+    if not trace.count:
+        return ["No allocation decisions were recorded"]
+
+    for phase, index, delta in trace.events():
+        if phase == STEP_DOWN_SHARE:
+            teams = trace.group_names[index] if index < len(trace.group_names) else [str(index)]
+            group = f"Team {teams[0]}" if len(teams) == 1 else f"Teams {'+'.join(teams)}"
+            lines.append(f"Step-down split: {group} gets {delta}")
+            continue
+
+        name = names[index]
+        if phase in _TOTAL_PHASES:
+            before = totals[index]
+            totals[index] += delta
+            counts = f" ({before} → {totals[index]})" if show_counts else ""
+            lines.append(f"{_LABELS[phase]}: {name} {delta:+d}{counts}")
+        elif phase in _STEP_DOWN_PHASES:
+            before = step_downs[index]
+            step_downs[index] += delta
+            counts = f" ({before} → {step_downs[index]})" if show_counts else ""
+            lines.append(f"{_LABELS[phase]}: {name} {delta:+d} step-down{counts}")
+        else:
+            lines.append(f"{_LABELS[phase]}: {name}")
+    return lines
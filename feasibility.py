@@ -0,0 +1,209 @@
+"""
+Up-front feasibility analysis for the Patient Allocator application.
+
+Checks a roster and parameter set in one O(n) pass before any engine runs:
+whether the pools fit under maximum_patients, whether the census can bring
+every working physician up to minimum_patients, and whether the parameters
+contradict each other. Engines never see inputs that are diagnosed as
+infeasible, and the UI can call the analysis on its own while parameters
+are being typed.
+"""
+
+from models import Physician
+from allocation import DEFAULT_TEAMS, resolve_team_pools, split_step_down_by_headcount
+
+# Order in which binding constraints are reported when several fail
+_CONSTRAINT_ORDER = ("parameters", "new_start_number", "maximum_patients", "minimum_patients")
+
+
+class _TeamLoad:
+    """Per-team sums collected in the single pass over the roster."""
+
+    __slots__ = ("working", "regular", "step_down", "headroom")
+
+    def __init__(self):
+        self.working = 0
+        self.regular = 0
+        self.step_down = 0
+        # Patients the regular allocation can still give the team's physicians
+        self.headroom = 0
+
+
+def analyze_feasibility(
+    physicians: list[Physician],
+    n_total_new_patients: int,
+    n_A_new_patients: int,
+    n_B_new_patients: int,
+    n_N_new_patients: int,
+    new_start_number: int,
+    minimum_patients: int = 10,
+    n_step_down_patients: int = 0,
+    maximum_patients: int = 1000,
+    maximum_step_down: int = 1,
+    is_new_shift_day: bool = False,
+    team_pools: dict = None,
+    **_options
+):
+    """
+    Diagnose whether allocate_patients can honour the parameters on this roster.
+
+    Takes the allocate_patients arguments; strategy options are ignored.
+    Returns {feasible, binding, errors, warnings, capacity, minimum, teams}:
+    errors and warnings are {constraint, message} entries, binding names the
+    constraint of the first error (None when feasible), capacity and minimum
+    compare the pools and census with the caps, and teams gives each team's
+    working count, pool, capacity and shortfall.
+
+    On a regular day the pools are shared, so capacity is checked over the
+    whole roster and a team that cannot take its own pool is only a warning.
+    The minimum check uses the most census the day can end with, so it only
+    fails when no allocation could reach minimum_patients. Passing does not
+    rule out a few unplaced patients: the greedy engine hands the last
+    partial round-robin pass out one per physician, and reports any left
+    over through capacity_exhausted. On a new shift day each team is
+    redistributed on its own and is checked separately.
+    """
+    pools = resolve_team_pools(n_A_new_patients, n_B_new_patients, n_N_new_patients, team_pools)
+    errors = []
+    warnings = []
+
+    def fail(constraint, message):
+        errors.append({"constraint": constraint, "message": message})
+
+    def warn(constraint, message):
+        warnings.append({"constraint": constraint, "message": message})
+
+    # Parameter values on their own
+    for name, value in (
+        ("n_step_down_patients", n_step_down_patients),
+        ("minimum_patients", minimum_patients),
+        ("maximum_patients", maximum_patients),
+        ("maximum_step_down", maximum_step_down),
+        ("new_start_number", new_start_number),
+    ):
+        if value < 0:
+            fail("parameters", f"{name} cannot be negative ({value})")
+    for team, pool in pools.items():
+        if pool < 0:
+            fail("parameters", f"Team {team} pool cannot be negative ({pool})")
+    if minimum_patients > maximum_patients:
+        fail("minimum_patients",
+             f"minimum_patients ({minimum_patients}) is above maximum_patients ({maximum_patients})")
+    if new_start_number > maximum_patients and not is_new_shift_day:
+        fail("new_start_number",
+             f"new_start_number ({new_start_number}) is above maximum_patients ({maximum_patients}); "
+             f"new physicians would be topped up past the cap")
+
+    # One pass over the roster
+    teams = {team: _TeamLoad() for team in DEFAULT_TEAMS}
+    step_down_room = 0
+    # Regular patients the working physicians can take before maximum_patients
+    regular_room = 0
+    for p in physicians:
+        load = teams.get(p.team)
+        if load is None:
+            load = teams[p.team] = _TeamLoad()
+        if not p.is_working:
+            continue
+        load.working += 1
+        load.regular += p.total_patients
+        load.step_down += p.step_down_patients
+        # New physicians are only topped up to new_start_number
+        ceiling = new_start_number if p.is_new else maximum_patients
+        load.headroom += max(0, ceiling - p.total_patients)
+        regular_room += max(0, maximum_patients - p.total_patients)
+        if p.step_down_patients < maximum_step_down:
+            step_down_room += 1
+
+    working = sum(load.working for load in teams.values())
+    census = sum(load.regular for load in teams.values())
+    team_rows = {}
+
+    if is_new_shift_day:
+        # Each team's census is spread evenly, then clamped to [minimum, maximum]
+        shares = split_step_down_by_headcount(n_step_down_patients, {team: load.working for team, load in teams.items()})
+        pool = shortfall = capacity = 0
+        projected = 0
+        for team, load in teams.items():
+            new_step_down = shares.get(team, 0)
+            team_step_down = load.step_down + new_step_down
+            kept_step_down = min(team_step_down, load.working * maximum_step_down)
+            regular = load.regular + load.step_down + pools.get(team, 0) + new_step_down - kept_step_down
+            team_capacity = load.working * maximum_patients
+            team_shortfall = max(0, regular - team_capacity) if load.working else pools.get(team, 0) + new_step_down
+            team_rows[team] = {
+                "working": load.working,
+                "pool": pools.get(team, 0) + new_step_down,
+                "capacity": team_capacity,
+                "shortfall": team_shortfall,
+            }
+            pool += pools.get(team, 0) + new_step_down
+            capacity += team_capacity
+            shortfall += team_shortfall
+            if load.working:
+                projected += min(regular, team_capacity)
+                if team_shortfall:
+                    fail("maximum_patients",
+                         f"Team {team} needs {regular} regular patients on {load.working} physician(s), "
+                         f"{team_shortfall} over maximum_patients")
+                if regular < load.working * minimum_patients:
+                    fail("minimum_patients",
+                         f"Team {team} has {regular} regular patients for {load.working} physician(s), "
+                         f"{load.working * minimum_patients - regular} short of minimum_patients")
+            elif team_shortfall:
+                fail("maximum_patients", f"Team {team} has {team_shortfall} new patients and nobody working")
+    else:
+        # The engine's regular pool includes the step-down count
+        pool = sum(pools.values()) + n_step_down_patients
+        capacity = sum(load.headroom for load in teams.values())
+        shortfall = max(0, pool - capacity)
+        # Step-down patients beyond maximum_step_down turn into regular patients,
+        # as many as the pool holds and the room left under maximum_patients allows
+        placed = min(pool, capacity)
+        projected = census + placed + min(n_step_down_patients, max(0, regular_room - placed))
+        if shortfall:
+            fail("maximum_patients",
+                 f"{pool} new patients but only room for {capacity} under the caps; {shortfall} cannot be placed")
+        for team, load in teams.items():
+            team_pool = pools.get(team, 0)
+            team_shortfall = max(0, team_pool - load.headroom)
+            team_rows[team] = {
+                "working": load.working,
+                "pool": team_pool,
+                "capacity": load.headroom,
+                "shortfall": team_shortfall,
+            }
+            if team_shortfall:
+                warn("maximum_patients",
+                     f"Team {team} cannot take its own pool of {team_pool} ({team_shortfall} over); "
+                     f"other teams absorb the rest")
+        if working and projected < working * minimum_patients:
+            fail("minimum_patients",
+                 f"The census after allocation ({projected}) cannot give {working} working physician(s) "
+                 f"{minimum_patients} each")
+
+    if n_step_down_patients > 0 and not step_down_room:
+        warn("maximum_step_down",
+             "Nobody working is below maximum_step_down; step-down patients become regular patients")
+    if new_start_number < minimum_patients:
+        warn("new_start_number",
+             f"new_start_number ({new_start_number}) is below minimum_patients ({minimum_patients}); "
+             f"the minimum check can raise new physicians past their start")
+
+    binding = None
+    if errors:
+        binding = min((e["constraint"] for e in errors), key=_CONSTRAINT_ORDER.index)
+
+    return {
+        "feasible": not errors,
+        "binding": binding,
+        "errors": errors,
+        "warnings": warnings,
+        "capacity": {"pool": pool, "capacity": capacity, "shortfall": shortfall},
+        "minimum": {
+            "required": working * minimum_patients,
+            "census": projected,
+            "shortfall": max(0, working * minimum_patients - projected),
+        },
+        "teams": team_rows,
+    }
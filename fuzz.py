@@ -0,0 +1,300 @@
+"""
+Differential fuzzing of allocation engines for the Patient Allocator application.
+
+Generates random rosters and parameter sets from seeds, runs the reference
+engine (greedy, i.e. allocate_patients) and a candidate strategy on each, and
+reports every case where their outputs differ, shrunk to a minimal
+reproducer. Cases are spread over a process pool in blocks of seeds, so only
+seed ranges and mismatching seeds cross process boundaries:
+
+    python fuzz.py --candidate numpy --cases 1000000
+    python fuzz.py --candidate optimal --cases 20000 --max-size 12
+    python fuzz.py --candidate numpy --seed 4821 --cases 1    # replay one case
+
+The generator leans on edge cases: new physicians at or above
+new_start_number, everyone at maximum_patients, nobody working, empty
+rosters, repeated names, extra teams and team pools, maximum_step_down of 0
+and new shift days.
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from models import Physician
+from strategies import get_strategy
+
+# Result fields both engines must agree on; engine-specific extras are ignored
+COMPARED_FIELDS = (
+    "results", "summary", "capacity_exhausted",
+    "unallocated_patients", "unallocated_step_down", "minimum_shortfall"
+)
+
+# Seeds per task handed to a worker process
+BLOCK_SIZE = 2000
+
+# A physician row with every field at its default, and the fields holding counts
+_DEFAULT_ROW = Physician().to_dict()
+_COUNT_FIELDS = ("total_patients", "step_down_patients", "transferred_patients", "traded_patients")
+
+# Strategies compared in each worker process
+_worker_strategies = None
+
+
+def random_case(seed: int, max_size: int = 30):
+    """A reproducible (roster_data, allocation kwargs) pair for a seed."""
+    rng = random.Random(seed)
+    maximum_patients = rng.randint(0, 25)
+    new_start_number = rng.randint(0, 20)
+    maximum_step_down = rng.choice((0, 1, 1, 1, 2, 3))
+    teams = ["A", "B", "N"] + rng.sample(["C", "ICU", "Z"], rng.randint(0, 2))
+
+    size = rng.choice((0, 1, 2, 3)) if rng.random() < 0.1 else rng.randint(1, max_size)
+    nobody_working = rng.random() < 0.05
+    everyone_at_maximum = rng.random() < 0.05
+    names = [f"P{i}" for i in range(size)]
+    if size > 1 and rng.random() < 0.1:
+        names[rng.randrange(size)] = names[0]
+
+    roster = []
+    for name in names:
+        is_new = rng.random() < 0.2
+        if everyone_at_maximum:
+            total = maximum_patients
+        elif is_new and rng.random() < 0.5:
+            # At or above new_start_number
+            total = new_start_number + rng.randint(0, 3)
+        else:
+            total = rng.randint(0, maximum_patients + 3)
+        roster.append(Physician(
+            name=name,
+            team=rng.choice(teams),
+            is_new=is_new,
+            is_buffer=rng.random() < 0.05,
+            is_working=not nobody_working and rng.random() < 0.9,
+            n_total_patients=total,
+            n_step_down_patients=rng.randint(0, maximum_step_down + 1),
+            n_traded_patients=rng.randint(0, 2),
+        ).to_dict())
+
+    kwargs = {
+        "n_total_new_patients": 0,
+        "n_A_new_patients": rng.randint(0, 3 * size + 5),
+        "n_B_new_patients": rng.randint(0, 3 * size + 5),
+        "n_N_new_patients": rng.randint(0, size + 2),
+        "new_start_number": new_start_number,
+        "minimum_patients": rng.randint(0, 15),
+        "n_step_down_patients": rng.randint(0, size + 4),
+        "maximum_patients": maximum_patients,
+        "maximum_step_down": maximum_step_down,
+        "is_new_shift_day": rng.random() < 0.2,
+        "team_pools": {team: rng.randint(0, 8) for team in rng.sample(teams, rng.randint(0, 2))},
+    }
+    kwargs["n_total_new_patients"] = kwargs["n_A_new_patients"] + kwargs["n_B_new_patients"] + kwargs["n_N_new_patients"]
+    return roster, kwargs
+
+
+def run_case(strategy, roster_data: list[dict], kwargs: dict):
+    """The compared fields of a strategy's output, or ('error', exception type)."""
+    try:
+        result = strategy.run([Physician.from_dict(p) for p in roster_data], kwargs)
+    except Exception as e:
+        return ("error", type(e).__name__)
+    return {field: result.get(field) for field in COMPARED_FIELDS}
+
+
+def _init_worker(reference: str, candidate: str):
+    global _worker_strategies
+    _worker_strategies = (get_strategy(reference), get_strategy(candidate))
+
+
+def _run_block(first_seed: int, count: int, max_size: int, strategies=None):
+    """Seeds in [first_seed, first_seed + count) whose outputs differ."""
+    reference, candidate = strategies or _worker_strategies
+    mismatches = []
+    for seed in range(first_seed, first_seed + count):
+        roster, kwargs = random_case(seed, max_size)
+        if run_case(reference, roster, kwargs) != run_case(candidate, roster, kwargs):
+            mismatches.append(seed)
+    return mismatches
+
+
+def _simpler(value):
+    """Smaller values to try in place of an integer, simplest first."""
+    if isinstance(value, bool) or not isinstance(value, int) or value <= 0:
+        return []
+    return sorted({0, value // 2, value - 1})
+
+
+def shrink(roster: list[dict], kwargs: dict, fails):
+    """
+    Reduce a failing case while fails(roster, kwargs) stays true: drop
+    physicians (halves first, then single rows), then lower counts, clear
+    flags and move physicians to Team A, then lower parameters and drop
+    team pools. Repeats until nothing more can be removed.
+    """
+    roster = [dict(p) for p in roster]
+    kwargs = {**kwargs, "team_pools": dict(kwargs.get("team_pools") or {})}
+
+    progress = True
+    while progress:
+        progress = False
+
+        chunk = max(1, len(roster) // 2)
+        while chunk:
+            start = 0
+            while start < len(roster):
+                candidate = roster[:start] + roster[start + chunk:]
+                if fails(candidate, kwargs):
+                    roster = candidate
+                    progress = True
+                else:
+                    start += chunk
+            chunk //= 2
+
+        for index in range(len(roster)):
+            for field, value in list(roster[index].items()):
+                if field == "name" or value == _DEFAULT_ROW.get(field):
+                    continue
+                # Flags and teams go back to their defaults, counts go down
+                options = _simpler(value) if field in _COUNT_FIELDS else [_DEFAULT_ROW.get(field)]
+                for option in options:
+                    candidate = roster[:index] + [{**roster[index], field: option}] + roster[index + 1:]
+                    if fails(candidate, kwargs):
+                        roster = candidate
+                        progress = True
+                        break
+
+        for team in list(kwargs["team_pools"]):
+            pools = {key: value for key, value in kwargs["team_pools"].items() if key != team}
+            if fails(roster, {**kwargs, "team_pools": pools}):
+                kwargs["team_pools"] = pools
+                progress = True
+        for field, value in list(kwargs.items()):
+            options = [False] if value is True else _simpler(value)
+            for option in options:
+                candidate = {**kwargs, field: option}
+                if fails(roster, candidate):
+                    kwargs = candidate
+                    progress = True
+                    break
+
+    return roster, kwargs
+
+
+def fuzz(reference: str, candidate: str, cases: int, seed: int = 0, max_size: int = 30,
+         max_workers: int = None, stop_after: int = 0, report=None):
+    """
+    Compare two strategies on `cases` seeded cases starting at `seed`.
+
+    Returns {cases, seconds, cases_per_second, mismatches}, where mismatches
+    lists the failing seeds in order. report, if given, is called with
+    (cases done, mismatches so far, seconds) as blocks finish. With
+    stop_after, the run ends once that many mismatches are found.
+    """
+    # Resolve the names here so unknown or unavailable strategies fail at once
+    strategies = (get_strategy(reference), get_strategy(candidate))
+    blocks = [(first, min(BLOCK_SIZE, seed + cases - first)) for first in range(seed, seed + cases, BLOCK_SIZE)]
+    workers = max_workers or os.cpu_count() or 1
+
+    mismatches = []
+    done = 0
+    started = time.perf_counter()
+
+    def collect(block, found):
+        nonlocal done
+        done += block[1]
+        mismatches.extend(found)
+        if report is not None:
+            report(done, len(mismatches), time.perf_counter() - started)
+        return stop_after and len(mismatches) >= stop_after
+
+    if workers == 1 or len(blocks) == 1:
+        for block in blocks:
+            if collect(block, _run_block(*block, max_size, strategies)):
+                break
+    else:
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(reference, candidate)
+        )
+        try:
+            results = pool.map(_run_block, *zip(*blocks), [max_size] * len(blocks))
+            for block, found in zip(blocks, results):
+                if collect(block, found):
+                    break
+        finally:
+            # Not a with block, whose exit would wait for the blocks nobody will read
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    seconds = time.perf_counter() - started
+    return {
+        "cases": done,
+        "seconds": seconds,
+        "cases_per_second": done / seconds if seconds else 0.0,
+        "mismatches": sorted(mismatches),
+    }
+
+
+def reproducer(reference: str, candidate: str, seed: int, max_size: int = 30):
+    """The shrunk case for a failing seed, with both engines' outputs on it."""
+    strategies = (get_strategy(reference), get_strategy(candidate))
+
+    def fails(roster, kwargs):
+        return run_case(strategies[0], roster, kwargs) != run_case(strategies[1], roster, kwargs)
+
+    roster, kwargs = shrink(*random_case(seed, max_size), fails)
+    return {
+        "seed": seed,
+        "physicians": roster,
+        "parameters": kwargs,
+        reference: run_case(strategies[0], roster, kwargs),
+        candidate: run_case(strategies[1], roster, kwargs),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Differential fuzzing of an allocation strategy against the reference.")
+    parser.add_argument("--candidate", required=True, help="strategy under test")
+    parser.add_argument("--reference", default="greedy", help="strategy taken as correct (default: greedy)")
+    parser.add_argument("--cases", type=int, default=100000, help="number of seeded cases")
+    parser.add_argument("--seed", type=int, default=0, help="first seed")
+    parser.add_argument("--max-size", type=int, default=30, help="largest generated roster")
+    parser.add_argument("--workers", type=int, default=0, help="worker processes (default: every core)")
+    parser.add_argument("--stop-after", type=int, default=0, help="stop after this many mismatches")
+    parser.add_argument("--shrink", type=int, default=3, help="mismatches to shrink into reproducers")
+    parser.add_argument("--out", help="write the reproducers to this JSON file")
+    args = parser.parse_args()
+
+    last_report = 0.0
+
+    def report(done, found, seconds):
+        nonlocal last_report
+        if seconds - last_report >= 5 or done == args.cases:
+            last_report = seconds
+            print(f"{done:>12} cases  {found:>6} mismatches  {done / seconds if seconds else 0:>10.0f} cases/s", flush=True)
+
+    print(f"{args.candidate} vs {args.reference}, seeds {args.seed}..{args.seed + args.cases - 1}")
+    outcome = fuzz(args.reference, args.candidate, args.cases, args.seed, args.max_size,
+                   args.workers or None, args.stop_after, report)
+    print(f"{outcome['cases']} cases in {outcome['seconds']:.1f}s ({outcome['cases_per_second']:.0f} cases/s), "
+          f"{len(outcome['mismatches'])} mismatches")
+
+    reproducers = [reproducer(args.reference, args.candidate, seed, args.max_size)
+                   for seed in outcome["mismatches"][:args.shrink]]
+    for case in reproducers:
+        print(f"\nseed {case['seed']}: {len(case['physicians'])} physician(s)")
+        print(json.dumps({"physicians": case["physicians"], "parameters": case["parameters"]}))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(reproducers, f, indent=2)
+
+    raise SystemExit(1 if outcome["mismatches"] else 0)
+
+
+if __name__ == "__main__":
+    main()
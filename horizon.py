@@ -0,0 +1,163 @@
+"""
+Multi-day census horizon simulator for the Patient Allocator application.
+
+Chains the allocation day after day: each morning a share of every
+physician's patients is discharged, the day's admissions are allocated
+(as a new shift day on the configured weekday) and the resulting census is
+carried forward as the next day's starting roster. The roster is converted
+to integer columns once and every day runs on the array kernel, so a month
+for hundreds of physicians takes milliseconds. Requires NumPy.
+"""
+
+import datetime
+
+from models import Physician
+from allocation import resolve_team_pools
+from allocation_kernel import np, require_numpy, allocate_arrays, roster_to_columns
+from simulation import ADMISSION_POOLS
+
+
+def _admission_days(admissions, days):
+    """One admissions dict per day; a list shorter than the horizon repeats."""
+    if not admissions:
+        return [{}] * days
+    if isinstance(admissions, dict):
+        return [admissions] * days
+    return [admissions[day % len(admissions)] for day in range(days)]
+
+
+def simulate_horizon(
+    roster_data,
+    base_parameters,
+    days: int = 7,
+    admissions=None,
+    discharge_rates: dict = None,
+    start_date: datetime.date = None,
+    new_shift_weekday: int = 2,
+    seed: int = 0,
+    progress=None
+):
+    """
+    Simulate the census over `days` consecutive allocations.
+
+    roster_data is a list of physician dicts and base_parameters are
+    allocate_patients keyword arguments (is_new_shift_day is ignored: it
+    is set for days falling on new_shift_weekday, Monday = 0). admissions
+    maps team names and 'step_down' to the patients admitted each day, or
+    is a list of such dicts, one per day; pools without an entry keep their
+    base value. discharge_rates gives the chance each 'regular' and
+    'step_down' patient is discharged overnight, with team names
+    overriding the regular rate for that team. Discharges are drawn from
+    `seed`, so results are reproducible. progress, if given, is called
+    with (days done, days) after each day; an exception it raises stops the
+    simulation.
+
+    Returns per-day curves (census, step_down, admitted, discharged,
+    unallocated, minimum_shortfall, over_maximum and each team's census)
+    plus every physician's census and step-down by day.
+    """
+    require_numpy()
+    if days < 1:
+        raise ValueError("At least one day is required")
+
+    parameters = {key: value for key, value in base_parameters.items()
+                  if key not in ("is_new_shift_day", "n_total_new_patients")}
+    base_team_pools = dict(parameters.pop("team_pools", None) or {})
+    maximum_patients = parameters.get("maximum_patients", 1000)
+
+    physicians = [Physician.from_dict(p) for p in roster_data]
+    columns = roster_to_columns(physicians)
+    totals = columns.pop("totals")
+    step_down = columns.pop("step_down")
+    team = columns["team"]
+    working = columns["is_working"]
+    teams = columns["teams"]
+
+    rates = dict(discharge_rates or {})
+    for key, rate in rates.items():
+        if not 0 <= rate <= 1:
+            raise ValueError(f"Discharge rate for {key} must be between 0 and 1")
+    regular_rate = rates.get("regular", 0.0)
+    step_down_rate = rates.get("step_down", 0.0)
+    # Regular discharge rate of each row, by team code
+    team_rates = np.array([rates.get(name, regular_rate) for name in teams], dtype=np.float64)
+    row_rates = team_rates[team]
+
+    rng = np.random.default_rng(seed)
+    start_date = start_date or datetime.date.today()
+    size = totals.size
+
+    census_by_day = np.empty((days, size), dtype=np.int64)
+    step_down_by_day = np.empty((days, size), dtype=np.int64)
+    curves = {key: [] for key in ("admitted", "discharged", "unallocated", "minimum_shortfall", "over_maximum")}
+    dates = []
+    new_shift_days = []
+
+    for day, admitted in enumerate(_admission_days(admissions, days)):
+        date = start_date + datetime.timedelta(days=day)
+        is_new_shift_day = date.weekday() == new_shift_weekday
+
+        # Overnight discharges
+        regular_out = rng.binomial(totals, row_rates)
+        step_down_out = rng.binomial(step_down, step_down_rate)
+        totals = totals - regular_out
+        step_down = step_down - step_down_out
+
+        # The day's admissions, as in simulation.py
+        day_parameters = dict(parameters)
+        day_team_pools = dict(base_team_pools)
+        for key, count in admitted.items():
+            pool = ADMISSION_POOLS.get(key)
+            if pool is None:
+                day_team_pools[key] = int(count)
+            else:
+                day_parameters[pool] = int(count)
+
+        outcome = allocate_arrays(
+            totals=totals,
+            step_down=step_down,
+            **columns,
+            **day_parameters,
+            is_new_shift_day=is_new_shift_day,
+            team_pools=day_team_pools,
+        )
+        totals = outcome["totals"]
+        step_down = outcome["step_down"]
+
+        census_by_day[day] = totals
+        step_down_by_day[day] = step_down
+        dates.append(date.isoformat())
+        new_shift_days.append(is_new_shift_day)
+        pools = resolve_team_pools(
+            day_parameters.get("n_A_new_patients", 0),
+            day_parameters.get("n_B_new_patients", 0),
+            day_parameters.get("n_N_new_patients", 0),
+            day_team_pools,
+        )
+        curves["admitted"].append(sum(pools.values()) + day_parameters.get("n_step_down_patients", 0))
+        curves["discharged"].append(int(regular_out.sum() + step_down_out.sum()))
+        curves["unallocated"].append(outcome["unallocated_patients"])
+        curves["minimum_shortfall"].append(outcome["minimum_shortfall"])
+        curves["over_maximum"].append(int((working & (totals > maximum_patients)).sum()))
+        if progress is not None:
+            progress(day + 1, days)
+
+    # Regular census of each team by day
+    team_census = np.zeros((days, len(teams)), dtype=np.int64)
+    for code in range(len(teams)):
+        team_census[:, code] = census_by_day[:, team == code].sum(axis=1)
+
+    return {
+        "days": days,
+        "seed": seed,
+        "dates": dates,
+        "new_shift_days": new_shift_days,
+        "census": census_by_day.sum(axis=1).tolist(),
+        "step_down": step_down_by_day.sum(axis=1).tolist(),
+        **curves,
+        "teams": {name: team_census[:, code].tolist() for code, name in enumerate(teams)},
+        "physicians": [
+            {"name": p.name, "team": p.team, "census": census, "step_down": sd}
+            for p, census, sd in zip(physicians, census_by_day.T.tolist(), step_down_by_day.T.tolist())
+        ],
+    }
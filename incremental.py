@@ -0,0 +1,166 @@
+"""
+Incremental re-allocation for the Patient Allocator application.
+
+Keeps the parsed roster, parameters and last result between edits so a
+single-row change recomputes only what that row can affect:
+
+- display-only fields (yesterday, buffer, out of floor, traded) patch the row;
+  traded patients cancel out of the step-down formula
+- rows of non-working physicians never receive patients, so only that row changes
+- on a new shift day each team is redistributed on its own, so a census edit
+  reruns only the affected team
+- anything else reruns the whole allocation from the cached roster
+
+On a regular day this is a roster cache, not incremental allocation: every
+census edit, e.g. Wang's total going from 12 to 14, reruns the whole
+allocation. Nothing there is team-local. The round-robin pass count
+depends on every physician's room under maximum_patients, and the leftover
+goes to the lowest totals across teams. The step-down split depends on
+each group's gain, and the minimum check draws donors from every team,
+ordered by when round-robin last reached them. A team rerun checked
+against cached quotas would have to redo each of those steps for the whole
+roster, which is the full run. What the state saves is resending and
+re-parsing the roster.
+
+Every path gives the same result as a full run on the edited roster, all
+result fields included, and reports why it recomputed what it did.
+"""
+
+import threading
+
+from models import Physician
+from roster import Roster
+from allocation import (
+    TEAM_POOL_ARGUMENTS, allocate_patients, build_results, summarize_results,
+    group_by_team, resolve_team_pools, split_step_down_by_headcount
+)
+
+# Fields that only show up in the physician's own result row and the traded totals
+ROW_ONLY_FIELDS = {"yesterday", "is_buffer", "transferred_patients", "traded_patients"}
+
+# Fields a new-shift-day team redistribution depends on
+TEAM_FIELDS = {"total_patients", "step_down_patients", "is_new"}
+
+
+class IncrementalAllocation:
+    """Allocation state for one roster and parameter set, updated one row at a time."""
+
+    def __init__(self, physician_data: list[dict], parameters: dict):
+        # Physicians hold the pre-allocation counts; the engine runs on clones
+        self.roster = Roster.from_dicts(physician_data)
+        self.parameters = parameters
+        self._lock = threading.Lock()
+        self.result = self._full_run()
+
+    def _full_run(self):
+        return allocate_patients(physicians=[p.clone() for p in self.roster], **self.parameters)
+
+    def apply(self, name: str, changes: dict):
+        """
+        Apply a change to one physician's row and update the result.
+
+        Returns (result, scope, reason), where scope is 'none', 'row', 'team'
+        or 'full' depending on how much was recomputed and reason says why.
+        A name shared by several physicians refers to the first. Raises
+        KeyError if no physician has that name.
+        """
+        with self._lock:
+            return self._apply(name, changes)
+
+    def _apply(self, name, changes):
+        i = self.roster.id_of(name)
+        before = self.roster[i]
+        current = before.to_dict()
+        changed = {key for key, value in changes.items() if key in current and current[key] != value}
+        if not changed:
+            return self.result, "none", "Nothing changed"
+
+        current.update({key: changes[key] for key in changed})
+        after = Physician.from_dict(current)
+        self.roster[i] = after
+
+        if "name" in changed:
+            scope, reason = "full", "A rename changes the name index"
+        elif changed <= ROW_ONLY_FIELDS:
+            scope, reason = "row", "Only display fields changed"
+        elif not before.is_working and not after.is_working:
+            scope, reason = "row", "Physicians who are not working receive no patients"
+        elif not self.parameters.get("is_new_shift_day"):
+            scope, reason = "full", "Regular day: the round-robin, step-down split and minimum check span every team, so the whole allocation reruns"
+        elif changed <= TEAM_FIELDS:
+            scope, reason = "team", f"New shift day: only Team {after.team} is redistributed"
+        else:
+            scope, reason = "full", "Team or working status changed the team head counts"
+
+        if scope == "full":
+            self.result = self._full_run()
+        elif scope == "row":
+            self._update_row(i)
+        else:
+            self._rerun_team(after.team)
+        return self.result, scope, reason
+
+    def _update_row(self, i):
+        """Rebuild one result row, keeping the allocated counts the engine gave it."""
+        physician = self.roster[i].clone()
+        # Numbered on its own, so the baselines are one-element lists
+        physician.id = 0
+        row = self.result["results"][i]
+        if physician.is_working:
+            # Only display fields changed; allocated counts stay as allocated
+            physician.set_total_patients(row["total_patients"])
+            physician.set_step_down_patients(row["step_down_patients"])
+        initial_counts = [self.roster[i].total_patients]
+        initial_stepdown_counts = [self.roster[i].step_down_patients]
+        rows, _ = build_results([physician], initial_counts, initial_stepdown_counts)
+        # Nothing was allocated differently, so nothing more or less is left over
+        self._replace_rows([i], rows, self.result["unallocated_patients"], self.result["unallocated_step_down"])
+
+    def _rerun_team(self, team):
+        """Redistribute a single team on a new shift day."""
+        members = [i for i, p in enumerate(self.roster) if p.team == team]
+        counts = {
+            key: sum(1 for p in docs if p.is_working)
+            for key, docs in group_by_team(self.roster).items()
+        }
+        step_down = split_step_down_by_headcount(self.parameters.get("n_step_down_patients", 0), counts)
+        pools = resolve_team_pools(
+            *(self.parameters.get(pool, 0) for pool in TEAM_POOL_ARGUMENTS.values()),
+            self.parameters.get("team_pools")
+        )
+
+        # On a roster holding only this team, the engine gives it exactly
+        # its own pool and step-down share
+        parameters = dict(self.parameters)
+        for pool in TEAM_POOL_ARGUMENTS.values():
+            parameters[pool] = 0
+        parameters["team_pools"] = {team: pools.get(team, 0)}
+        parameters["n_step_down_patients"] = step_down[team]
+
+        team_result = allocate_patients(
+            physicians=[self.roster[i].clone() for i in members],
+            **parameters
+        )
+        # Teams are redistributed independently, so only this team can leave patients over
+        self._replace_rows(
+            members, team_result["results"],
+            team_result["unallocated_patients"], team_result["unallocated_step_down"]
+        )
+
+    def _replace_rows(self, indices, rows, unallocated_patients, unallocated_step_down):
+        """Swap in recomputed rows and refresh every field derived from them."""
+        results = list(self.result["results"])
+        for i, row in zip(indices, rows):
+            results[i] = row
+        minimum_patients = self.parameters.get("minimum_patients", 10)
+        self.result = {
+            **self.result,
+            "results": results,
+            "summary": summarize_results(results),
+            "capacity_exhausted": unallocated_patients > 0,
+            "unallocated_patients": unallocated_patients,
+            "unallocated_step_down": unallocated_step_down,
+            "minimum_shortfall": sum(
+                max(0, minimum_patients - row["total_patients"]) for row in results if row["is_working"]
+            ),
+        }
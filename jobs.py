@@ -0,0 +1,271 @@
+"""
+Background jobs for the Patient Allocator application.
+
+Sweeps, simulations and optimal-mode allocations can take seconds, longer
+than a web worker should be held. A job is submitted, runs on a small thread
+pool and is polled by ID for progress and its result, so the request that
+starts it returns at once. Jobs report progress through a callback, which is
+also where a cancelled or timed-out job stops: the computation checks in
+after every chunk, so cancellation takes effect at the next chunk boundary.
+Timeout and cancel are best-effort between those steps; a step already
+running finishes first. Work without steps of its own (an allocation) asks
+the callback how much time is left and bounds itself by it instead.
+
+Jobs live in memory in the process that accepted them. Finished jobs are kept
+for a while and the oldest are evicted first; queued and running jobs are
+never evicted.
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+TIMED_OUT = "timed_out"
+
+# States a job does not leave
+FINISHED = frozenset((SUCCEEDED, FAILED, CANCELLED, TIMED_OUT))
+
+
+class JobStopped(Exception):
+    """Raised through a job's progress callback once it is cancelled or out of time."""
+
+
+class JobStoreFull(Exception):
+    """Every stored job is still queued or running, so nothing can be evicted."""
+
+
+class JobProgress:
+    """
+    The progress callback a job is given: progress(done, total=None) records
+    progress and raises JobStopped once the job is cancelled or out of time.
+    """
+
+    __slots__ = ("_queue", "_job")
+
+    def __init__(self, queue, job):
+        self._queue = queue
+        self._job = job
+
+    def __call__(self, done, total=None):
+        queue, job = self._queue, self._job
+        with queue._lock:
+            queue._check_deadline(job)
+            if job.finished:
+                raise JobStopped(job.status)
+            job.done = done
+            if total is not None:
+                job.total = total
+
+    def remaining(self):
+        """Seconds left before the job times out, or None without a timeout."""
+        job = self._job
+        if not job.timeout or job.started_at is None:
+            return None
+        return max(0.0, job.timeout - (self._queue._clock() - job.started_at))
+
+
+class Job:
+    """One submitted computation, its progress and its outcome."""
+
+    __slots__ = (
+        "id", "kind", "status", "done", "total", "result", "error",
+        "submitted_at", "started_at", "finished_at", "timeout", "_future"
+    )
+
+    def __init__(self, kind: str, timeout: float, clock):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = QUEUED
+        # Progress in the job's own units (combinations, trials, days)
+        self.done = 0
+        self.total = None
+        self.result = None
+        self.error = None
+        self.submitted_at = clock()
+        self.started_at = None
+        self.finished_at = None
+        self.timeout = timeout
+        self._future = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+    def to_dict(self, now: float):
+        """Status, progress and, once it has succeeded, the result."""
+        end = self.finished_at if self.finished_at is not None else now
+        data = {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": {
+                "done": self.done,
+                "total": self.total,
+                "fraction": self.done / self.total if self.total else (1.0 if self.status == SUCCEEDED else 0.0),
+            },
+            "queued_seconds": round((self.started_at or end) - self.submitted_at, 3),
+            "run_seconds": round(end - self.started_at, 3) if self.started_at is not None else None,
+        }
+        if self.status == SUCCEEDED:
+            data["result"] = self.result
+        if self.error is not None:
+            data["error"] = self.error
+        return data
+
+
+class JobQueue:
+    """
+    Bounded pool of job threads plus a bounded, thread-safe job store.
+
+    max_workers jobs run at once and the rest wait in submission order.
+    A running job is stopped at its next progress report once it has run
+    for `timeout` seconds, and is reported as timed out from then on even
+    if the current chunk is still finishing; the thread is only free once
+    that chunk returns. Finished jobs expire after
+    `ttl` seconds; when the store holds max_jobs, the oldest finished job
+    is evicted to make room.
+    """
+
+    def __init__(self, max_workers: int = 2, max_jobs: int = 100, timeout: float = 300,
+                 ttl: float = 3600, clock=time.monotonic):
+        self.max_workers = max(1, max_workers)
+        self.max_jobs = max(1, max_jobs)
+        self.timeout = timeout
+        self.ttl = ttl
+        self._clock = clock
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="job")
+        self.submitted = 0
+        self.evictions = 0
+
+    def submit(self, kind: str, func, *args, **kwargs) -> Job:
+        """
+        Queue func(*args, **kwargs, progress=callback) and return its Job.
+        Raises JobStoreFull when no finished job can be evicted to make room.
+        """
+        job = Job(kind, self.timeout, self._clock)
+        with self._lock:
+            self._expire()
+            if len(self._jobs) >= self.max_jobs:
+                oldest = next((key for key, stored in self._jobs.items() if stored.finished), None)
+                if oldest is None:
+                    raise JobStoreFull(f"{len(self._jobs)} jobs are still queued or running")
+                del self._jobs[oldest]
+                self.evictions += 1
+            self._jobs[job.id] = job
+            self.submitted += 1
+            job._future = self._executor.submit(self._run, job, func, args, kwargs)
+        return job
+
+    def get(self, job_id: str):
+        """The job with this ID, or None when unknown, evicted or expired."""
+        with self._lock:
+            self._expire()
+            job = self._jobs.get(job_id)
+            if job is not None:
+                self._check_deadline(job)
+            return job
+
+    def cancel(self, job_id: str):
+        """
+        Cancel a queued or running job, or forget a finished one.
+        Returns the job, or None when unknown.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job.finished:
+                del self._jobs[job_id]
+            else:
+                # A queued job never starts; a running one stops at its next report
+                job._future.cancel()
+                self._finish(job, CANCELLED, error="Cancelled")
+            return job
+
+    def describe(self, job: Job):
+        with self._lock:
+            return job.to_dict(self._clock())
+
+    def stats(self):
+        """Counters for monitoring."""
+        with self._lock:
+            self._expire()
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return {
+                "size": len(self._jobs),
+                "max_jobs": self.max_jobs,
+                "max_workers": self.max_workers,
+                "timeout_seconds": self.timeout,
+                "ttl_seconds": self.ttl,
+                "submitted": self.submitted,
+                "evictions": self.evictions,
+                "status": counts,
+            }
+
+    def shutdown(self):
+        """Cancel queued jobs and stop running ones at their next report."""
+        with self._lock:
+            for job in self._jobs.values():
+                if not job.finished:
+                    job._future.cancel()
+                    self._finish(job, CANCELLED, error="Shut down")
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, job: Job, func, args, kwargs):
+        with self._lock:
+            if job.finished:
+                return
+            job.status = RUNNING
+            job.started_at = self._clock()
+
+        try:
+            result = func(*args, **kwargs, progress=JobProgress(self, job))
+        except JobStopped:
+            return
+        except Exception as e:
+            with self._lock:
+                self._check_deadline(job)
+                if not job.finished:
+                    self._finish(job, FAILED, error=str(e))
+            return
+
+        with self._lock:
+            self._check_deadline(job)
+            if not job.finished:
+                job.result = result
+                if job.total is not None:
+                    job.done = job.total
+                self._finish(job, SUCCEEDED)
+
+    def _check_deadline(self, job: Job):
+        """Mark a running job that is past its timeout as timed out. Caller holds the lock."""
+        if (job.status == RUNNING and job.timeout
+                and self._clock() - job.started_at > job.timeout):
+            self._finish(job, TIMED_OUT, error=f"Timed out after {job.timeout:g} seconds")
+
+    def _finish(self, job: Job, status: str, error: str = None):
+        """Caller holds the lock."""
+        job.status = status
+        job.error = error
+        job.finished_at = self._clock()
+        # Finished jobs are kept in the order they finished, oldest first
+        self._jobs.move_to_end(job.id)
+
+    def _expire(self):
+        """Drop finished jobs older than ttl. Caller holds the lock."""
+        now = self._clock()
+        expired = [key for key, job in self._jobs.items()
+                   if job.finished and now - job.finished_at > self.ttl]
+        for key in expired:
+            del self._jobs[key]
@@ -2,7 +2,19 @@
 Physician data model for the Patient Allocator application.
 """
 
+
+class PatientCountError(ValueError):
+    """A patient count change that would leave a physician with a negative count."""
+
+
 class Physician:
+    # Slotted: rosters are materialised per request in batch and simulation
+    # runs, and slots keep each physician small and quick to build
+    __slots__ = (
+        "name", "id", "is_new", "team", "is_buffer", "is_working", "yesterday",
+        "total_patients", "step_down_patients", "transferred_patients", "traded_patients"
+    )
+
     def __init__(self,
             name: str = "",
             is_new: bool = False,
@@ -16,6 +28,8 @@ class Physician:
             yesterday: str = ""):
 
         self.name = name
+        # Position in the roster the physician was last numbered in (see roster.py)
+        self.id: int = -1
         self.is_new: bool = is_new
         self.team: str = team
         self.is_buffer: bool = is_buffer
@@ -40,14 +54,32 @@ class Physician:
 
     def remove_patient(self, is_step_down: bool = False):
         """Remove a patient. Step-down patients do NOT count towards total_patients."""
-        if is_step_down:
-            if self.step_down_patients < 1:
-                raise Exception("You don't have any step-down patients")
-            self.step_down_patients -= 1
+        self.remove_patients(1, step_down=is_step_down)
+
+    def add_patients(self, n: int, step_down: bool = False):
+        """Add n patients at once. Raises ValueError if n is negative."""
+        if n < 0:
+            raise ValueError(f"Cannot add a negative number of patients ({n})")
+        if step_down:
+            self.step_down_patients += n
+        else:
+            self.total_patients += n
+
+    def remove_patients(self, n: int, step_down: bool = False):
+        """
+        Remove n patients at once. Raises ValueError if n is negative and
+        PatientCountError if the physician has fewer than n.
+        """
+        if n < 0:
+            raise ValueError(f"Cannot remove a negative number of patients ({n})")
+        current = self.step_down_patients if step_down else self.total_patients
+        if n > current:
+            kind = "step-down patients" if step_down else "patients"
+            raise PatientCountError(f"{self.name} has {current} {kind}, cannot remove {n}")
+        if step_down:
+            self.step_down_patients = current - n
         else:
-            if self.total_patients < 1:
-                raise Exception("You don't have any patients")
-            self.total_patients -= 1
+            self.total_patients = current - n
 
     def set_total_patients(self, n: int):
         self.total_patients = n
@@ -61,6 +93,22 @@ class Physician:
     def set_traded_patients(self, n: int):
         self.traded_patients = n
 
+    def clone(self):
+        """Return an independent copy. All fields are scalars, so a shallow copy suffices."""
+        clone = Physician.__new__(Physician)
+        clone.name = self.name
+        clone.id = self.id
+        clone.is_new = self.is_new
+        clone.team = self.team
+        clone.is_buffer = self.is_buffer
+        clone.is_working = self.is_working
+        clone.yesterday = self.yesterday
+        clone.total_patients = self.total_patients
+        clone.step_down_patients = self.step_down_patients
+        clone.transferred_patients = self.transferred_patients
+        clone.traded_patients = self.traded_patients
+        return clone
+
     def to_dict(self):
         """Convert to dictionary for JSON serialization."""
         return {
@@ -79,15 +127,18 @@ class Physician:
     @classmethod
     def from_dict(cls, data: dict):
         """Create a Physician from a dictionary."""
-        return cls(
-            name=data.get("name", ""),
-            yesterday=data.get("yesterday", ""),
-            team=data.get("team", "A"),
-            is_new=data.get("is_new", False),
-            is_buffer=data.get("is_buffer", False),
-            is_working=data.get("is_working", True),
-            n_total_patients=data.get("total_patients", 0),
-            n_step_down_patients=data.get("step_down_patients", 0),
-            n_transferred_patients=data.get("transferred_patients", 0),
-            n_traded_patients=data.get("traded_patients", 0)
-        )
+        # Filled in directly rather than through __init__'s keyword arguments
+        physician = cls.__new__(cls)
+        get = data.get
+        physician.name = get("name", "")
+        physician.id = -1
+        physician.is_new = get("is_new", False)
+        physician.team = get("team", "A")
+        physician.is_buffer = get("is_buffer", False)
+        physician.is_working = get("is_working", True)
+        physician.yesterday = get("yesterday", "")
+        physician.total_patients = get("total_patients", 0)
+        physician.step_down_patients = get("step_down_patients", 0)
+        physician.transferred_patients = get("transferred_patients", 0)
+        physician.traded_patients = get("traded_patients", 0)
+        return physician
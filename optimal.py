@@ -0,0 +1,280 @@
+"""
+Optimal allocation mode for the Patient Allocator application.
+
+Aims at the lowest sum of squared final totals over working physicians.
+The regular pool first raises everyone towards their floor (new_start_number
+for new physicians, minimum_patients for everyone else), lowest census
+first, then levels the rest by lowest census, within maximum_patients and
+the new-start rules; water_fill does both in blocks. Existing patients may
+also move from physicians above minimum to those below it, and the number
+moved is chosen by bisection on the resulting cost.
+
+This is a heuristic, not an exact solve: the step-down split follows the
+greedy Gained + Traded formula after the regular pool is placed, so the two
+are not optimized together, and the cost is not guaranteed to be unimodal
+in the number moved. The greedy engine's answer is therefore computed as
+well and kept whenever it is at least as good. The solve is checked against
+a wall-clock budget; if the budget is exceeded the greedy answer is
+returned directly.
+"""
+
+import time
+
+from models import Physician
+from roster import assign_ids, baseline_counts
+from explain import tracing
+from allocation import (
+    allocate_patients, build_results, water_fill, transfer_to_minimum,
+    DEFAULT_TEAMS, resolve_team_pools, step_down_groups, split_step_down_by_gain
+)
+
+
+class BudgetExceeded(Exception):
+    """The optimal solve ran past its wall-clock budget."""
+
+
+def _fill_to_floor_then_level(levels, units, floors, caps):
+    """
+    Assign units by lowest census: first raise everyone towards their floor,
+    then spread the rest. Returns (increments, unassigned).
+    """
+    floor_caps = [max(0, min(floor, level + cap) - level) for level, floor, cap in zip(levels, floors, caps)]
+    first, units = water_fill(levels, units, floor_caps)
+    raised = [level + n for level, n in zip(levels, first)]
+    rest_caps = [cap - n for cap, n in zip(caps, first)]
+    second, units = water_fill(raised, units, rest_caps)
+    return [a + b for a, b in zip(first, second)], units
+
+
+def allocate_patients_optimal(
+    physicians: list[Physician],
+    n_total_new_patients: int,
+    n_A_new_patients: int,
+    n_B_new_patients: int,
+    n_N_new_patients: int,
+    new_start_number: int,
+    minimum_patients: int = 10,
+    n_step_down_patients: int = 0,
+    maximum_patients: int = 1000,
+    maximum_step_down: int = 1,
+    is_new_shift_day: bool = False,
+    team_pools: dict = None,
+    time_budget: float = 0.5
+):
+    """
+    Allocate patients aiming at the lowest sum of squared totals.
+
+    Takes the same arguments as allocate_patients plus time_budget in
+    seconds. The pool sizes and step-down split follow the greedy engine,
+    so both modes place the same number of patients. New shift days are
+    already an even per-team redistribution and use the greedy engine.
+    The greedy answer is kept when it leaves fewer patients unplaced, a
+    smaller minimum shortfall or a lower objective, in that order.
+
+    Returns the allocate_patients result structure plus 'strategy'
+    ('optimal', or 'greedy' when the greedy answer was kept or after a
+    fallback) and 'objective', the sum of squared final totals over
+    working physicians.
+    """
+    arguments = dict(
+        n_total_new_patients=n_total_new_patients,
+        n_A_new_patients=n_A_new_patients,
+        n_B_new_patients=n_B_new_patients,
+        n_N_new_patients=n_N_new_patients,
+        new_start_number=new_start_number,
+        minimum_patients=minimum_patients,
+        n_step_down_patients=n_step_down_patients,
+        maximum_patients=maximum_patients,
+        maximum_step_down=maximum_step_down,
+        is_new_shift_day=is_new_shift_day,
+        team_pools=team_pools,
+    )
+
+    if not is_new_shift_day:
+        try:
+            solution = _solve(physicians, arguments, time.perf_counter() + time_budget)
+        except BudgetExceeded:
+            solution = None
+
+        if solution is not None and not _greedy_is_better(physicians, arguments, solution):
+            assign_ids(physicians)
+            initial_counts, initial_stepdown_counts = baseline_counts(physicians)
+            totals, step_downs, unallocated_patients, unallocated_step_down, minimum_shortfall = solution
+            for physician, total, step_down in zip(physicians, totals, step_downs):
+                physician.set_total_patients(total)
+                physician.set_step_down_patients(step_down)
+
+            results, summary = build_results(physicians, initial_counts, initial_stepdown_counts)
+            return {
+                "results": results,
+                "summary": summary,
+                "remaining_pools": {
+                    "n_total_new_patients": n_total_new_patients,
+                    "n_A_new_patients": n_A_new_patients,
+                    "n_B_new_patients": n_B_new_patients,
+                    "n_N_new_patients": n_N_new_patients,
+                    "n_step_down_patients": n_step_down_patients,
+                    "team_pools": resolve_team_pools(n_A_new_patients, n_B_new_patients, n_N_new_patients, team_pools)
+                },
+                "capacity_exhausted": unallocated_patients > 0,
+                "unallocated_patients": unallocated_patients,
+                "unallocated_step_down": unallocated_step_down,
+                "minimum_shortfall": minimum_shortfall,
+                "strategy": "optimal",
+                "objective": sum(p.total_patients ** 2 for p in physicians if p.is_working),
+            }
+
+    result = allocate_patients(physicians=physicians, **arguments)
+    result["strategy"] = "greedy"
+    result["objective"] = sum(p.total_patients ** 2 for p in physicians if p.is_working)
+    return result
+
+
+def _greedy_is_better(physicians, arguments, solution):
+    """
+    True when the greedy engine, run on copies of the physicians, leaves
+    fewer patients unplaced, a smaller minimum shortfall or, with both
+    equal, a lower objective than the solution.
+    """
+    copies = [p.clone() for p in physicians]
+    # Untraced: only the answer that is returned should be explained
+    with tracing(False):
+        greedy = allocate_patients(physicians=copies, **arguments)
+    totals, _, unallocated_patients, _, minimum_shortfall = solution
+    optimal_key = (
+        unallocated_patients, minimum_shortfall,
+        sum(total ** 2 for p, total in zip(physicians, totals) if p.is_working)
+    )
+    greedy_key = (
+        greedy["unallocated_patients"], greedy["minimum_shortfall"],
+        sum(p.total_patients ** 2 for p in copies if p.is_working)
+    )
+    return greedy_key < optimal_key
+
+
+def _solve(physicians, arguments, deadline):
+    """
+    Solve the regular day on plain lists. Physicians are not modified.
+    Returns (totals, step_downs, unallocated_patients, unallocated_step_down,
+    minimum_shortfall).
+    """
+    def check_budget():
+        if time.perf_counter() > deadline:
+            raise BudgetExceeded()
+
+    new_start_number = arguments["new_start_number"]
+    minimum_patients = arguments["minimum_patients"]
+    maximum_patients = arguments["maximum_patients"]
+    maximum_step_down = arguments["maximum_step_down"]
+    n_step_down_patients = arguments["n_step_down_patients"]
+
+    initial_totals = [p.total_patients for p in physicians]
+    step_downs = [p.step_down_patients for p in physicians]
+    working = [i for i, p in enumerate(physicians) if p.is_working]
+
+    # Regular arcs: new physicians only up to new_start_number, everyone under the maximum
+    floors = [0] * len(physicians)
+    ceilings = [0] * len(physicians)
+    for i in working:
+        if physicians[i].is_new:
+            floors[i] = ceilings[i] = min(new_start_number, maximum_patients)
+        else:
+            floors[i] = minimum_patients
+            ceilings[i] = maximum_patients
+
+    pools = resolve_team_pools(
+        arguments["n_A_new_patients"], arguments["n_B_new_patients"], arguments["n_N_new_patients"],
+        arguments["team_pools"]
+    )
+    regular_pool = sum(pools.values()) + n_step_down_patients
+
+    # Transfer arcs: like the greedy minimum check, physicians above minimum
+    # may hand existing patients to those below it
+    donors = [i for i in working if initial_totals[i] > minimum_patients]
+    recipients = [i for i in working if initial_totals[i] < minimum_patients]
+    supply = [initial_totals[i] - minimum_patients for i in donors]
+    needs = [max(0, min(minimum_patients, maximum_patients) - initial_totals[i]) for i in recipients]
+
+    def place_regular(transferred):
+        """Best placement of the regular pool after moving `transferred` existing patients."""
+        totals = list(initial_totals)
+        if transferred:
+            removals, _ = water_fill([-totals[i] for i in donors], transferred, supply)
+            additions, _ = water_fill([totals[i] for i in recipients], transferred, needs)
+            for i, n in zip(donors, removals):
+                totals[i] -= n
+            for i, n in zip(recipients, additions):
+                totals[i] += n
+        caps = [max(0, ceiling - total) if p.is_working else 0
+                for p, ceiling, total in zip(physicians, ceilings, totals)]
+        given, unallocated = _fill_to_floor_then_level(totals, regular_pool, floors, caps)
+        totals = [total + n for total, n in zip(totals, given)]
+        caps = [cap - n for cap, n in zip(caps, given)]
+        check_budget()
+        return totals, caps, unallocated, sum(totals[i] ** 2 for i in working)
+
+    # Bisect on the number transferred; the cost is usually, not always,
+    # unimodal in it, and the greedy comparison covers the rest
+    low, high = 0, min(sum(supply), sum(needs))
+    while low < high:
+        middle = (low + high) // 2
+        if place_regular(middle + 1)[3] < place_regular(middle)[3]:
+            low = middle + 1
+        else:
+            high = middle
+    totals, caps, unallocated_patients, _ = place_regular(low)
+
+    # Step-down pools: group shares follow the greedy Gained + Traded formula
+    team_rows = {team: [] for team in DEFAULT_TEAMS}
+    for i in working:
+        team_rows.setdefault(physicians[i].team, []).append(i)
+    groups = step_down_groups(team_rows)
+    group_members = [[i for team in group for i in team_rows.get(team, ())] for group in groups]
+    shares = split_step_down_by_gain(
+        n_step_down_patients,
+        [sum(totals[i] - initial_totals[i] for i in members) for members in group_members],
+        [sum(pools.get(team, 0) for team in group) for group in groups]
+    )
+
+    unallocated_step_down = 0
+    for members, count in zip(group_members, shares):
+        if count <= 0:
+            continue
+        if not members:
+            unallocated_step_down += count
+            continue
+        # Step-down arcs: lowest combined load first, up to maximum_step_down
+        loads = [totals[i] + step_downs[i] for i in members]
+        sd_caps = [max(0, maximum_step_down - step_downs[i]) for i in members]
+        extra_sd, overflow = water_fill(loads, count, sd_caps)
+        for i, n in zip(members, extra_sd):
+            step_downs[i] += n
+
+        # Overflow becomes regular patients where the regular arcs have room
+        if overflow:
+            extra, left = water_fill([totals[i] for i in members], overflow, [caps[i] for i in members])
+            unallocated_step_down += left
+            for i, n in zip(members, extra):
+                totals[i] += n
+                caps[i] -= n
+        check_budget()
+
+    # Anyone still below minimum draws on physicians above it
+    below = [i for i in working if totals[i] < minimum_patients]
+    if below:
+        donors = [i for i in working if totals[i] > minimum_patients]
+        removals, additions, _ = transfer_to_minimum(
+            [totals[i] for i in donors],
+            [0] * len(donors),
+            [totals[i] for i in below],
+            minimum_patients,
+            maximum_patients
+        )
+        for i, n in zip(donors, removals):
+            totals[i] -= n
+        for i, n in zip(below, additions):
+            totals[i] += n
+    check_budget()
+
+    minimum_shortfall = sum(max(0, minimum_patients - totals[i]) for i in working)
+    return totals, step_downs, unallocated_patients + unallocated_step_down, unallocated_step_down, minimum_shortfall
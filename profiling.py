@@ -0,0 +1,152 @@
+"""
+Phase timing for the Patient Allocator allocation engines.
+
+Engines call active_timer().lap(phase) at the end of each phase. Outside a
+profile() block the active timer is a no-op, so the checkpoints cost one
+method call each. Inside one, laps are measured with perf_counter_ns and the
+finished run is added to the process-wide histograms.
+"""
+
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+
+class PhaseTimer:
+    """Nanoseconds spent in each phase, measured between successive laps."""
+
+    __slots__ = ("phases", "started", "finished", "_last")
+
+    def __init__(self):
+        self.phases = {}
+        self.started = self._last = time.perf_counter_ns()
+        self.finished = None
+
+    def start(self):
+        """Start timing the next phase from now (e.g. at the top of an engine)."""
+        self._last = time.perf_counter_ns()
+
+    def lap(self, phase: str):
+        """Charge the time since the previous lap to `phase`."""
+        now = time.perf_counter_ns()
+        self.phases[phase] = self.phases.get(phase, 0) + now - self._last
+        self._last = now
+
+    def to_dict(self):
+        """Phase times and the total wall time of the profiled block in milliseconds."""
+        finished = self.finished or time.perf_counter_ns()
+        return {
+            "phases": {phase: ns / 1e6 for phase, ns in self.phases.items()},
+            "total_ms": (finished - self.started) / 1e6,
+        }
+
+
+class _NullTimer:
+    """Stand-in used when profiling is off."""
+
+    __slots__ = ()
+
+    def start(self):
+        pass
+
+    def lap(self, phase):
+        pass
+
+
+NULL_TIMER = _NullTimer()
+
+_active_timer = contextvars.ContextVar("allocation_timer", default=NULL_TIMER)
+
+
+def active_timer():
+    """The timer engines should report phases to."""
+    return _active_timer.get()
+
+
+class PhaseHistograms:
+    """
+    Process-wide phase timings in power-of-two nanosecond buckets.
+
+    Percentiles are reported as the upper bound of the bucket holding them,
+    so they are accurate to within a factor of two.
+    """
+
+    BUCKETS = 48  # up to 2**47 ns, about 39 hours
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._phases = {}
+
+    def record(self, timer: PhaseTimer):
+        """Add one profiled run, plus its total under 'total'."""
+        samples = dict(timer.phases)
+        samples["total"] = (timer.finished or time.perf_counter_ns()) - timer.started
+        with self._lock:
+            for phase, ns in samples.items():
+                entry = self._phases.get(phase)
+                if entry is None:
+                    # [count, total ns, max ns, buckets]
+                    entry = self._phases[phase] = [0, 0, 0, [0] * self.BUCKETS]
+                entry[0] += 1
+                entry[1] += ns
+                entry[2] = max(entry[2], ns)
+                entry[3][min(ns.bit_length(), self.BUCKETS - 1)] += 1
+
+    def clear(self):
+        with self._lock:
+            self._phases.clear()
+
+    @staticmethod
+    def _percentile(buckets, count, q):
+        rank = max(1, -(-count * q // 100))
+        seen = 0
+        for index, n in enumerate(buckets):
+            seen += n
+            if seen >= rank:
+                return (1 << index) / 1e6
+        return 0.0
+
+    def stats(self):
+        """Per-phase count, mean, max and approximate p50/p90/p99 in milliseconds."""
+        with self._lock:
+            snapshot = {phase: (count, total, peak, list(buckets))
+                        for phase, (count, total, peak, buckets) in self._phases.items()}
+        return {
+            phase: {
+                "count": count,
+                "mean_ms": total / count / 1e6,
+                "max_ms": peak / 1e6,
+                "p50_ms": self._percentile(buckets, count, 50),
+                "p90_ms": self._percentile(buckets, count, 90),
+                "p99_ms": self._percentile(buckets, count, 99),
+                "buckets": {f"<{(1 << index) / 1e6:g}ms": n for index, n in enumerate(buckets) if n},
+            }
+            for phase, (count, total, peak, buckets) in snapshot.items()
+        }
+
+
+# Every profiled allocation in this process
+phase_histograms = PhaseHistograms()
+
+
+@contextmanager
+def profile(enabled: bool = True):
+    """
+    Time the engine phases run inside the block.
+
+    Yields the PhaseTimer (NULL_TIMER when not enabled). On exit the run is
+    added to phase_histograms.
+    """
+    if not enabled:
+        yield NULL_TIMER
+        return
+
+    timer = PhaseTimer()
+    token = _active_timer.set(timer)
+    try:
+        yield timer
+    finally:
+        _active_timer.reset(token)
+        timer.finished = time.perf_counter_ns()
+        phase_histograms.record(timer)
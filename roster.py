@@ -0,0 +1,85 @@
+"""
+Integer-ID physician roster for the Patient Allocator application.
+
+Every physician in a roster gets a dense integer ID, their position, so
+per-run data (baseline counts, allocation order, flags) lives in flat lists
+indexed by ID instead of dicts keyed by name or by Physician. Roster adds
+an interned name→ID index for O(1) lookups by name. Physicians sharing a
+name keep separate IDs; the index resolves the name to the first of them.
+"""
+
+import sys
+
+from models import Physician
+
+
+def assign_ids(physicians: list[Physician]):
+    """Give each physician its position in the list as its ID."""
+    for i, physician in enumerate(physicians):
+        physician.id = i
+
+
+def baseline_counts(physicians: list[Physician]):
+    """(total_patients, step_down_patients) lists indexed by physician ID."""
+    return [p.total_patients for p in physicians], [p.step_down_patients for p in physicians]
+
+
+class Roster:
+    """Physicians numbered by position, with a name→ID index."""
+
+    __slots__ = ("physicians", "index")
+
+    def __init__(self, physicians=()):
+        self.physicians = list(physicians)
+        self._reindex()
+
+    @classmethod
+    def from_dicts(cls, physician_data: list[dict]):
+        return cls(Physician.from_dict(p) for p in physician_data)
+
+    def _reindex(self):
+        assign_ids(self.physicians)
+        self.index = {}
+        for physician in self.physicians:
+            if isinstance(physician.name, str):
+                physician.name = sys.intern(physician.name)
+            self.index.setdefault(physician.name, physician.id)
+
+    def __len__(self):
+        return len(self.physicians)
+
+    def __iter__(self):
+        return iter(self.physicians)
+
+    def __getitem__(self, physician_id: int) -> Physician:
+        return self.physicians[physician_id]
+
+    def __setitem__(self, physician_id: int, physician: Physician):
+        """Replace the physician holding an ID; the index follows renames."""
+        renamed = self.physicians[physician_id].name != physician.name
+        self.physicians[physician_id] = physician
+        physician.id = physician_id
+        if renamed:
+            self._reindex()
+
+    def id_of(self, name: str) -> int:
+        """ID of the first physician with this name. Raises KeyError."""
+        return self.index[name]
+
+    def get(self, name: str, default=None):
+        """First physician with this name, or default."""
+        physician_id = self.index.get(name)
+        return default if physician_id is None else self.physicians[physician_id]
+
+    def append(self, physician: Physician) -> int:
+        """Add a physician at the end and return its ID."""
+        physician.id = len(self.physicians)
+        self.physicians.append(physician)
+        if isinstance(physician.name, str):
+            physician.name = sys.intern(physician.name)
+        self.index.setdefault(physician.name, physician.id)
+        return physician.id
+
+    def baseline(self):
+        """(total_patients, step_down_patients) lists indexed by ID."""
+        return baseline_counts(self.physicians)
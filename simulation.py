@@ -0,0 +1,198 @@
+"""
+Monte Carlo admission-uncertainty simulator for the Patient Allocator application.
+Draws admission counts per team (any team name, or step_down), runs allocate_patients on each draw and
+reports per-physician census percentiles and the overflow risk: how often
+each physician is filled to maximum_patients, and how often the draw does
+not fit at all.
+
+The engine never places a patient above maximum_patients, so the risk shows
+up as physicians at the cap and as patients left unallocated, not as totals
+above the maximum.
+"""
+
+import bisect
+import math
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+from models import Physician
+from allocation import allocate_patients
+
+# Admission keys that feed an allocate_patients argument; any other key is a
+# team name and feeds that team's entry in team_pools
+ADMISSION_POOLS = {"step_down": "n_step_down_patients"}
+
+# Trials are split into fixed-size chunks, each with its own seed, so results
+# do not depend on how many worker processes run them
+TRIALS_PER_CHUNK = 500
+
+# Roster, base parameters and Poisson tables held by each worker process
+_worker_state = None
+
+
+def poisson_cdf(mean: float):
+    """Cumulative Poisson probabilities for 0, 1, 2, ... until the tail is negligible."""
+    if mean < 0:
+        raise ValueError("Admission means must be non-negative")
+    cdf = []
+    probability = math.exp(-mean)
+    cumulative = 0.0
+    k = 0
+    # The upper bound keeps the table finite for large means
+    upper = int(mean + 12 * math.sqrt(mean) + 20)
+    while k <= upper:
+        cumulative += probability
+        cdf.append(cumulative)
+        if cumulative >= 1.0 - 1e-12:
+            break
+        k += 1
+        probability *= mean / k
+    return cdf
+
+
+def _draw(rng, cdf):
+    """Inverse-transform draw from a cumulative table."""
+    return bisect.bisect_right(cdf, rng.random())
+
+
+def _prepare(roster_data, base_parameters, admissions):
+    roster = [Physician.from_dict(p) for p in roster_data]
+    # (pool argument or None, team, cdf) per admission key
+    tables = [(ADMISSION_POOLS.get(key), key, poisson_cdf(float(mean))) for key, mean in admissions.items()]
+    return roster, base_parameters, tables
+
+
+def _init_worker(roster_data, base_parameters, admissions):
+    global _worker_state
+    _worker_state = _prepare(roster_data, base_parameters, admissions)
+
+
+def _run_chunk(seed, trials, state=None):
+    """
+    Run a chunk of trials. Returns (histograms, at_maximum, unallocated):
+    histograms[i] maps final census to trial count for physician i,
+    at_maximum[i] counts trials that left physician i at maximum_patients or
+    above, and unallocated maps unallocated patients per trial to trial count.
+    """
+    roster, base_parameters, tables = state if state is not None else _worker_state
+    rng = random.Random(seed)
+    maximum_patients = base_parameters["maximum_patients"]
+
+    histograms = [{} for _ in roster]
+    at_maximum = [0] * len(roster)
+    unallocated = {}
+    for _ in range(trials):
+        parameters = dict(base_parameters)
+        parameters["team_pools"] = dict(base_parameters.get("team_pools") or {})
+        for pool, team, cdf in tables:
+            if pool is None:
+                parameters["team_pools"][team] = _draw(rng, cdf)
+            else:
+                parameters[pool] = _draw(rng, cdf)
+
+        physicians = [p.clone() for p in roster]
+        result = allocate_patients(physicians=physicians, **parameters)
+        left = result["unallocated_patients"]
+        unallocated[left] = unallocated.get(left, 0) + 1
+
+        for i, physician in enumerate(physicians):
+            total = physician.total_patients
+            histogram = histograms[i]
+            histogram[total] = histogram.get(total, 0) + 1
+            if total >= maximum_patients and physician.is_working:
+                at_maximum[i] += 1
+    return histograms, at_maximum, unallocated
+
+
+def _percentile(histogram, trials, q):
+    """Nearest-rank percentile from a census histogram."""
+    rank = max(1, math.ceil(q * trials))
+    seen = 0
+    for value in sorted(histogram):
+        seen += histogram[value]
+        if seen >= rank:
+            return value
+    return None
+
+
+def simulate_admissions(roster_data, base_parameters, admissions, trials=1000, seed=0, max_workers=None, progress=None):
+    """
+    Simulate uncertain admissions and summarise each physician's final census.
+
+    roster_data is a list of physician dicts and base_parameters are
+    allocate_patients keyword arguments. admissions maps team names and
+    'step_down' to Poisson means; pools without a mean keep their base
+    value. Results are reproducible for a given seed. progress, if given,
+    is called with (trials done, trials) as chunks finish; an exception it
+    raises stops the simulation.
+
+    Each physician gets census percentiles and p_at_maximum, the share of
+    trials that fill them to maximum_patients. 'overflow' gives the share of
+    trials in which capacity ran out (capacity_exhausted) and the mean, p90
+    and maximum of the patients left unallocated.
+    """
+    if trials < 1:
+        raise ValueError("At least one trial is required")
+
+    chunks = []
+    for index, start in enumerate(range(0, trials, TRIALS_PER_CHUNK)):
+        chunks.append((seed * 1000003 + index, min(TRIALS_PER_CHUNK, trials - start)))
+
+    workers = max_workers or os.cpu_count() or 1
+    outputs = []
+    done = 0
+    if workers == 1 or len(chunks) == 1:
+        state = _prepare(roster_data, base_parameters, admissions)
+        for chunk_seed, count in chunks:
+            outputs.append(_run_chunk(chunk_seed, count, state))
+            done += count
+            if progress is not None:
+                progress(done, trials)
+    else:
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(roster_data, base_parameters, admissions)
+        )
+        try:
+            for (_, count), output in zip(chunks, pool.map(_run_chunk, *zip(*chunks))):
+                outputs.append(output)
+                done += count
+                if progress is not None:
+                    progress(done, trials)
+        finally:
+            # Not a with block, whose exit would wait for the chunks nobody will read
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    # Merge chunk histograms
+    histograms = [{} for _ in roster_data]
+    at_maximum = [0] * len(roster_data)
+    unallocated = {}
+    for chunk_histograms, chunk_at_maximum, chunk_unallocated in outputs:
+        for i, histogram in enumerate(chunk_histograms):
+            merged = histograms[i]
+            for value, count in histogram.items():
+                merged[value] = merged.get(value, 0) + count
+            at_maximum[i] += chunk_at_maximum[i]
+        for value, count in chunk_unallocated.items():
+            unallocated[value] = unallocated.get(value, 0) + count
+
+    physicians = []
+    for data, histogram, capped in zip(roster_data, histograms, at_maximum):
+        physicians.append({
+            "name": data.get("name", ""),
+            "team": data.get("team", "A"),
+            "p50_total": _percentile(histogram, trials, 0.5),
+            "p90_total": _percentile(histogram, trials, 0.9),
+            "mean_total": sum(value * count for value, count in histogram.items()) / trials,
+            "p_at_maximum": capped / trials,
+        })
+
+    overflow = {
+        "p_capacity_exhausted": sum(count for value, count in unallocated.items() if value > 0) / trials,
+        "mean_unallocated": sum(value * count for value, count in unallocated.items()) / trials,
+        "p90_unallocated": _percentile(unallocated, trials, 0.9),
+        "max_unallocated": max(unallocated),
+    }
+    return {"trials": trials, "seed": seed, "physicians": physicians, "overflow": overflow}
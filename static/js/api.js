@@ -118,7 +118,15 @@ const API = {
 
     // Allocation
     async runAllocation(physicians, parameters) {
-        return this.fetch('/api/allocate', {
+        // Columnar results are smaller to send; see hydrateColumnarRows
+        return this.fetch('/api/allocate?format=columnar', {
+            method: 'POST',
+            body: JSON.stringify({ physicians, parameters }),
+        });
+    },
+
+    async checkFeasibility(physicians, parameters) {
+        return this.fetch('/api/allocate/feasibility', {
             method: 'POST',
             body: JSON.stringify({ physicians, parameters }),
         });
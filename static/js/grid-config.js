@@ -46,8 +46,8 @@ const physicianColumnDefs = [
         headerName: 'Team',
         editable: true,
         width: 80,
-        cellEditor: 'agSelectCellEditor',
-        cellEditorParams: { values: ['A', 'B', 'N'] },
+        // Free text: any team name is accepted, not only A, B and N
+        cellEditor: 'agTextCellEditor',
         cellRenderer: teamCellRenderer,
     },
     {
@@ -277,3 +277,33 @@ function createResultsGrid(containerId, onCellValueChanged) {
 
     return gridApi;
 }
+
+// Rows over columnar results ({columns, values, length} from ?format=columnar).
+// Each row only holds its position: fields are read from and written to the
+// column arrays through getters on a shared prototype, so no per-row copy of
+// the data is made. JSON.stringify still sends rows as plain objects.
+const ROW_POSITION = Symbol('rowPosition');
+
+function hydrateColumnarRows(table) {
+    const rowPrototype = {
+        toJSON() {
+            const row = {};
+            table.columns.forEach(column => { row[column] = this[column]; });
+            return row;
+        },
+    };
+    table.columns.forEach((column, c) => {
+        const values = table.values[c];
+        Object.defineProperty(rowPrototype, column, {
+            get() { return values[this[ROW_POSITION]]; },
+            set(value) { values[this[ROW_POSITION]] = value; },
+            enumerable: true,
+        });
+    });
+
+    const rows = new Array(table.length);
+    for (let i = 0; i < table.length; i++) {
+        rows[i] = Object.create(rowPrototype, { [ROW_POSITION]: { value: i } });
+    }
+    return rows;
+}
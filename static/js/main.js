@@ -328,6 +328,28 @@ function setupEventListeners() {
     // Print buttons
     document.getElementById('printSummaryBtn')?.addEventListener('click', openPrintPreview);
     document.getElementById('copySummaryBtn')?.addEventListener('click', copyTextSummary);
+
+    // Check feasibility while parameters are typed
+    const debouncedFeasibility = debounce(checkFeasibility, 300);
+    document.querySelectorAll('.sidebar input[type="number"]').forEach(input => {
+        input.addEventListener('input', debouncedFeasibility);
+    });
+    document.getElementById('newShiftDayBtn')?.addEventListener('click', debouncedFeasibility);
+}
+
+// Show why the current parameters cannot be allocated, if they cannot
+async function checkFeasibility() {
+    const status = document.getElementById('feasibilityStatus');
+    if (!status || !physicianGridApi) return;
+
+    const physicians = [];
+    physicianGridApi.forEachNode(node => physicians.push(node.data));
+    const diagnosis = await API.checkFeasibility(physicians, collectParameters());
+    if (!diagnosis || diagnosis.error) return;
+
+    const messages = [...diagnosis.errors, ...diagnosis.warnings].map(entry => entry.message);
+    status.style.display = messages.length ? 'block' : 'none';
+    status.textContent = messages.join(' ');
 }
 
 // Add selected physicians to the table (without replacing existing data)
@@ -485,16 +507,20 @@ async function addPhysician() {
     const name = prompt('Enter physician name:');
     if (!name || !name.trim()) return;
 
-    const team = prompt('Enter team (A, B, or N):', 'A');
-    if (!['A', 'B', 'N'].includes(team?.toUpperCase())) {
-        alert('Invalid team. Please enter A, B, or N.');
+    const teamInput = prompt('Enter team (A, B, N or another team name):', 'A');
+    if (!teamInput || !teamInput.trim()) {
+        alert('Invalid team. Please enter a team name.');
         return;
     }
+    // A, B and N are case-insensitive; other team names are kept as typed
+    const team = ['A', 'B', 'N'].includes(teamInput.trim().toUpperCase())
+        ? teamInput.trim().toUpperCase()
+        : teamInput.trim();
 
     const newPhysician = {
         name: name.trim(),
         yesterday: '',
-        team: team.toUpperCase(),
+        team: team,
         is_new: false,
         is_buffer: false,
         is_working: true,
@@ -593,17 +619,10 @@ async function clearAllPhysicians() {
 }
 
 // Run allocation
-async function runAllocation() {
-    const physicians = [];
-    physicianGridApi.forEachNode(node => physicians.push(node.data));
-
-    if (physicians.length === 0) {
-        alert('No physicians in the table. Please add physicians first.');
-        return;
-    }
-
+// Allocation parameters from the sidebar inputs
+function collectParameters() {
     const getVal = (id, def) => parseInt(document.getElementById(id)?.value) || def;
-    const parameters = {
+    return {
         n_total_new_patients: getVal('n_total_new_patients', 20),
         n_A_new_patients: getVal('n_A_new_patients', 10),
         n_B_new_patients: getVal('n_B_new_patients', 8),
@@ -617,15 +636,25 @@ async function runAllocation() {
         maximum_step_down: getVal('maximum_step_down', 4),
         is_new_shift_day: isNewShiftDay,
     };
+}
 
-    const result = await API.runAllocation(physicians, parameters);
+async function runAllocation() {
+    const physicians = [];
+    physicianGridApi.forEachNode(node => physicians.push(node.data));
+
+    if (physicians.length === 0) {
+        alert('No physicians in the table. Please add physicians first.');
+        return;
+    }
+
+    const result = await API.runAllocation(physicians, collectParameters());
 
     if (result && result.results) {
-        currentResults = result.results;
+        currentResults = Array.isArray(result.results) ? result.results : hydrateColumnarRows(result.results);
         currentSummary = result.summary;
 
         // Update results grid
-        resultsGridApi.setGridOption('rowData', result.results);
+        resultsGridApi.setGridOption('rowData', currentResults);
 
         // Update summary display
         updateSummary();
@@ -637,11 +666,63 @@ async function runAllocation() {
         document.getElementById('resultsSection').scrollIntoView({ behavior: 'smooth' });
 
         showSaveIndicator('Allocation complete!');
+
+        if (result.capacity_exhausted) {
+            const stepDown = result.unallocated_step_down
+                ? ` (${result.unallocated_step_down} of them step-down)`
+                : '';
+            alert(`Capacity exhausted: ${result.unallocated_patients} patient(s)${stepDown} could not be allocated without exceeding the maximum.`);
+        }
     } else if (result && result.error) {
         alert('Error: ' + result.error);
     }
 }
 
+// Team breakdown cards for teams other than A, B and N, built from their result rows
+function renderExtraTeamCards(teams) {
+    const grid = document.getElementById('teamSummaryGrid');
+    if (!grid) return;
+    grid.querySelectorAll('.extra-team-card').forEach(card => card.remove());
+
+    const sum = (rows, field) => rows.reduce((total, r) => total + (r[field] || 0), 0);
+    teams.forEach(([team, rows]) => {
+        const card = document.createElement('div');
+        card.className = 'team-summary-card extra-team-card';
+
+        const header = document.createElement('div');
+        header.className = 'team-summary-header';
+        const badge = document.createElement('span');
+        badge.className = 'team-badge';
+        badge.textContent = team;
+        const title = document.createElement('span');
+        title.textContent = `Team ${team}`;
+        header.append(badge, title);
+
+        const stats = document.createElement('div');
+        stats.className = 'team-summary-stats';
+        [
+            ['Total Patients', sum(rows, 'total_patients')],
+            ['Gained', sum(rows, 'gained')],
+            ['Step-Down', sum(rows, 'gained_step_down')],
+            ['Gained + Traded', sum(rows, 'gained') + sum(rows, 'traded_patients')],
+        ].forEach(([labelText, value]) => {
+            const stat = document.createElement('div');
+            stat.className = 'team-stat';
+            const label = document.createElement('span');
+            label.className = 'team-stat-label';
+            label.textContent = labelText;
+            const number = document.createElement('span');
+            number.className = 'team-stat-value';
+            number.textContent = value;
+            stat.append(label, number);
+            stats.appendChild(stat);
+        });
+
+        card.append(header, stats);
+        grid.appendChild(card);
+    });
+}
+
 // Update summary display
 function updateSummary() {
     // Recalculate from current results grid data
@@ -650,9 +731,15 @@ function updateSummary() {
 
     if (results.length === 0) return;
 
-    const teamA = results.filter(r => r.team === 'A');
-    const teamB = results.filter(r => r.team === 'B');
-    const teamN = results.filter(r => r.team === 'N');
+    // Rows by team in one pass: A, B and N first, then other teams as they appear
+    const teamRows = new Map([['A', []], ['B', []], ['N', []]]);
+    results.forEach(r => {
+        if (!teamRows.has(r.team)) teamRows.set(r.team, []);
+        teamRows.get(r.team).push(r);
+    });
+    const teamA = teamRows.get('A');
+    const teamB = teamRows.get('B');
+    const teamN = teamRows.get('N');
 
     // Calculate all summary values
     const summary = {
@@ -670,9 +757,9 @@ function updateSummary() {
         team_n_traded: teamN.reduce((sum, r) => sum + (r.traded_patients || 0), 0),
     };
 
-    const totalTraded = summary.team_a_traded + summary.team_b_traded + summary.team_n_traded;
-    const totalCensus = summary.team_a_total + summary.team_b_total + summary.team_n_total;
-    const totalGained = summary.team_a_gained + summary.team_b_gained + summary.team_n_gained;
+    // Totals cover every row, whatever its team
+    const totalCensus = results.reduce((sum, r) => sum + (r.total_patients || 0), 0);
+    const totalGained = results.reduce((sum, r) => sum + (r.gained || 0), 0);
 
     currentSummary = summary;
 
@@ -697,6 +784,9 @@ function updateSummary() {
     setVal('teamNStepDown', summary.team_n_stepdown);
     setVal('teamNGainedTraded', summary.team_n_gained);
 
+    // Teams other than A, B and N get cards of their own
+    renderExtraTeamCards([...teamRows].filter(([team]) => !['A', 'B', 'N'].includes(team)));
+
     // Update Trade Summary
     setVal('teamATraded', summary.team_a_traded);
     setVal('teamBTraded', summary.team_b_traded);
@@ -748,19 +838,19 @@ function updateSummary() {
                 <div class="summary-card-label">Physicians</div>
                 <div class="summary-card-value">${results.length}</div>
             </div>
-            <div class="summary-card">
-                <div class="summary-card-label">Team A</div>
-                <div class="summary-card-value">${teamA.length}</div>
-            </div>
-            <div class="summary-card">
-                <div class="summary-card-label">Team B</div>
-                <div class="summary-card-value">${teamB.length}</div>
-            </div>
-            <div class="summary-card">
-                <div class="summary-card-label">Team N</div>
-                <div class="summary-card-value">${teamN.length}</div>
-            </div>
         `;
+        teamRows.forEach((rows, team) => {
+            const card = document.createElement('div');
+            card.className = 'summary-card';
+            const label = document.createElement('div');
+            label.className = 'summary-card-label';
+            label.textContent = `Team ${team}`;
+            const value = document.createElement('div');
+            value.className = 'summary-card-value';
+            value.textContent = rows.length;
+            card.append(label, value);
+            summaryContainer.appendChild(card);
+        });
     }
 }
 
@@ -774,10 +864,13 @@ async function openPrintPreview() {
     const results = [];
     resultsGridApi.forEachNode(node => results.push(node.data));
 
-    // Group by team
-    const teamA = results.filter(r => r.team === 'A').sort((a, b) => a.name.localeCompare(b.name));
-    const teamB = results.filter(r => r.team === 'B').sort((a, b) => a.name.localeCompare(b.name));
-    const teamN = results.filter(r => r.team === 'N').sort((a, b) => a.name.localeCompare(b.name));
+    // Group by team in one pass, A, B and N first
+    const teams = new Map([['A', []], ['B', []], ['N', []]]);
+    results.forEach(r => {
+        if (!teams.has(r.team)) teams.set(r.team, []);
+        teams.get(r.team).push(r);
+    });
+    teams.forEach(data => data.sort((a, b) => a.name.localeCompare(b.name)));
 
     // Build print HTML
     const printWindow = window.open('', '_blank');
@@ -816,10 +909,8 @@ async function openPrintPreview() {
                     </tr>
                 </thead>
                 <tbody>
-                    ${generateTeamRows('A', teamA)}
-                    ${generateTeamRows('B', teamB)}
-                    ${generateTeamRows('N', teamN)}
-                    ${generateGrandTotal([...teamA, ...teamB, ...teamN])}
+                    ${[...teams].map(([team, data]) => generateTeamRows(team, data)).join('')}
+                    ${generateGrandTotal(results)}
                 </tbody>
             </table>
             <button onclick="window.print()">Print</button>
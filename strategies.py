@@ -0,0 +1,118 @@
+"""
+Allocation strategy registry for the Patient Allocator application.
+
+Every engine takes the allocate_patients arguments and returns its result
+structure. Engines are registered under a name so /api/allocate can pick one
+by parameter and benchmark.py can time them side by side on the same roster.
+"""
+
+from functools import partial
+
+import config
+from models import Physician
+import allocation_kernel
+from allocation import allocate_patients
+from allocation_kernel import allocate_patients_numpy
+from allocation_prototype import allocate_patients_prototype
+from optimal import allocate_patients_optimal
+
+
+class Strategy:
+    """A named allocation engine and the extra request parameters it accepts."""
+
+    def __init__(self, name: str, engine, description: str, options: tuple = (), available=None):
+        self.name = name
+        self.engine = engine
+        self.description = description
+        # Request parameters passed through to the engine as keyword arguments
+        self.options = tuple(options)
+        self._available = available
+
+    @property
+    def available(self) -> bool:
+        """False when an optional dependency of the engine is missing."""
+        return self._available is None or self._available()
+
+    def options_from(self, parameters: dict) -> dict:
+        """Pick this strategy's options out of the request parameters."""
+        return {key: parameters[key] for key in self.options if parameters.get(key) is not None}
+
+    def run(self, physicians: list[Physician], allocation_kwargs: dict, options: dict = None):
+        """Run the engine and tag the result with the strategy that produced it."""
+        result = self.engine(physicians=physicians, **allocation_kwargs, **(options or {}))
+        # Engines with a fallback report the one that actually ran
+        result.setdefault("strategy", self.name)
+        return result
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "description": self.description,
+            "options": list(self.options),
+            "available": self.available,
+        }
+
+
+# Registered strategies by name
+STRATEGIES = {}
+
+
+def register_strategy(name: str, engine, description: str, options: tuple = (), available=None):
+    """Register an allocation engine under a name, replacing any existing one."""
+    STRATEGIES[name] = Strategy(name, engine, description, options, available)
+    return STRATEGIES[name]
+
+
+def get_strategy(name: str = None) -> Strategy:
+    """
+    Look up a strategy by name, defaulting to config.DEFAULT_ALLOCATION_STRATEGY.
+    Raises ValueError for unknown or unavailable strategies.
+    """
+    name = name or config.DEFAULT_ALLOCATION_STRATEGY
+    strategy = STRATEGIES.get(name)
+    if strategy is None:
+        raise ValueError(f"Unknown allocation strategy: {name}")
+    if not strategy.available:
+        raise ValueError(f"Allocation strategy {name} is not available on this server")
+    return strategy
+
+
+def list_strategies():
+    """Registered strategies as dicts, in registration order."""
+    return [strategy.to_dict() for strategy in STRATEGIES.values()]
+
+
+def _regular_day(physicians, **kwargs):
+    return allocate_patients(physicians=physicians, **{**kwargs, "is_new_shift_day": False})
+
+
+def _new_shift_day(physicians, **kwargs):
+    return allocate_patients(physicians=physicians, **{**kwargs, "is_new_shift_day": True})
+
+
+register_strategy(
+    "greedy", allocate_patients,
+    "Current engine; is_new_shift_day picks the regular or new shift day algorithm"
+)
+register_strategy(
+    "regular", _regular_day,
+    "Regular-day round-robin allocation, ignoring is_new_shift_day"
+)
+register_strategy(
+    "new_shift_day", _new_shift_day,
+    "New shift day even redistribution within each team, ignoring is_new_shift_day"
+)
+register_strategy(
+    "prototype", allocate_patients_prototype,
+    "Original Streamlit prototype engine; no new shift day mode"
+)
+register_strategy(
+    "optimal", partial(allocate_patients_optimal, time_budget=config.OPTIMAL_TIME_BUDGET),
+    "Lowest sum of squared totals, keeping the greedy answer when it is better or past time_budget seconds",
+    options=("time_budget",)
+)
+register_strategy(
+    "numpy", allocate_patients_numpy,
+    "Greedy engine on NumPy arrays for very large rosters",
+    available=lambda: allocation_kernel.np is not None
+)
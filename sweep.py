@@ -0,0 +1,142 @@
+"""
+What-if parameter sweeps for the Patient Allocator application.
+Runs allocate_patients over the cartesian product of parameter ranges,
+fanned out across a process pool, and reports fairness metrics per combination.
+"""
+
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from models import Physician
+from allocation import allocate_patients
+
+# Parameters that can be swept; everything else comes from the base parameters
+SWEEP_PARAMETERS = (
+    "n_A_new_patients",
+    "n_B_new_patients",
+    "n_step_down_patients",
+    "minimum_patients",
+    "maximum_patients",
+)
+
+METRIC_COLUMNS = ("spread", "max_gain", "below_minimum", "unallocated")
+
+# Below this many combinations the pool start-up costs more than it saves
+PARALLEL_THRESHOLD = 256
+
+# Roster and base parameters held by each worker process
+_worker_roster = None
+_worker_parameters = None
+
+
+def expand_range(spec):
+    """
+    Expand a range spec into a list of values.
+
+    A spec is a single number, a list of values, or a dict with start, stop
+    (inclusive) and optional step.
+    """
+    if isinstance(spec, dict):
+        start = int(spec["start"])
+        stop = int(spec.get("stop", start))
+        step = int(spec.get("step", 1))
+        if step <= 0:
+            raise ValueError("Range step must be positive")
+        return list(range(start, stop + 1, step))
+    if isinstance(spec, (list, tuple)):
+        return [int(v) for v in spec]
+    return [int(spec)]
+
+
+def fairness_metrics(result, minimum_patients):
+    """Spread of totals, max gain, count below minimum and unallocated patients for one run."""
+    working = [r for r in result["results"] if r["is_working"]]
+    totals = [r["total_patients"] for r in working]
+    return (
+        max(totals) - min(totals) if totals else 0,
+        max((r["gained"] for r in working), default=0),
+        sum(1 for total in totals if total < minimum_patients),
+        result.get("unallocated_patients", 0),
+    )
+
+
+def _init_worker(roster_data, base_parameters):
+    global _worker_roster, _worker_parameters
+    _worker_roster = [Physician.from_dict(p) for p in roster_data]
+    _worker_parameters = base_parameters
+
+
+def _run_combinations(combinations, roster=None, base_parameters=None):
+    """Run every combination (a tuple of SWEEP_PARAMETERS values) against the roster."""
+    roster = roster if roster is not None else _worker_roster
+    base_parameters = base_parameters if base_parameters is not None else _worker_parameters
+
+    rows = []
+    for values in combinations:
+        parameters = {**base_parameters, **dict(zip(SWEEP_PARAMETERS, values))}
+        result = allocate_patients(physicians=[p.clone() for p in roster], **parameters)
+        rows.append(list(values) + list(fairness_metrics(result, parameters["minimum_patients"])))
+    return rows
+
+
+def run_sweep(roster_data, base_parameters, ranges, max_workers=None, max_combinations=None, progress=None):
+    """
+    Run allocate_patients for every combination of the swept parameter ranges.
+
+    roster_data is a list of physician dicts, base_parameters are
+    allocate_patients keyword arguments, and ranges maps names from
+    SWEEP_PARAMETERS to range specs (see expand_range). Parameters without a
+    range keep their base value. progress, if given, is called with
+    (combinations done, total) as chunks finish; an exception it raises
+    stops the sweep.
+
+    Returns a compact table: {"columns": [...], "rows": [[...], ...]}.
+    """
+    unknown = set(ranges) - set(SWEEP_PARAMETERS)
+    if unknown:
+        raise ValueError(f"Cannot sweep: {', '.join(sorted(unknown))}")
+
+    axes = [
+        expand_range(ranges[name]) if name in ranges else [base_parameters.get(name, 0)]
+        for name in SWEEP_PARAMETERS
+    ]
+    total = 1
+    for axis in axes:
+        total *= len(axis)
+    if max_combinations is not None and total > max_combinations:
+        raise ValueError(f"Sweep has {total} combinations, limit is {max_combinations}")
+
+    combinations = list(itertools.product(*axes))
+    workers = max_workers or os.cpu_count() or 1
+
+    # A few chunks per worker keeps the pool balanced without per-task overhead
+    chunk_size = max(1, -(-total // (workers * 4)))
+    chunks = [combinations[i:i + chunk_size] for i in range(0, total, chunk_size)]
+    rows = []
+
+    if workers == 1 or total < PARALLEL_THRESHOLD:
+        roster = [Physician.from_dict(p) for p in roster_data]
+        for chunk in chunks:
+            rows.extend(_run_combinations(chunk, roster, base_parameters))
+            if progress is not None:
+                progress(len(rows), total)
+    else:
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(roster_data, base_parameters)
+        )
+        try:
+            for chunk_rows in pool.map(_run_combinations, chunks):
+                rows.extend(chunk_rows)
+                if progress is not None:
+                    progress(len(rows), total)
+        finally:
+            # Not a with block, whose exit would wait for the chunks nobody will read
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    return {
+        "columns": list(SWEEP_PARAMETERS) + list(METRIC_COLUMNS),
+        "rows": rows,
+    }
@@ -0,0 +1,105 @@
+"""
+Equivalence tests for the allocation primitives against the loops they replace.
+"""
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from allocation import round_robin_quotas, transfer_to_minimum, water_fill
+
+
+def _round_robin_loop(capacities, remaining):
+    """The original round-robin: +1 to everyone with room per pass while remaining >= roster size."""
+    quotas = [0] * len(capacities)
+    # The original never left the loop once everyone was full; stop there instead
+    while capacities and remaining >= len(capacities) and quotas != capacities:
+        for i, capacity in enumerate(capacities):
+            if quotas[i] < capacity:
+                quotas[i] += 1
+                remaining -= 1
+    return quotas
+
+
+def test_round_robin_quotas_match_the_loop():
+    rng = random.Random(1)
+    for _ in range(2000):
+        capacities = [rng.randint(0, 12) for _ in range(rng.randint(0, 12))]
+        remaining = rng.randint(0, 150)
+        quotas, _ = round_robin_quotas(capacities, remaining)
+        assert quotas == _round_robin_loop(capacities, remaining), (capacities, remaining)
+
+
+def test_round_robin_quotas_fill_everyone_when_the_pool_outlasts_capacity():
+    quotas, passes = round_robin_quotas([2, 0, 3], 100)
+    assert quotas == [2, 0, 3]
+    assert passes is None
+
+
+def _one_at_a_time(levels, units, caps, tie_break):
+    """Each unit to the lowest (level, tie_break, index) entry with room, as the per-patient loops did."""
+    given = [0] * len(levels)
+    while units:
+        open_entries = [i for i in range(len(levels)) if given[i] < caps[i]]
+        if not open_entries:
+            break
+        i = min(open_entries, key=lambda i: (levels[i] + given[i], tie_break[i], i))
+        given[i] += 1
+        units -= 1
+    return given, units
+
+
+def test_water_fill_matches_one_unit_at_a_time():
+    rng = random.Random(2)
+    for _ in range(2000):
+        size = rng.randint(0, 10)
+        levels = [rng.randint(-5, 15) for _ in range(size)]
+        caps = [rng.randint(0, 6) for _ in range(size)]
+        tie_break = [rng.randint(0, 3) for _ in range(size)]
+        units = rng.randint(0, 40)
+        assert water_fill(levels, units, caps, tie_break) == _one_at_a_time(levels, units, caps, tie_break)
+
+
+def _redistribute_one_at_a_time(donor_totals, donor_recency, recipient_totals, minimum_patients, maximum_patients):
+    """
+    The old minimum check, one patient per step: the highest donor above
+    minimum (most recent allocation first on ties) gives to the lowest
+    recipient below minimum. Unlike the old loop, a donor may give again.
+    """
+    donors = list(donor_totals)
+    recipients = list(recipient_totals)
+    ceiling = min(minimum_patients, maximum_patients)
+    while True:
+        givers = [i for i, total in enumerate(donors) if total > minimum_patients]
+        takers = [i for i, total in enumerate(recipients) if total < ceiling]
+        if not givers or not takers:
+            break
+        donor = min(givers, key=lambda i: (-donors[i], donor_recency[i], i))
+        recipient = min(takers, key=lambda i: (recipients[i], i))
+        donors[donor] -= 1
+        recipients[recipient] += 1
+    removals = [before - after for before, after in zip(donor_totals, donors)]
+    additions = [after - before for before, after in zip(recipient_totals, recipients)]
+    shortfall = sum(max(0, ceiling - total) for total in recipients)
+    return removals, additions, shortfall
+
+
+def test_transfer_to_minimum_matches_the_one_at_a_time_redistribution():
+    rng = random.Random(3)
+    for _ in range(2000):
+        minimum_patients = rng.randint(0, 12)
+        maximum_patients = rng.randint(minimum_patients // 2, 20)
+        donor_totals = [minimum_patients + rng.randint(1, 6) for _ in range(rng.randint(0, 6))]
+        donor_recency = [rng.randint(-20, 0) for _ in donor_totals]
+        recipient_totals = [rng.randint(0, max(0, minimum_patients - 1)) for _ in range(rng.randint(0, 6))]
+        arguments = (donor_totals, donor_recency, recipient_totals, minimum_patients, maximum_patients)
+        assert transfer_to_minimum(*arguments) == _redistribute_one_at_a_time(*arguments), arguments
+
+
+def test_transfer_to_minimum_lets_a_donor_give_more_than_once():
+    removals, additions, shortfall = transfer_to_minimum([16], [0], [7, 8], 10, 20)
+    assert removals == [5]
+    assert additions == [3, 2]
+    assert shortfall == 0
@@ -0,0 +1,22 @@
+"""
+Equivalence tests for the NumPy allocation kernel against the greedy engine.
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("numpy")
+
+from fuzz import random_case, run_case
+from strategies import get_strategy
+
+
+def test_numpy_kernel_matches_greedy_on_fuzzed_cases():
+    greedy, numpy = get_strategy("greedy"), get_strategy("numpy")
+    for seed in range(1500):
+        roster, kwargs = random_case(seed)
+        assert run_case(numpy, roster, kwargs) == run_case(greedy, roster, kwargs), seed
@@ -0,0 +1,54 @@
+"""
+Tests for the allocation response cache: keys, LRU eviction and expiry.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import AllocationCache, allocation_key
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = AllocationCache(max_entries=2, ttl_seconds=60, clock=_Clock())
+    cache.put("a", 1)
+    cache.put("b", 2)
+    # Reading "a" makes "b" the least recently used
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire_after_ttl():
+    clock = _Clock()
+    cache = AllocationCache(max_entries=2, ttl_seconds=10, clock=clock)
+    cache.put("a", 1)
+    clock.now = 9.9
+    assert cache.get("a") == 1
+    clock.now = 10.0
+    assert cache.get("a") is None
+
+    stats = cache.stats()
+    assert stats["expirations"] == 1
+    assert stats["size"] == 0
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+
+def test_key_ignores_field_order_and_defaults():
+    explicit = [{"team": "A", "name": "Wang", "total_patients": 0}]
+    implicit = [{"name": "Wang"}]
+    assert allocation_key(explicit, {"minimum_patients": 10}) == allocation_key(implicit, {"minimum_patients": 10})
+    assert allocation_key(implicit, {"minimum_patients": 10}) != allocation_key(implicit, {"minimum_patients": 11})
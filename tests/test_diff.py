@@ -0,0 +1,63 @@
+"""
+Tests for allocation diffs.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from diff import diff_allocations
+
+
+def _row(name, team, total, step_down=0):
+    return {"name": name, "team": team, "total_patients": total, "step_down_patients": step_down}
+
+
+def _columns(rows):
+    columns = ["name", "team", "total_patients", "step_down_patients"]
+    return {"columns": columns, "values": [[row[c] for row in rows] for c in columns], "length": len(rows)}
+
+
+def test_repeated_names_pair_up_in_order():
+    before = [_row("Lee", "A", 10), _row("Lee", "B", 12), _row("Ali", "A", 9)]
+    after = [_row("Lee", "A", 10), _row("Lee", "B", 14, 1), _row("Ali", "A", 9)]
+    diff = diff_allocations(before, after)
+
+    assert diff["unchanged"] == 2
+    assert diff["changed"] == [{
+        "name": "Lee",
+        "team": "B",
+        "total_patients": [12, 14],
+        "step_down_patients": [0, 1],
+        "delta_total": 2,
+        "delta_step_down": 1,
+    }]
+    assert diff["added"] == diff["removed"] == []
+    assert diff["teams"] == {"B": {"total": 2, "step_down": 1, "changed": 1}}
+
+
+def test_team_move_counts_against_both_teams():
+    before = [_row("Wang", "A", 12), _row("Ali", "B", 9)]
+    after = [_row("Wang", "B", 12), _row("Ali", "B", 9)]
+    diff = diff_allocations(before, after)
+
+    assert diff["changed"][0]["previous_team"] == "A"
+    assert diff["changed"][0]["delta_total"] == 0
+    assert diff["teams"]["A"] == {"total": -12, "step_down": 0, "changed": 1}
+    assert diff["teams"]["B"] == {"total": 12, "step_down": 0, "changed": 1}
+
+
+def test_added_and_removed_rows_and_columnar_input():
+    before = [_row("Lee", "A", 10), _row("Lee", "A", 11)]
+    after = [_row("Lee", "A", 10), _row("Kaur", "N", 8)]
+    diff = diff_allocations(_columns(before), after)
+
+    # The second Lee has no partner in the later run
+    assert diff["removed"] == [_row("Lee", "A", 11)]
+    assert diff["added"] == [_row("Kaur", "N", 8)]
+    assert diff["unchanged"] == 1
+    assert diff["teams"] == {
+        "A": {"total": -11, "step_down": 0, "changed": 1},
+        "N": {"total": 8, "step_down": 0, "changed": 1},
+    }
@@ -0,0 +1,42 @@
+"""
+Regression tests for the feasibility analysis.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Physician
+from allocation import allocate_patients
+from feasibility import analyze_feasibility
+
+
+def _roster():
+    return [Physician.from_dict({"name": "Wang", "team": "A", "total_patients": 0, "step_down_patients": 1})]
+
+
+def test_step_down_overflow_counts_towards_minimum():
+    """
+    At maximum_step_down, every step-down patient becomes a regular patient,
+    so the whole step-down pool can lift the census towards minimum_patients.
+    """
+    parameters = dict(
+        n_total_new_patients=0,
+        n_A_new_patients=0,
+        n_B_new_patients=0,
+        n_N_new_patients=0,
+        new_start_number=10,
+        minimum_patients=11,
+        maximum_patients=20,
+        maximum_step_down=1,
+        n_step_down_patients=6,
+    )
+
+    diagnosis = analyze_feasibility(_roster(), **parameters)
+    result = allocate_patients(_roster(), **parameters)
+
+    assert result["minimum_shortfall"] == 0
+    assert result["results"][0]["total_patients"] == 12
+    assert diagnosis["feasible"]
+    assert diagnosis["minimum"]["census"] == 12
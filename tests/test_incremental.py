@@ -0,0 +1,67 @@
+"""
+Equivalence tests for incremental re-allocation against a full run.
+"""
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Physician
+from allocation import allocate_patients
+from fuzz import random_case
+from incremental import IncrementalAllocation
+
+# Field -> random new value for an edit
+_EDITS = {
+    "total_patients": lambda rng: rng.randint(0, 20),
+    "step_down_patients": lambda rng: rng.randint(0, 3),
+    "traded_patients": lambda rng: rng.randint(0, 3),
+    "transferred_patients": lambda rng: rng.randint(0, 2),
+    "is_new": lambda rng: rng.random() < 0.5,
+    "is_working": lambda rng: rng.random() < 0.7,
+    "is_buffer": lambda rng: rng.random() < 0.5,
+    "team": lambda rng: rng.choice("ABNC"),
+    "yesterday": lambda rng: rng.choice(("", "call")),
+}
+
+
+def test_updates_match_a_full_run():
+    scopes = set()
+    for seed in range(400):
+        roster, kwargs = random_case(seed, 15)
+        if not roster:
+            continue
+        # Unique names, so every edit reaches the row it names
+        for i, row in enumerate(roster):
+            row["name"] = f"P{i}"
+        rng = random.Random(seed)
+        state = IncrementalAllocation([dict(row) for row in roster], kwargs)
+
+        for _ in range(3):
+            row = rng.choice(roster)
+            field = rng.choice(sorted(_EDITS))
+            value = _EDITS[field](rng)
+            result, scope, _ = state.apply(row["name"], {field: value})
+            row[field] = value
+            scopes.add(scope)
+
+            full = allocate_patients([Physician.from_dict(dict(p)) for p in roster], **kwargs)
+            assert result == full, (seed, field, scope)
+
+    # Every path was exercised
+    assert scopes == {"none", "row", "team", "full"}
+
+
+def test_display_edit_patches_the_row_only():
+    roster = [{"name": "Wang", "team": "A", "total_patients": 12}, {"name": "Aung", "team": "B", "total_patients": 9}]
+    kwargs = dict(
+        n_total_new_patients=4, n_A_new_patients=2, n_B_new_patients=2, n_N_new_patients=0,
+        new_start_number=5, minimum_patients=10, maximum_patients=20
+    )
+    state = IncrementalAllocation(roster, kwargs)
+    result, scope, _ = state.apply("Wang", {"traded_patients": 2})
+
+    assert scope == "row"
+    assert result["results"][0]["gained_plus_traded"] == result["results"][0]["gained"] + 2